@@ -0,0 +1,239 @@
+import argparse
+import os
+import sqlite3
+from datetime import date, datetime
+
+# Closed fiscal years (April-March) of payroll and leave_register are moved out
+# of employee.db into one archive database per year, listed in the
+# archive_partitions table. Reads that reach back into archived years attach
+# the archives they need and read the hot table and the archives as one
+# UNION ALL; reads of recent months never see the archives at all.
+#
+#   python archive.py close 2023     # moves FY 2023-24 to archive/employee_fy2023.db
+#   python archive.py list
+
+DEFAULT_DB_PATH = 'employee.db'
+DEFAULT_ARCHIVE_DIR = 'archive'
+FISCAL_YEAR_START_MONTH = 4
+# Archives attached to one connection at a time; SQLite allows 10 attachments
+MAX_ATTACHED_ARCHIVES = 8
+
+# Archived tables and the date columns that place a row in a fiscal year. A
+# leave is archived only when it lies entirely inside the year.
+ARCHIVED_TABLES = {
+    'payroll': ('payment_date', 'payment_date'),
+    'leave_register': ('date_from', 'date_to'),
+}
+
+
+def fiscal_year_of(iso_date):
+    # Fiscal years are named by the calendar year they start in
+    year, month = int(iso_date[:4]), int(iso_date[5:7])
+    return year if month >= FISCAL_YEAR_START_MONTH else year - 1
+
+
+def fiscal_year_bounds(fiscal_year):
+    # (first day, first day of the next year) as ISO dates
+    return (date(fiscal_year, FISCAL_YEAR_START_MONTH, 1).isoformat(),
+            date(fiscal_year + 1, FISCAL_YEAR_START_MONTH, 1).isoformat())
+
+
+def fiscal_year_label(fiscal_year):
+    return f"FY {fiscal_year}-{(fiscal_year + 1) % 100:02d}"
+
+
+def archive_path(db_path, fiscal_year, archive_dir=DEFAULT_ARCHIVE_DIR):
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(archive_dir, f"{name}_fy{fiscal_year}.db")
+
+
+def partition_alias(fiscal_year):
+    return f"fy{fiscal_year}"
+
+
+def list_partitions(connection):
+    return connection.execute("""
+        SELECT fiscal_year, db_path, start_date, end_date, payroll_rows, leave_rows, archived_at
+        FROM archive_partitions ORDER BY fiscal_year
+    """).fetchall()
+
+
+def partitions_between(connection, start_date=None, end_date=None):
+    # Archived fiscal years overlapping [start_date, end_date); None means open-ended
+    return connection.execute("""
+        SELECT fiscal_year, db_path FROM archive_partitions
+        WHERE end_date > ? AND start_date < ?
+        ORDER BY fiscal_year
+    """, (start_date or '0000-00-00', end_date or '9999-99-99')).fetchall()
+
+
+def attached_aliases(connection):
+    return [row[1] for row in connection.execute("PRAGMA database_list")]
+
+
+def attach_partition(connection, fiscal_year, db_path, keep=()):
+    # keep: aliases the query being built uses, which must stay attached
+    alias = partition_alias(fiscal_year)
+    attached = attached_aliases(connection)
+    if alias in attached:
+        return alias
+    if not os.path.exists(db_path):
+        raise sqlite3.OperationalError(f"Archive for {fiscal_year_label(fiscal_year)} is missing: {db_path}")
+
+    # Drop the oldest archive attachments not in use once the limit is reached
+    archives = [name for name in attached if name.startswith("fy")]
+    spare = [name for name in archives if name not in keep]
+    surplus = max(0, len(archives) - MAX_ATTACHED_ARCHIVES + 1)
+    if surplus > len(spare):
+        raise sqlite3.OperationalError(f"At most {MAX_ATTACHED_ARCHIVES} archived fiscal years can be read at once")
+    for old_alias in spare[:surplus]:
+        connection.execute(f"DETACH DATABASE {old_alias}")
+    connection.execute(f"ATTACH DATABASE ? AS {alias}", (db_path,))
+    return alias
+
+
+def table_columns(connection, table, schema_name='main'):
+    return [row[1] for row in connection.execute(f"PRAGMA {schema_name}.table_info({table})")]
+
+
+def union_source(connection, table, partitions, include_hot=True):
+    columns = table_columns(connection, table)
+    selects = [f"SELECT {', '.join(columns)} FROM main.{table}"] if include_hot else []
+    aliases = []
+    for fiscal_year, db_path in partitions:
+        aliases.append(attach_partition(connection, fiscal_year, db_path, keep=aliases))
+        # Columns added to the hot table after the year was archived read as NULL
+        archived = set(table_columns(connection, table, aliases[-1]))
+        selects.append("SELECT " + ", ".join(column if column in archived else f"NULL AS {column}"
+                                             for column in columns) + f" FROM {aliases[-1]}.{table}")
+    return f"({' UNION ALL '.join(selects)})"
+
+
+def table_source(connection, table, start_date=None, end_date=None):
+    # FROM-clause source for table: the hot table itself when no archived year
+    # overlaps the range (so its indexes are used), otherwise a UNION ALL of
+    # the hot table and the overlapping archives. A range reaching into more
+    # archived years than can be attached raises OperationalError; open-ended
+    # reads use table_sources.
+    partitions = partitions_between(connection, start_date, end_date)
+    if not partitions:
+        return table
+    if len(partitions) > MAX_ATTACHED_ARCHIVES:
+        raise sqlite3.OperationalError(
+            f"The dates reach into {len(partitions)} archived fiscal years; at most "
+            f"{MAX_ATTACHED_ARCHIVES} can be read at once")
+    return union_source(connection, table, partitions)
+
+
+def table_sources(connection, table, start_date=None, end_date=None):
+    # FROM-clause sources that together cover the range, each within the
+    # attachment limit: the hot table with the first archives, then the rest
+    # in batches. Building the next source may detach the previous one's
+    # archives, so read each source to the end before asking for the next.
+    partitions = partitions_between(connection, start_date, end_date)
+    if len(partitions) <= MAX_ATTACHED_ARCHIVES:
+        yield table_source(connection, table, start_date, end_date)
+        return
+    for start in range(0, len(partitions), MAX_ATTACHED_ARCHIVES):
+        yield union_source(connection, table, partitions[start:start + MAX_ATTACHED_ARCHIVES],
+                           include_hot=start == 0)
+
+
+def archive_fiscal_year(connection, db_path, fiscal_year, archive_dir=DEFAULT_ARCHIVE_DIR, today=None):
+    # Moves one closed fiscal year out of the hot database. Returns
+    # (archive path, payroll rows moved, leave rows moved).
+    start_date, end_date = fiscal_year_bounds(fiscal_year)
+    today = (today or date.today()).isoformat()
+    if end_date > today:
+        raise ValueError(f"{fiscal_year_label(fiscal_year)} is not closed yet")
+    if connection.execute("SELECT 1 FROM archive_partitions WHERE fiscal_year = ?", (fiscal_year,)).fetchone():
+        raise ValueError(f"{fiscal_year_label(fiscal_year)} is already archived")
+
+    target = archive_path(db_path, fiscal_year, archive_dir)
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    # A file without a registry row is left over from an interrupted run
+    for leftover in (target, target + "-wal", target + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    # The archive gets the hot tables' current definitions and indexes
+    definitions = connection.execute(f"""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name IN ({', '.join('?' * len(ARCHIVED_TABLES))}) AND sql IS NOT NULL
+        ORDER BY type DESC
+    """, tuple(ARCHIVED_TABLES)).fetchall()
+    archive_connection = sqlite3.connect(target)
+    try:
+        with archive_connection:
+            for (sql,) in definitions:
+                archive_connection.execute(sql)
+    finally:
+        archive_connection.close()
+
+    alias = attach_partition(connection, fiscal_year, target)
+    params = {'start': start_date, 'end': end_date}
+    moved = {}
+    connection.commit()
+    try:
+        # Step 1: copy into the archive and commit it. Transactions spanning a
+        # WAL database and an attachment are not atomic across the two files,
+        # so the hot rows are only deleted once the copy is durable.
+        connection.execute("BEGIN IMMEDIATE")
+        for table, (first_column, last_column) in ARCHIVED_TABLES.items():
+            moved[table] = connection.execute(f"""
+                INSERT INTO {alias}.{table} SELECT * FROM main.{table}
+                WHERE {first_column} >= :start AND {last_column} < :end
+            """, params).rowcount
+        connection.commit()
+
+        # Step 2: remove the rows from the hot tables and register the partition
+        connection.execute("BEGIN IMMEDIATE")
+        for table, (first_column, last_column) in ARCHIVED_TABLES.items():
+            connection.execute(f"DELETE FROM main.{table} WHERE {first_column} >= :start AND {last_column} < :end",
+                               params)
+        connection.execute("""
+            INSERT INTO archive_partitions (fiscal_year, db_path, start_date, end_date,
+                                            payroll_rows, leave_rows, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (fiscal_year, target, start_date, end_date, moved['payroll'], moved['leave_register'],
+              datetime.now().isoformat(timespec='seconds')))
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        connection.execute(f"DETACH DATABASE {alias}")
+        raise
+    return target, moved['payroll'], moved['leave_register']
+
+
+def main():
+    import db_maintenance
+    import schema
+
+    parser = argparse.ArgumentParser(description="Move closed fiscal years into archive databases")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--archive-dir", default=DEFAULT_ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    close = commands.add_parser("close", help="archive a closed fiscal year")
+    close.add_argument("fiscal_year", type=int, help="calendar year the fiscal year starts in")
+    commands.add_parser("list", help="list archived fiscal years")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        if args.command == "close":
+            target, payroll_rows, leave_rows = archive_fiscal_year(connection, args.db, args.fiscal_year,
+                                                                   args.archive_dir)
+            freed = db_maintenance.reclaim_space(connection)
+            print(f"{fiscal_year_label(args.fiscal_year)}: {payroll_rows} payroll and {leave_rows} leave rows "
+                  f"moved to {target} ({freed} pages reclaimed)")
+        else:
+            for fiscal_year, db_path, _, _, payroll_rows, leave_rows, archived_at in list_partitions(connection):
+                print(f"{fiscal_year_label(fiscal_year):<12} {payroll_rows:>9} payroll {leave_rows:>7} leave  "
+                      f"{db_path}  ({archived_at})")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import sqlite3
+from datetime import datetime
+
+import payroll_engine
+import salary_policy
+
+# Retroactive pay. When a salary record takes effect in a month that has
+# already been paid, the difference is owed as arrears. compute_arrears reads
+# every committed payroll row since a period with the salary that was in
+# effect for its month, in one query, recomputes each row with the pay-run
+# rules, under the salary policy version the month was paid with, and records
+# the difference per employee and month in salary_arrears: gross, income tax,
+# leave deduction and net.
+#
+# A month's paid figures are taken net of arrears for earlier months settled
+# in its run, plus the arrears already recorded for it, so computing again
+# only records what is still owed; a backdated appraisal for the whole company
+# is one call. Unsettled arrears are added to the next pay run (see
+# PAYROLL_INPUT_QUERY) and marked with that run when it commits. Archived
+# fiscal years are closed and are not corrected.
+#
+#   python arrears.py 2025-04                 # everyone, every month since April
+#   python arrears.py 2025-04 --employee 17
+
+DEFAULT_DB_PATH = 'employee.db'
+
+ARREARS_BASIS_QUERY = """
+    SELECT p.employee_id, p.employee_name, r.period, r.policy_version, p.leaves, p.org_unit_id,
+           e.city, e.status, e.hire_date,
+           p.final_pay + p.income_tax + p.deducted_salary, p.income_tax, p.deducted_salary,
+           s.base_salary, s.hra, s.da, s.bonus,
+           IFNULL(settled.gross, 0), IFNULL(settled.income_tax, 0), IFNULL(settled.deductions, 0),
+           IFNULL(recorded.gross, 0), IFNULL(recorded.income_tax, 0), IFNULL(recorded.deductions, 0)
+    FROM pay_runs r
+    JOIN payroll p ON p.run_id = r.run_id
+    JOIN employees e ON e.employee_id = p.employee_id
+    JOIN employee_salary s ON s.employee_id = p.employee_id AND s.effective_date = (
+        SELECT MAX(effective_date) FROM employee_salary
+        WHERE employee_id = p.employee_id
+        AND effective_date <= date(r.period || '-01', '+1 month', '-1 day'))
+    LEFT JOIN (SELECT employee_id, settled_run_id, SUM(gross) AS gross, SUM(income_tax) AS income_tax,
+                      SUM(deductions) AS deductions
+               FROM salary_arrears
+               WHERE settled_run_id IN (SELECT run_id FROM pay_runs WHERE period >= :from_period)
+               GROUP BY employee_id, settled_run_id) settled
+    ON settled.employee_id = p.employee_id AND settled.settled_run_id = r.run_id
+    LEFT JOIN (SELECT employee_id, period, SUM(gross) AS gross, SUM(income_tax) AS income_tax,
+                      SUM(deductions) AS deductions
+               FROM salary_arrears
+               WHERE period >= :from_period
+               GROUP BY employee_id, period) recorded
+    ON recorded.employee_id = p.employee_id AND recorded.period = r.period
+    WHERE r.status = 'committed' AND r.period >= :from_period
+"""
+
+
+class ArrearsResult:
+    __slots__ = ('lines', 'employees', 'net')
+
+    def __init__(self, lines, employees, net):
+        self.lines = lines
+        self.employees = employees
+        self.net = net
+
+
+def arrears_lines(connection, rows, now):
+    # Differences between what each row should have paid and what was paid
+    months = {}
+    for (employee_id, employee_name, period, policy_version, leaves, org_unit_id, city, status, hire_date,
+         paid_gross, paid_tax, paid_deductions, base_salary, hra, da, bonus, settled_gross, settled_tax,
+         settled_deductions, recorded_gross, recorded_tax, recorded_deductions) in rows:
+        record = {
+            'employee_id': employee_id, 'employee_name': employee_name, 'leaves': leaves,
+            'gross_salary': base_salary, 'hra': hra, 'da': da, 'bonus': bonus, 'org_unit_id': org_unit_id,
+            'city': city, 'status': status, 'hire_date': hire_date,
+            'arrears_gross': 0, 'arrears_tax': 0, 'arrears_deductions': 0, 'arrears_through': None,
+            'paid': (paid_gross - settled_gross + recorded_gross, paid_tax - settled_tax + recorded_tax,
+                     paid_deductions - settled_deductions + recorded_deductions),
+        }
+        months.setdefault((period, policy_version), []).append(record)
+
+    lines = []
+    for (period, policy_version), records in months.items():
+        if policy_version is not None:
+            salary_policy.load_policy(connection, policy_version).evaluate(
+                records, payroll_engine.month_bounds(period)[1])
+        for record in records:
+            pay = payroll_engine.compute_payroll(record)
+            paid_gross, paid_tax, paid_deductions = record['paid']
+            gross = pay['gross'] - paid_gross
+            tax = pay['tax'] - paid_tax
+            deductions = pay['leave_deduction'] - paid_deductions
+            if gross or tax or deductions:
+                lines.append((record['employee_id'], period, gross, tax, deductions,
+                              gross - tax - deductions, now))
+    return lines
+
+
+def compute_arrears(connection, from_period, employee_id=None, now=None):
+    # Records what is owed for committed months from from_period on, for one
+    # employee or everyone; commits
+    payroll_engine.month_bounds(from_period)
+    sql, params = ARREARS_BASIS_QUERY, {'from_period': from_period}
+    if employee_id is not None:
+        sql += " AND p.employee_id = :employee_id"
+        params['employee_id'] = employee_id
+
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        lines = arrears_lines(connection, connection.execute(sql, params).fetchall(),
+                              (now or datetime.now()).isoformat(timespec='seconds'))
+        connection.executemany("""
+            INSERT INTO salary_arrears (employee_id, period, gross, income_tax, deductions, net, computed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, lines)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return ArrearsResult(len(lines), len({line[0] for line in lines}), sum(line[5] for line in lines))
+
+
+def pending_arrears(connection, employee_id=None):
+    # (employee_id, period, gross, income_tax, deductions, net) not yet paid
+    sql = """
+        SELECT employee_id, period, gross, income_tax, deductions, net FROM salary_arrears
+        WHERE settled_run_id IS NULL
+    """
+    params = ()
+    if employee_id is not None:
+        sql += " AND employee_id = ?"
+        params = (employee_id,)
+    return connection.execute(sql + " ORDER BY employee_id, period", params).fetchall()
+
+
+def main():
+    import money
+    import schema
+
+    parser = argparse.ArgumentParser(description="Compute arrears for backdated salary changes")
+    parser.add_argument("from_period", help="first month to correct, YYYY-MM")
+    parser.add_argument("--employee", type=int, help="only this employee")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        result = compute_arrears(connection, args.from_period, args.employee)
+    except ValueError as err:
+        parser.error(str(err))
+    finally:
+        connection.close()
+    print(f"{result.lines} arrears lines for {result.employees} employees, "
+          f"{money.format_inr(result.net)} net, to be paid in the next pay run")
+
+
+if __name__ == "__main__":
+    main()
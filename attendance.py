@@ -0,0 +1,282 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import payroll_engine
+
+# Attendance from the biometric punch logs. A punch file (CSV or JSON lines,
+# several million rows a month) is read in one streaming pass: punches are
+# folded into a first punch, last punch and count per employee per day, and
+# the open days are merged into attendance_daily with one batched upsert each
+# time MAX_OPEN_DAYS of them are held, and at the end. The upsert keeps the
+# earlier first punch and the later last punch, so the file needs no sorting
+# and a day split across flushes or files comes out the same.
+#
+# The months the file touched are then summarized into attendance_monthly in
+# one set-based statement per month for every active employee: loss-of-pay
+# days (working days with no attendance and no leave on record, half a day
+# for short days) and overtime.
+# The pay-run query adds the loss-of-pay days to the unpaid leave days.
+#
+# A file is imported in one transaction and recorded by its checksum, so a
+# failed import leaves nothing behind and the same file is not counted twice.
+#
+#   python attendance.py punches-2025-03.csv punches-2025-03b.jsonl
+#
+# Fields: employee_id, punch_time (YYYY-MM-DD HH:MM[:SS], a T separator is fine)
+
+DEFAULT_DB_PATH = 'employee.db'
+PUNCH_FORMATS = ('csv', 'jsonl')
+REQUIRED_FIELDS = ('employee_id', 'punch_time')
+# Employee-days aggregated in memory before they are merged into the table
+MAX_OPEN_DAYS = 50000
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+# Worked time is first to last punch; beyond a standard day it is overtime,
+# below half of one it is half a day's loss of pay
+STANDARD_DAY_MINUTES = 8 * 60
+HALF_DAY_MINUTES = 4 * 60
+# strftime('%w') days with no attendance expected: Sunday
+WEEKLY_OFF_DAYS = ('0',)
+# Bad rows kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+DAILY_UPSERT = """
+    INSERT INTO attendance_daily (employee_id, work_date, first_punch, last_punch, punches)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(employee_id, work_date) DO UPDATE SET
+        first_punch = MIN(first_punch, excluded.first_punch),
+        last_punch = MAX(last_punch, excluded.last_punch),
+        punches = punches + excluded.punches
+"""
+
+# Per active employee hired by :last_day, and anyone else with punches in the
+# month: working days up to :last_day on or after the hire date, with no
+# attendance and no leave covering them, are loss of pay, so an employee
+# absent all month gets a full month of it. Days not yet in the punch logs are
+# not absences, so the caller passes the last day any punch was recorded for
+# as :last_day.
+MONTHLY_UPSERT = f"""
+    WITH RECURSIVE days(day) AS (
+        SELECT :month_start
+        UNION ALL
+        SELECT date(day, '+1 day') FROM days WHERE day < :last_day
+    ),
+    workdays AS (
+        SELECT day FROM days WHERE strftime('%w', day) NOT IN ({', '.join(map(repr, WEEKLY_OFF_DAYS))})
+    ),
+    worked AS (
+        SELECT employee_id, work_date, (last_punch - first_punch) / 60 AS minutes
+        FROM attendance_daily
+        WHERE work_date >= :month_start AND work_date <= :month_end
+    )
+    INSERT INTO attendance_monthly (employee_id, period, days_present, lop_days, overtime_minutes)
+    SELECT e.employee_id, :period,
+           (SELECT COUNT(*) FROM worked w WHERE w.employee_id = e.employee_id),
+           (SELECT IFNULL(SUM(CASE WHEN w.minutes IS NULL THEN 1.0
+                                   WHEN w.minutes < {HALF_DAY_MINUTES} THEN 0.5 ELSE 0 END), 0)
+            FROM workdays d
+            LEFT JOIN worked w ON w.employee_id = e.employee_id AND w.work_date = d.day
+            WHERE d.day >= e.hire_date
+            AND NOT EXISTS (SELECT 1 FROM leave_register l
+                            WHERE l.employee_id = e.employee_id
+                            AND l.date_from <= d.day AND l.date_to >= d.day)),
+           (SELECT IFNULL(SUM(CASE WHEN strftime('%w', w.work_date) IN ({', '.join(map(repr, WEEKLY_OFF_DAYS))})
+                                   THEN w.minutes
+                                   ELSE MAX(w.minutes - {STANDARD_DAY_MINUTES}, 0) END), 0)
+            FROM worked w WHERE w.employee_id = e.employee_id)
+    FROM employees e
+    WHERE (e.status = 'active' AND e.hire_date <= :last_day)
+    OR e.employee_id IN (SELECT employee_id FROM worked)
+    ON CONFLICT(employee_id, period) DO UPDATE SET
+        days_present = excluded.days_present,
+        lop_days = excluded.lop_days,
+        overtime_minutes = excluded.overtime_minutes
+"""
+
+
+class IngestResult:
+    __slots__ = ('punches', 'periods', 'errors', 'error_count')
+
+    def __init__(self):
+        self.punches = 0
+        self.periods = set()
+        # (line, problem) for the first MAX_REPORTED_ERRORS bad rows
+        self.errors = []
+        self.error_count = 0
+
+    def reject(self, line, problem):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, problem))
+
+
+def punch_format(file_path):
+    return 'jsonl' if os.path.splitext(file_path)[1].lower() in ('.jsonl', '.json', '.ndjson') else 'csv'
+
+
+def file_checksum(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(CHECKSUM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_punches(file_path, file_format=None):
+    # Yields (line, employee_id, punch_time) as found in the file, one at a time
+    with open(file_path, newline='', encoding='utf-8') as file:
+        if (file_format or punch_format(file_path)) == 'jsonl':
+            for line, text in enumerate(file, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    record = json.loads(text)
+                    yield line, record.get('employee_id'), record.get('punch_time')
+                except (ValueError, AttributeError):
+                    yield line, None, None
+            return
+
+        reader = csv.DictReader(file)
+        missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        for line, record in enumerate(reader, start=2):
+            yield line, record['employee_id'], record['punch_time']
+
+
+def flush_days(connection, open_days):
+    connection.executemany(DAILY_UPSERT, [(employee_id, work_date, first, last, punches)
+                                          for (employee_id, work_date), (first, last, punches)
+                                          in open_days.items()])
+    open_days.clear()
+
+
+def ingest_punches(connection, punches, result, max_open_days=MAX_OPEN_DAYS):
+    # Folds (line, employee_id, punch_time) rows into attendance_daily; memory
+    # is bounded by max_open_days whatever the size or order of the input.
+    # Does not commit.
+    known = {row[0] for row in connection.execute("SELECT employee_id FROM employees")}
+    open_days = {}
+    for line, employee_id, punch_time in punches:
+        try:
+            employee_id = int(employee_id)
+            moment = datetime.fromisoformat(str(punch_time).strip())
+        except (TypeError, ValueError):
+            result.reject(line, "Bad employee id or punch time")
+            continue
+        if employee_id not in known:
+            result.reject(line, f"Unknown employee {employee_id}")
+            continue
+
+        key = (employee_id, moment.date().isoformat())
+        second = moment.hour * 3600 + moment.minute * 60 + moment.second
+        day = open_days.get(key)
+        if day is None:
+            if len(open_days) >= max_open_days:
+                flush_days(connection, open_days)
+            open_days[key] = [second, second, 1]
+            result.periods.add(key[1][:7])
+        else:
+            if second < day[0]:
+                day[0] = second
+            elif second > day[1]:
+                day[1] = second
+            day[2] += 1
+        result.punches += 1
+    flush_days(connection, open_days)
+
+
+def summarize_period(connection, period):
+    # Recomputes attendance_monthly for the period from attendance_daily; does not commit
+    month_start, month_end = payroll_engine.month_bounds(period)
+    last_day = connection.execute("""
+        SELECT MAX(work_date) FROM attendance_daily WHERE work_date >= ? AND work_date <= ?
+    """, (month_start, month_end)).fetchone()[0]
+    if last_day is None:
+        return 0
+    return connection.execute(MONTHLY_UPSERT, {'period': period, 'month_start': month_start,
+                                               'month_end': month_end, 'last_day': last_day}).rowcount
+
+
+def refresh_leave_periods(connection, date_ranges):
+    # Leave recorded after the punches were imported changes which days are
+    # loss of pay; recomputes the months the (date_from, date_to) ranges
+    # touch. Does not commit.
+    periods = set()
+    for date_from, date_to in date_ranges:
+        period = date_from[:7]
+        while period <= date_to[:7]:
+            periods.add(period)
+            period = payroll_engine.next_month_start(period)[:7]
+    for period in sorted(periods):
+        summarize_period(connection, period)
+    return periods
+
+
+def import_file(connection, file_path, file_format=None, max_open_days=MAX_OPEN_DAYS):
+    # Raises ValueError for a file already imported or without the required columns
+    checksum = file_checksum(file_path)
+    result = IngestResult()
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        imported = connection.execute("SELECT file_name, imported_at FROM attendance_files WHERE checksum = ?",
+                                      (checksum,)).fetchone()
+        if imported:
+            raise ValueError(f"This file was already imported as {imported[0]} on {imported[1]}")
+
+        ingest_punches(connection, read_punches(file_path, file_format), result, max_open_days)
+        for period in sorted(result.periods):
+            summarize_period(connection, period)
+        connection.execute("""
+            INSERT INTO attendance_files (checksum, file_name, punches, rejected, imported_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (checksum, os.path.basename(file_path), result.punches, result.error_count,
+              datetime.now().isoformat(timespec='seconds')))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return result
+
+
+def monthly_summary(connection, period):
+    # (employee_id, days_present, lop_days, overtime_minutes) per employee
+    return connection.execute("""
+        SELECT employee_id, days_present, lop_days, overtime_minutes FROM attendance_monthly
+        WHERE period = ? ORDER BY employee_id
+    """, (period,)).fetchall()
+
+
+def main():
+    import schema
+
+    parser = argparse.ArgumentParser(description="Import biometric punch logs into attendance")
+    parser.add_argument("files", nargs="+", help="CSV or JSON lines punch files")
+    parser.add_argument("--format", choices=PUNCH_FORMATS, help="default: from the file extension")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        for file_path in args.files:
+            try:
+                result = import_file(connection, file_path, args.format)
+            except (OSError, ValueError) as err:
+                print(f"{file_path}: {err}")
+                continue
+            print(f"{file_path}: {result.punches} punches, {result.error_count} rejected, "
+                  f"months {', '.join(sorted(result.periods)) or '-'}")
+            for line, problem in result.errors[:20]:
+                print(f"  line {line}: {problem}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
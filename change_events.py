@@ -0,0 +1,38 @@
+# Typed change notifications from the repositories to the open screens. Every
+# single-record write publishes a ChangeEvent (table, kind, primary key) once
+# it has committed; list screens subscribe per table and patch the one
+# affected row instead of reloading the whole list. Events are delivered
+# synchronously on the publishing thread.
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+class ChangeEvent:
+    __slots__ = ('table', 'kind', 'key')
+
+    def __init__(self, table, kind, key):
+        self.table = table
+        self.kind = kind
+        self.key = key
+
+    def __repr__(self):
+        return f"ChangeEvent({self.table!r}, {self.kind!r}, {self.key!r})"
+
+
+class ChangeBus:
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, table, callback):
+        # Returns a function that removes the subscription again
+        callbacks = self.subscribers.setdefault(table, [])
+        callbacks.append(callback)
+        return lambda: callback in callbacks and callbacks.remove(callback)
+
+    def publish(self, table, kind, key):
+        event = ChangeEvent(table, kind, key)
+        for callback in list(self.subscribers.get(table, ())):
+            callback(event)
+        return event
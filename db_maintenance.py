@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+# Online backup and space reclamation for employee.db. Backups copy the live
+# database in page batches with the sqlite3 backup API, pausing between batches
+# so the application keeps working while a backup is running.
+
+DEFAULT_DB_PATH = 'employee.db'
+DEFAULT_BACKUP_DIR = 'backups'
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_PAUSE_SECONDS = 0.01
+BACKUP_RETENTION = 7
+OPTIMIZE_INTERVAL_MS = 6 * 60 * 60 * 1000
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def backup_database(db_path=DEFAULT_DB_PATH, backup_dir=DEFAULT_BACKUP_DIR,
+                    pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_PAUSE_SECONDS,
+                    keep=BACKUP_RETENTION, progress=None):
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    backup_path = os.path.join(backup_dir, f"{name}_{stamp}.db")
+    partial_path = backup_path + ".partial"
+
+    def on_step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        # Give writers on other connections a window between page batches
+        if remaining and pause:
+            time.sleep(pause)
+
+    source = sqlite3.connect(db_path, timeout=10)
+    target = sqlite3.connect(partial_path)
+    try:
+        source.backup(target, pages=pages, progress=on_step)
+    except sqlite3.Error:
+        target.close()
+        os.remove(partial_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    # Only complete copies ever carry the .db name
+    os.replace(partial_path, backup_path)
+    rotate_backups(backup_dir, name, keep)
+    return backup_path
+
+
+def list_backups(backup_dir=DEFAULT_BACKUP_DIR, name='employee'):
+    if not os.path.isdir(backup_dir):
+        return []
+    # Timestamped names sort chronologically
+    return sorted(os.path.join(backup_dir, f) for f in os.listdir(backup_dir)
+                  if f.startswith(f"{name}_") and f.endswith(".db"))
+
+
+def rotate_backups(backup_dir=DEFAULT_BACKUP_DIR, name='employee', keep=BACKUP_RETENTION):
+    backups = list_backups(backup_dir, name)
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def get_auto_vacuum(connection):
+    return connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def enable_incremental_vacuum(connection):
+    # Switching an existing database to incremental mode needs one full VACUUM
+    if get_auto_vacuum(connection) == AUTO_VACUUM_INCREMENTAL:
+        return False
+    connection.commit()
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("VACUUM")
+    return True
+
+
+def reclaim_space(connection, max_pages=None):
+    # Returns the number of free pages given back to the file system
+    free_before = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    if get_auto_vacuum(connection) != AUTO_VACUUM_INCREMENTAL or not free_before:
+        return 0
+
+    # The pragma frees one page per step; executescript runs it to completion,
+    # where execute() would stop after the first page
+    connection.commit()
+    if max_pages:
+        connection.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+    else:
+        connection.executescript("PRAGMA incremental_vacuum")
+
+    free_after = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    return free_before - free_after
+
+
+def compact_into(connection, target_path):
+    # VACUUM INTO writes a defragmented copy without taking the database offline
+    if os.path.exists(target_path):
+        raise FileExistsError(target_path)
+    connection.commit()
+    connection.execute("VACUUM INTO ?", (target_path,))
+    return target_path
+
+
+def optimize(connection):
+    connection.execute("PRAGMA optimize")
+
+
+def run_routine_maintenance(connection, max_pages=1000):
+    optimize(connection)
+    return reclaim_space(connection, max_pages)
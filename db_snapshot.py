@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+
+# Point-in-time copies of the payroll database for long reads (reports, exports).
+# Reading from a snapshot means the shared connection never holds a read lock for
+# the length of a report, so payroll inserts on other stations are not stalled.
+
+DEFAULT_DB_PATH = 'employee.db'
+SNAPSHOT_MODES = ('memory', 'file', 'wal')
+
+
+def take_snapshot(source, target=':memory:', pages=-1):
+    # source may be an open connection or a database path; pages=-1 copies the
+    # whole file in one step so the source is only locked for the copy itself
+    owns_source = not isinstance(source, sqlite3.Connection)
+    if owns_source:
+        source = sqlite3.connect(source)
+
+    snapshot = sqlite3.connect(target)
+    try:
+        source.backup(snapshot, pages=pages)
+    except sqlite3.Error:
+        snapshot.close()
+        raise
+    finally:
+        if owns_source:
+            source.close()
+
+    snapshot.row_factory = sqlite3.Row
+    return snapshot
+
+
+def is_wal_database(db_path=DEFAULT_DB_PATH):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+    finally:
+        connection.close()
+
+
+class ReadSnapshot:
+    # Context manager handing out a read-only view that stays consistent for the
+    # whole block:
+    #   memory - backup API copy into an in-memory database (small/medium files)
+    #   file   - backup API copy into a temporary file (large files)
+    #   wal    - a dedicated read transaction on a WAL database, no copy at all
+    def __init__(self, db_path=DEFAULT_DB_PATH, mode='memory'):
+        if mode not in SNAPSHOT_MODES:
+            raise ValueError(f"Unknown snapshot mode: {mode}")
+        self.db_path = db_path
+        self.mode = mode
+        self.connection = None
+        self.temp_path = None
+
+    def __enter__(self):
+        if self.mode == 'wal' and not is_wal_database(self.db_path):
+            # Without WAL a long read transaction blocks writers, so copy instead
+            self.mode = 'memory'
+
+        if self.mode == 'wal':
+            self.connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                              isolation_level=None)
+            self.connection.row_factory = sqlite3.Row
+            # The read transaction starts at the first read and pins the WAL snapshot
+            self.connection.execute("BEGIN")
+            self.connection.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        elif self.mode == 'file':
+            fd, self.temp_path = tempfile.mkstemp(prefix="payroll_snapshot_", suffix=".db")
+            os.close(fd)
+            self.connection = take_snapshot(self.db_path, self.temp_path)
+        else:
+            self.connection = take_snapshot(self.db_path)
+
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.connection:
+            if self.mode == 'wal':
+                self.connection.execute("COMMIT")
+            self.connection.close()
+            self.connection = None
+
+        if self.temp_path:
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+            self.temp_path = None
+        return False
@@ -0,0 +1,335 @@
+import argparse
+import csv
+import hashlib
+import io
+import os
+import re
+import sqlite3
+from datetime import date
+
+import archive
+import money
+import pay_runs
+import payroll_engine
+
+# Bank transfer files for a committed pay run. The run's payroll rows are read
+# with their employees' bank accounts in chunks of CHUNK_SIZE and written
+# straight out as CSV or as a fixed-width upload file, so memory stays flat
+# however large the run. A new file is started whenever one reaches the
+# bank's row limit; each fixed-width file ends in a trailer with its control
+# totals, and the manifest lists every file with its row count, total and
+# SHA-256 for the bank's upload portal. Rows that cannot be paid by transfer
+# (no or invalid bank account, nothing to pay) go to an exceptions file.
+# Exporting a period again first removes that period's earlier files from the
+# folder, so a stale bank or exceptions file is never left beside new ones.
+#
+#   python disbursement.py export 2025-03 bank/ --format fixed --max-rows 10000
+#   python disbursement.py accounts bank_accounts.csv
+#
+# Account CSV columns: employee_id, account_holder, account_number, ifsc
+
+DEFAULT_DB_PATH = 'employee.db'
+BANK_FORMATS = ('csv', 'fixed')
+CHUNK_SIZE = 5000
+# Rows per file; banks cap the size of a single upload
+DEFAULT_MAX_ROWS = 25000
+ACCOUNT_COLUMNS = ('employee_id', 'account_holder', 'account_number', 'ifsc')
+IFSC_PATTERN = re.compile(r"[A-Z]{4}0[A-Z0-9]{6}")
+ACCOUNT_NUMBER_PATTERN = re.compile(r"[0-9]{6,18}")
+
+DISBURSEMENT_QUERY = """
+    SELECT p.payroll_id, p.employee_id, p.employee_name, p.final_pay,
+           b.account_holder, b.account_number, b.ifsc
+    FROM {source} p
+    LEFT JOIN employee_bank_accounts b ON b.employee_id = p.employee_id
+    WHERE p.run_id = ?
+    ORDER BY p.payroll_id
+"""
+
+CSV_HEADER = ('reference', 'beneficiary_name', 'account_number', 'ifsc', 'amount')
+
+# Fixed-width records: a record type letter, then (name, width, numeric)
+# fields. Numeric fields are right-aligned and zero-filled, text is upper
+# case, left-aligned and space-filled; anything too long is cut to the width.
+# Amounts are in paise.
+FIXED_HEADER = ('H', (('batch', 20, False), ('value_date', 8, True), ('file_number', 4, True)))
+FIXED_DETAIL = ('D', (('reference', 20, False), ('account_number', 18, True), ('ifsc', 11, False),
+                      ('amount', 15, True), ('beneficiary_name', 35, False)))
+FIXED_TRAILER = ('T', (('rows', 9, True), ('total', 17, True)))
+
+
+class DisbursementFile:
+    __slots__ = ('name', 'rows', 'total', 'checksum')
+
+    def __init__(self, name, rows, total, checksum):
+        self.name = name
+        self.rows = rows
+        self.total = total
+        self.checksum = checksum
+
+
+class DisbursementResult:
+    __slots__ = ('files', 'exceptions', 'manifest')
+
+    def __init__(self, files, exceptions, manifest):
+        self.files = files
+        # (payroll_id, employee_id, employee_name, final_pay, problem) per unpaid row
+        self.exceptions = exceptions
+        self.manifest = manifest
+
+    @property
+    def rows(self):
+        return sum(file.rows for file in self.files)
+
+    @property
+    def total(self):
+        return sum(file.total for file in self.files)
+
+
+def fixed_record(layout, values):
+    record_type, layout = layout
+    fields = [record_type]
+    for name, width, numeric in layout:
+        value = str(values[name])
+        if numeric:
+            fields.append(value.rjust(width, "0")[-width:])
+        else:
+            fields.append(value.upper().ljust(width)[:width])
+    return "".join(fields) + "\r\n"
+
+
+class BankFileWriter:
+    # Writes one format across as many files as the row limit needs; the
+    # checksum and control totals are kept as the bytes go out
+    def __init__(self, target, period, fmt, max_rows, value_date):
+        self.target = target
+        self.period = period
+        self.fmt = fmt
+        self.max_rows = max_rows
+        self.value_date = value_date
+        self.files = []
+        self.file = None
+        self.name = None
+        self.rows = self.total = 0
+        self.digest = None
+
+    def open_next(self):
+        number = len(self.files) + 1
+        name = f"salary_{self.period}_{number:03d}.{'csv' if self.fmt == 'csv' else 'txt'}"
+        self.file = open(os.path.join(self.target, name), "wb")
+        self.name, self.rows, self.total, self.digest = name, 0, 0, hashlib.sha256()
+        if self.fmt == 'csv':
+            self.emit(csv_line(CSV_HEADER))
+        else:
+            self.emit(fixed_record(FIXED_HEADER, {'batch': f"SALARY {self.period}", 'file_number': number,
+                                                  'value_date': self.value_date.replace("-", "")}))
+
+    def emit(self, text):
+        data = text.encode('ascii', 'replace')
+        self.digest.update(data)
+        self.file.write(data)
+
+    def write_chunk(self, payments):
+        # payments: (reference, name, account_number, ifsc, amount in paise)
+        start = 0
+        while start < len(payments):
+            if self.file is None:
+                self.open_next()
+            take = payments[start:start + self.max_rows - self.rows]
+            if self.fmt == 'csv':
+                text = csv_lines((reference, name, account, ifsc, money.format_amount(amount))
+                                 for reference, name, account, ifsc, amount in take)
+            else:
+                text = "".join(fixed_record(FIXED_DETAIL, {
+                    'reference': reference, 'beneficiary_name': name, 'account_number': account,
+                    'ifsc': ifsc, 'amount': amount}) for reference, name, account, ifsc, amount in take)
+            self.emit(text)
+            self.rows += len(take)
+            self.total += sum(payment[4] for payment in take)
+            start += len(take)
+            if self.rows >= self.max_rows:
+                self.close_file()
+
+    def close_file(self):
+        if self.file is None:
+            return
+        if self.fmt == 'fixed':
+            self.emit(fixed_record(FIXED_TRAILER, {'rows': self.rows, 'total': self.total}))
+        self.file.close()
+        self.file = None
+        self.files.append(DisbursementFile(self.name, self.rows, self.total, self.digest.hexdigest()))
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\r\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def csv_line(row):
+    return csv_lines([row])
+
+
+def payment_problem(final_pay, account_number, ifsc):
+    if final_pay <= 0:
+        return "Nothing to pay"
+    if account_number is None:
+        return "No bank account on record"
+    if not ACCOUNT_NUMBER_PATTERN.fullmatch(account_number) or not IFSC_PATTERN.fullmatch(ifsc or ""):
+        return "Invalid account number or IFSC"
+    return None
+
+
+def iter_disbursement(connection, run_id, period, chunk_size=CHUNK_SIZE):
+    # A run in an archived fiscal year is read from its archive
+    source = archive.table_source(connection, 'payroll', payroll_engine.month_bounds(period)[0],
+                                  payroll_engine.next_month_start(period))
+    cursor = connection.execute(DISBURSEMENT_QUERY.format(source=source), (run_id,))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def export_file_names(period):
+    # Matches every file an export of the period writes, and nothing else
+    return re.compile(rf"salary_{re.escape(period)}_(\d{{3}}\.(csv|txt)|manifest\.csv|exceptions\.csv)")
+
+
+def remove_previous_export(target, period):
+    pattern = export_file_names(period)
+    removed = [name for name in os.listdir(target) if pattern.fullmatch(name)]
+    for name in removed:
+        os.remove(os.path.join(target, name))
+    return removed
+
+
+def export_disbursement(connection, period, target, fmt='csv', max_rows=DEFAULT_MAX_ROWS,
+                        chunk_size=CHUNK_SIZE, value_date=None):
+    if fmt not in BANK_FORMATS:
+        raise ValueError(f"Unknown bank file format: {fmt}")
+    if max_rows < 1:
+        raise ValueError("The row limit per file must be at least 1")
+    run = pay_runs.get_run(connection, period)
+    if not run or run['status'] != 'committed':
+        raise ValueError(f"There is no committed pay run for {period}")
+
+    os.makedirs(target, exist_ok=True)
+    remove_previous_export(target, period)
+    writer = BankFileWriter(target, period, fmt, max_rows, value_date or run['payment_date'] or
+                            date.today().isoformat())
+    exceptions = []
+    try:
+        for rows in iter_disbursement(connection, run['run_id'], period, chunk_size):
+            payments = []
+            for payroll_id, employee_id, employee_name, final_pay, holder, account, ifsc in rows:
+                problem = payment_problem(final_pay, account, ifsc)
+                if problem:
+                    exceptions.append((payroll_id, employee_id, employee_name, final_pay, problem))
+                    continue
+                payments.append((f"SAL{period.replace('-', '')}-{payroll_id}", holder or employee_name,
+                                 account, ifsc, final_pay))
+            writer.write_chunk(payments)
+        writer.close_file()
+    finally:
+        if writer.file is not None:
+            writer.file.close()
+
+    manifest = os.path.join(target, f"salary_{period}_manifest.csv")
+    with open(manifest, mode='w', newline='') as file:
+        out = csv.writer(file)
+        out.writerow(['file', 'rows', 'total', 'sha256'])
+        out.writerows((entry.name, entry.rows, money.format_amount(entry.total), entry.checksum)
+                      for entry in writer.files)
+        out.writerow(['all files', sum(entry.rows for entry in writer.files),
+                      money.format_amount(sum(entry.total for entry in writer.files)), ''])
+    if exceptions:
+        with open(os.path.join(target, f"salary_{period}_exceptions.csv"), mode='w', newline='') as file:
+            out = csv.writer(file)
+            out.writerow(['payroll_id', 'employee_id', 'employee_name', 'net_pay', 'problem'])
+            out.writerows((payroll_id, employee_id, name, money.format_amount(final_pay), problem)
+                          for payroll_id, employee_id, name, final_pay, problem in exceptions)
+    return DisbursementResult(writer.files, exceptions, manifest)
+
+
+def import_accounts(connection, file_path):
+    # Adds or replaces employees' bank accounts from a CSV file; returns
+    # (saved, [(line, problem), ...])
+    accounts, problems = [], []
+    with open(file_path, newline='') as file:
+        reader = csv.DictReader(file)
+        missing = [column for column in ACCOUNT_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        for line, record in enumerate(reader, start=2):
+            account = (record['account_number'] or "").strip()
+            ifsc = (record['ifsc'] or "").strip().upper()
+            try:
+                employee_id = int(record['employee_id'])
+            except (TypeError, ValueError):
+                problems.append((line, "Bad employee id"))
+                continue
+            if not ACCOUNT_NUMBER_PATTERN.fullmatch(account) or not IFSC_PATTERN.fullmatch(ifsc):
+                problems.append((line, "Invalid account number or IFSC"))
+                continue
+            accounts.append((line, employee_id, (record['account_holder'] or "").strip(), account, ifsc))
+
+    with connection:
+        known = {row[0] for row in connection.execute("SELECT employee_id FROM employees")}
+        problems += [(account[0], "Unknown employee") for account in accounts if account[1] not in known]
+        accounts = [account[1:] for account in accounts if account[1] in known]
+        problems.sort()
+        connection.executemany("""
+            INSERT INTO employee_bank_accounts (employee_id, account_holder, account_number, ifsc)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(employee_id) DO UPDATE SET
+                account_holder = excluded.account_holder,
+                account_number = excluded.account_number,
+                ifsc = excluded.ifsc
+        """, accounts)
+    return len(accounts), problems
+
+
+def main():
+    import schema
+
+    parser = argparse.ArgumentParser(description="Bank transfer files for committed pay runs")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the bank files for a committed pay run")
+    export.add_argument("period", help="pay period, YYYY-MM")
+    export.add_argument("target", help="output directory")
+    export.add_argument("--format", choices=BANK_FORMATS, default='csv')
+    export.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS, help="rows per file")
+    export.add_argument("--value-date", help="transfer date, YYYY-MM-DD; default: the run's payment date")
+    accounts = commands.add_parser("accounts", help="import employees' bank accounts from CSV")
+    accounts.add_argument("csv_file")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        if args.command == "accounts":
+            saved, problems = import_accounts(connection, args.csv_file)
+            print(f"{saved} bank accounts saved, {len(problems)} rejected")
+            for line, problem in problems[:20]:
+                print(f"  line {line}: {problem}")
+            return
+
+        result = export_disbursement(connection, args.period, args.target, args.format, args.max_rows,
+                                     value_date=args.value_date)
+    except (OSError, ValueError) as err:
+        parser.error(str(err))
+    finally:
+        connection.close()
+
+    for entry in result.files:
+        print(f"{entry.name}: {entry.rows} transfers, {money.format_inr(entry.total)}, sha256 {entry.checksum}")
+    print(f"{result.rows} transfers totalling {money.format_inr(result.total)}; manifest {result.manifest}")
+    if result.exceptions:
+        print(f"{len(result.exceptions)} employees not paid by transfer; see the exceptions file")
+
+
+if __name__ == "__main__":
+    main()
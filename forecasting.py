@@ -0,0 +1,251 @@
+import argparse
+import sqlite3
+from array import array
+from datetime import date
+
+import payroll_engine
+import salary_policy
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# What-if salary cost forecasting. Current salaries of active employees are
+# loaded once into one integer array per pay component. A scenario scales each
+# component by a factor from a start month onwards, so the workforce cost of
+# any scenario in any month is a weighted sum of the component totals: the
+# arrays are summed once and every scenario x month is evaluated from those
+# sums (as one matrix product when numpy is available). payroll is never read.
+#
+# Components with a salary formula (salary_policy.py) are taken as a pay run
+# would compute them, as of the end of the first forecast month. A scenario
+# changes the amounts on the salary records; formula components follow from
+# those, so they are recomputed for a scenario that changes an amount some
+# formula reads, and otherwise keep their current totals.
+#
+#   python forecasting.py --months 12 "raise: base=7 da=2" "bonus: bonus=50 tax=12"
+
+DEFAULT_DB_PATH = 'employee.db'
+DEFAULT_MONTHS = 12
+COMPONENTS = ('base', 'hra', 'da', 'bonus')
+
+# The four components first, then what the salary formulas read
+CURRENT_SALARY_QUERY = """
+    SELECT s.base_salary AS gross_salary, s.hra, s.da, IFNULL(s.bonus, 0) AS bonus,
+           e.employee_id, e.city, e.status, e.hire_date
+    FROM employees e
+    JOIN employee_salary s ON e.employee_id = s.employee_id
+    WHERE e.status = 'active'
+    AND s.effective_date = (
+        SELECT MAX(effective_date)
+        FROM employee_salary
+        WHERE employee_id = e.employee_id
+    )
+"""
+
+
+class Scenario:
+    # Percent changes per component, the tax rate and the first forecast
+    # month (1-based) the changes apply from
+    __slots__ = ('name', 'base', 'hra', 'da', 'bonus', 'tax', 'start_month')
+
+    def __init__(self, name, base=0, hra=0, da=0, bonus=0, tax=payroll_engine.TAX_PERCENT, start_month=1):
+        self.name = name
+        self.base = base
+        self.hra = hra
+        self.da = da
+        self.bonus = bonus
+        self.tax = tax
+        self.start_month = start_month
+
+    def factors(self):
+        return [1 + getattr(self, component) / 100 for component in COMPONENTS]
+
+    @classmethod
+    def parse(cls, text):
+        # "name: base=7 da=2 start=4" (any of base, hra, da, bonus, tax, start)
+        name, _, settings = text.partition(":")
+        if not settings:
+            name, settings = "Scenario", name
+        values = {}
+        for item in settings.replace(",", " ").split():
+            key, _, value = item.partition("=")
+            key = 'start_month' if key == 'start' else key
+            if key not in cls.__slots__[1:] or not value:
+                raise ValueError(f"Unknown scenario setting: {item!r}")
+            try:
+                values[key] = int(value) if key == 'start_month' else float(value)
+            except ValueError:
+                raise ValueError(f"Not a number: {item!r}")
+        if values.get('start_month', 1) < 1:
+            raise ValueError("start must be 1 or later")
+        return cls(name.strip() or "Scenario", **values)
+
+
+class SalaryColumns:
+    # Current monthly salary components of the active workforce, in paise, as
+    # stored on the salary records. With a salary policy the rows are kept too,
+    # and the formula components are totalled as the policy computes them.
+    def __init__(self, policy=None, as_of=None):
+        self.columns = {component: array('q') for component in COMPONENTS}
+        self.policy = policy
+        self.as_of = as_of
+        self.fields = ()
+        self.rows = []
+        self.policy_totals = dict.fromkeys(policy.formulas, 0) if policy else {}
+
+    @classmethod
+    def load(cls, connection, as_of=None):
+        as_of = as_of or payroll_engine.month_bounds(forecast_periods(1)[0])[1]
+        salaries = cls(salary_policy.load_policy(connection), as_of)
+        base, hra, da, bonus = (salaries.columns[component] for component in COMPONENTS)
+        cursor = connection.execute(CURRENT_SALARY_QUERY)
+        salaries.fields = tuple(column[0] for column in cursor.description)
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for row in rows:
+                base.append(row[0])
+                hra.append(row[1])
+                da.append(row[2])
+                bonus.append(row[3])
+            if salaries.policy:
+                salaries.rows.extend(rows)
+                for component, total in salaries.policy_component_totals(rows).items():
+                    salaries.policy_totals[component] += total
+        return salaries
+
+    def __len__(self):
+        return len(self.columns['base'])
+
+    def totals(self):
+        # Per component, as the current pay run would pay it
+        if numpy is not None:
+            stored = [int(numpy.frombuffer(self.columns[component], dtype=numpy.int64).sum())
+                      for component in COMPONENTS]
+        else:
+            stored = [sum(self.columns[component]) for component in COMPONENTS]
+        return [self.policy_totals.get(component, total) for component, total in zip(COMPONENTS, stored)]
+
+    def linear_factors(self, scenario):
+        # Formula components are not scaled by their own percentage; their
+        # amount comes from the formula
+        return [1 if component in self.policy_totals else factor
+                for component, factor in zip(COMPONENTS, scenario.factors())]
+
+    def needs_policy(self, scenario):
+        # Whether the scenario changes an amount some formula reads
+        if not self.policy:
+            return False
+        used = {name for _, names in self.policy.compiled.values() for name in names}
+        return any(getattr(scenario, component) for component in COMPONENTS if component in used)
+
+    def policy_component_totals(self, rows, factors=None):
+        # Totals of the formula components over rows, with the stored amounts
+        # scaled by factors first
+        records = [dict(zip(self.fields, row)) for row in rows]
+        if factors:
+            for record in records:
+                for column, factor in zip(('gross_salary', 'hra', 'da', 'bonus'), factors):
+                    record[column] = round(record[column] * factor)
+        self.policy.evaluate(records, self.as_of)
+        return {component: sum(record[component] for record in records) for component in self.policy_totals}
+
+    def scenario_gross(self, scenario):
+        # Monthly gross under a scenario that changes formula inputs
+        factors = scenario.factors()
+        gross = sum(round(total * factor) for component, total, factor in
+                    zip(COMPONENTS, self.totals(), factors) if component not in self.policy_totals)
+        for start in range(0, len(self.rows), 10000):
+            gross += sum(self.policy_component_totals(self.rows[start:start + 10000], factors).values())
+        return gross
+
+
+class CostCurve:
+    __slots__ = ('scenario', 'periods', 'gross', 'tax', 'net')
+
+    def __init__(self, scenario, periods, gross, tax, net):
+        self.scenario = scenario
+        self.periods = periods
+        self.gross = gross
+        self.tax = tax
+        self.net = net
+
+    def total(self, series='gross'):
+        return sum(getattr(self, series))
+
+
+def forecast_periods(months, start=None):
+    # The months after the current one: the first month a raise could apply
+    start = start or date.today()
+    index = start.year * 12 + start.month
+    return [f"{(index + offset) // 12:04d}-{(index + offset) % 12 + 1:02d}" for offset in range(months)]
+
+
+def evaluate(salaries, scenarios, months=DEFAULT_MONTHS, start=None):
+    # One CostCurve per scenario; amounts are paise, rounded per month
+    totals = salaries.totals()
+    baseline = sum(totals)
+    periods = forecast_periods(months, start)
+
+    if numpy is not None:
+        factors = numpy.array([salaries.linear_factors(scenario) for scenario in scenarios], dtype=float)
+        scenario_gross = list(factors @ numpy.array(totals, dtype=float))
+    else:
+        scenario_gross = [sum(factor * total for factor, total in zip(salaries.linear_factors(scenario), totals))
+                          for scenario in scenarios]
+    # Scenarios that change what a formula reads go through the policy again
+    for index, scenario in enumerate(scenarios):
+        if salaries.needs_policy(scenario):
+            scenario_gross[index] = salaries.scenario_gross(scenario)
+
+    curves = []
+    for scenario, changed_gross in zip(scenarios, scenario_gross):
+        gross = [round(float(changed_gross)) if month >= scenario.start_month else baseline
+                 for month in range(1, months + 1)]
+        # The scenario's tax rate also starts with its start month
+        rates = [scenario.tax if month >= scenario.start_month else payroll_engine.TAX_PERCENT
+                 for month in range(1, months + 1)]
+        tax = [round(amount * rate / 100) for amount, rate in zip(gross, rates)]
+        net = [amount - deducted for amount, deducted in zip(gross, tax)]
+        curves.append(CostCurve(scenario, periods, gross, tax, net))
+    return curves
+
+
+def forecast(connection, scenarios, months=DEFAULT_MONTHS, include_baseline=True):
+    # Loads the salary columns once and evaluates every scenario against them
+    if include_baseline:
+        scenarios = [Scenario("Current salaries")] + list(scenarios)
+    return evaluate(SalaryColumns.load(connection), scenarios, months)
+
+
+def main():
+    import money
+
+    parser = argparse.ArgumentParser(description="Forecast salary cost under what-if scenarios")
+    parser.add_argument("scenarios", nargs="+", help='e.g. "raise: base=7 da=2 start=4"')
+    parser.add_argument("--months", type=int, default=DEFAULT_MONTHS)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    try:
+        scenarios = [Scenario.parse(text) for text in args.scenarios]
+    except ValueError as err:
+        parser.error(str(err))
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        curves = forecast(connection, scenarios, args.months)
+    finally:
+        connection.close()
+
+    baseline = curves[0].total()
+    for curve in curves:
+        print(f"{curve.scenario.name:<24} gross {money.format_amount(curve.total()):>18}  "
+              f"net {money.format_amount(curve.total('net')):>18}  "
+              f"vs current {money.format_amount(curve.total() - baseline):>16}")
+
+
+if __name__ == "__main__":
+    main()
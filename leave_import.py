@@ -0,0 +1,270 @@
+import argparse
+import csv
+import sqlite3
+from datetime import date, timedelta
+
+import archive
+import attendance
+import leave_ledger
+
+# Bulk import of leave records exported by the attendance system. The file is
+# checked as a whole before anything is written: incoming leaves and the
+# employees' existing leaves over the same dates are sorted once per employee
+# and swept in date order, so every overlap or duplicate is found in
+# O(n log n) without a query per record. Clean rows are inserted and charged
+# to the leave ledger with batched writes in one transaction; rejected rows
+# are reported with the reason and can be written back out as CSV.
+#
+#   python leave_import.py leaves.csv --rejects rejected.csv
+#
+# CSV columns: employee_id, date_from, date_to (YYYY-MM-DD, inclusive), reason
+
+DEFAULT_DB_PATH = 'employee.db'
+REQUIRED_COLUMNS = ('employee_id', 'date_from', 'date_to')
+# Employee ids per IN (...) lookup, below SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 500
+
+
+class LeaveRow:
+    __slots__ = ('line', 'employee_id', 'employee_name', 'date_from', 'date_to', 'reason', 'days')
+
+    def __init__(self, line, employee_id, date_from, date_to, reason):
+        self.line = line
+        self.employee_id = employee_id
+        self.employee_name = None
+        self.date_from = date_from
+        self.date_to = date_to
+        self.reason = reason
+        # Inclusive, as when a leave is applied for on screen
+        self.days = (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days + 1
+
+
+class ImportResult:
+    __slots__ = ('inserted', 'rejected')
+
+    def __init__(self, inserted, rejected):
+        self.inserted = inserted
+        # (line, employee_id, date_from, date_to, reason, problem) per rejected row
+        self.rejected = rejected
+
+
+def read_leave_csv(file_path):
+    # Returns (rows, rejected); rejected rows failed basic validation
+    rows, rejected = [], []
+    with open(file_path, newline='') as file:
+        reader = csv.DictReader(file)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        for line, record in enumerate(reader, start=2):
+            values = (record['employee_id'], record['date_from'], record['date_to'], record.get('reason') or "")
+            try:
+                employee_id = int(record['employee_id'])
+                date_from = date.fromisoformat(record['date_from'].strip()).isoformat()
+                date_to = date.fromisoformat(record['date_to'].strip()).isoformat()
+            except (TypeError, ValueError):
+                rejected.append((line,) + values + ("Bad employee id or date",))
+                continue
+            if date_to < date_from:
+                rejected.append((line,) + values + ("Ends before it starts",))
+                continue
+            rows.append(LeaveRow(line, employee_id, date_from, date_to, values[3].strip()))
+    return rows, rejected
+
+
+def employee_names(connection, employee_ids):
+    names = {}
+    employee_ids = sorted(employee_ids)
+    for start in range(0, len(employee_ids), ID_CHUNK_SIZE):
+        chunk = employee_ids[start:start + ID_CHUNK_SIZE]
+        names.update(connection.execute(f"""
+            SELECT employee_id, first_name || ' ' || last_name FROM employees
+            WHERE employee_id IN ({', '.join('?' * len(chunk))})
+        """, chunk))
+    return names
+
+
+def existing_leaves(connection, rows):
+    # One range read over the import's dates, archived years included;
+    # (employee_id, date_from, date_to, leave_id) for the importing employees
+    employees = {row.employee_id for row in rows}
+    first = min(row.date_from for row in rows)
+    last = max(row.date_to for row in rows)
+    day_after = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+    source = archive.table_source(connection, 'leave_register', first, day_after)
+    cursor = connection.execute(f"""
+        SELECT employee_id, date_from, date_to, leave_id FROM {source}
+        WHERE date_from <= ? AND date_to >= ?
+    """, (last, first))
+    return [leave for leave in cursor if leave[0] in employees]
+
+
+def find_conflicts(rows, existing):
+    # Sweep-line pass over every interval sorted by (employee, start, end).
+    # reach is the latest end date seen so far for the employee and holder the
+    # leave it belongs to; an interval starting on or before reach overlaps.
+    # Existing leaves sort ahead of incoming ones with the same dates, so an
+    # exact copy of a leave is always adjacent to it and reported as a
+    # duplicate. Rejected rows do not extend reach, so later rows are only
+    # judged against leaves that will actually be on record.
+    # Returns {line: problem} for the incoming rows that cannot be imported.
+    intervals = [(employee_id, date_from, date_to, 0, leave_id, None)
+                 for employee_id, date_from, date_to, leave_id in existing]
+    intervals += [(row.employee_id, row.date_from, row.date_to, 1, row.line, row) for row in rows]
+    intervals.sort(key=lambda interval: interval[:5])
+
+    problems = {}
+    employee = reach = holder = previous = None
+    for employee_id, date_from, date_to, _, number, row in intervals:
+        if employee_id != employee:
+            employee, reach, holder, previous = employee_id, None, None, None
+        label = f"line {number}" if row is not None else f"leave {number}"
+
+        if row is not None and reach is not None and date_from <= reach:
+            if previous and previous[:2] == (date_from, date_to):
+                problems[row.line] = f"Duplicate of {previous[2]}"
+            else:
+                problems[row.line] = f"Overlaps {holder[2]} ({holder[0]} to {holder[1]})"
+            continue
+
+        previous = (date_from, date_to, label)
+        if reach is None or date_to > reach:
+            reach, holder = date_to, previous
+    return problems
+
+
+def check_leaves(connection, rows):
+    # Returns (clean rows, rejected); fills in employee names on the way
+    names = employee_names(connection, {row.employee_id for row in rows})
+    rejected, known = [], []
+    for row in rows:
+        if row.employee_id in names:
+            row.employee_name = names[row.employee_id]
+            known.append(row)
+        else:
+            rejected.append(rejection(row, "Unknown employee"))
+    if not known:
+        return [], rejected
+
+    problems = find_conflicts(known, existing_leaves(connection, known))
+    clean = []
+    for row in known:
+        if row.line in problems:
+            rejected.append(rejection(row, problems[row.line]))
+        else:
+            clean.append(row)
+    return clean, rejected
+
+
+def rejection(row, problem):
+    return (row.line, row.employee_id, row.date_from, row.date_to, row.reason, problem)
+
+
+def insert_leaves(connection, rows):
+    # Inserts the leaves and charges them to the ledger in date order per
+    # employee, as consume_leave would one at a time. Does not commit.
+    rows = sorted(rows, key=lambda row: (row.employee_id, row.date_from))
+    employee_ids = sorted({row.employee_id for row in rows})
+    connection.executemany("INSERT INTO leave_balances (employee_id, balance) VALUES (?, 0) "
+                           "ON CONFLICT(employee_id) DO NOTHING", [(employee_id,) for employee_id in employee_ids])
+    balances = {}
+    for start in range(0, len(employee_ids), ID_CHUNK_SIZE):
+        chunk = employee_ids[start:start + ID_CHUNK_SIZE]
+        balances.update(connection.execute(f"""
+            SELECT employee_id, balance FROM leave_balances
+            WHERE employee_id IN ({', '.join('?' * len(chunk))})
+        """, chunk))
+
+    charges = []
+    for row in rows:
+        paid, unpaid = leave_ledger.split_leave(balances[row.employee_id], row.days)
+        balances[row.employee_id] -= paid
+        charges.append((row, paid, unpaid, balances[row.employee_id]))
+
+    last_leave_id = connection.execute("SELECT IFNULL(MAX(leave_id), 0) FROM leave_register").fetchone()[0]
+    connection.executemany("""
+        INSERT INTO leave_register (employee_id, employee_name, date_from, date_to, reason,
+                                    leaves, current_leaves, unpaid_days)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(row.employee_id, row.employee_name, row.date_from, row.date_to, row.reason,
+           row.days, row.days, unpaid) for row, _, unpaid, _ in charges])
+
+    # Clean rows never share an employee and start date, so that pair finds each new leave_id
+    leave_ids = {(employee_id, date_from): leave_id for leave_id, employee_id, date_from in connection.execute(
+        "SELECT leave_id, employee_id, date_from FROM leave_register WHERE leave_id > ?", (last_leave_id,))}
+    connection.executemany("""
+        INSERT INTO leave_ledger (employee_id, entry_date, entry_type, days, unpaid_days,
+                                  balance_after, leave_id)
+        VALUES (?, ?, 'consumption', ?, ?, ?, ?)
+    """, [(row.employee_id, row.date_from, -paid, unpaid, balance, leave_ids[row.employee_id, row.date_from])
+          for row, paid, unpaid, balance in charges])
+    connection.executemany("UPDATE leave_balances SET balance = ? WHERE employee_id = ?",
+                           [(balance, employee_id) for employee_id, balance in balances.items()])
+    attendance.refresh_leave_periods(connection, [(row.date_from, row.date_to) for row in rows])
+    return len(charges)
+
+
+def import_leaves(connection, rows, dry_run=False):
+    # Checks and inserts inside one write transaction, so no leave can slip in
+    # between the overlap check and the insert
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        clean, rejected = check_leaves(connection, rows)
+        inserted = 0 if dry_run else insert_leaves(connection, clean)
+        if dry_run:
+            connection.rollback()
+        else:
+            connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    return ImportResult(len(clean) if dry_run else inserted, sorted(rejected))
+
+
+def import_file(connection, file_path, dry_run=False):
+    rows, rejected = read_leave_csv(file_path)
+    result = import_leaves(connection, rows, dry_run) if rows else ImportResult(0, [])
+    result.rejected = sorted(rejected + result.rejected)
+    return result
+
+
+def export_rejections(rejected, file_path):
+    with open(file_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['line', 'employee_id', 'date_from', 'date_to', 'reason', 'problem'])
+        writer.writerows(rejected)
+    return len(rejected)
+
+
+def main():
+    import schema
+
+    parser = argparse.ArgumentParser(description="Import leave records from a CSV file")
+    parser.add_argument("csv_file")
+    parser.add_argument("--rejects", help="write rejected rows and their problems to this CSV file")
+    parser.add_argument("--dry-run", action="store_true", help="check the file without importing")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        result = import_file(connection, args.csv_file, args.dry_run)
+    except ValueError as err:
+        parser.error(str(err))
+    finally:
+        connection.close()
+
+    verb = "would be imported" if args.dry_run else "imported"
+    print(f"{result.inserted} leaves {verb}, {len(result.rejected)} rejected")
+    for line, employee_id, date_from, date_to, _, problem in result.rejected[:20]:
+        print(f"  line {line}: employee {employee_id} {date_from} to {date_to}: {problem}")
+    if args.rejects and result.rejected:
+        export_rejections(result.rejected, args.rejects)
+        print(f"Rejected rows written to {args.rejects}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import sqlite3
+from datetime import date
+
+# Leave accounting. Every change to an employee's leave entitlement is a row in
+# leave_ledger (accrual, consumption, adjustment, lapse); leave_balances keeps the
+# running balance, updated in the same transaction as each ledger row, so a
+# balance check is a primary-key lookup rather than a sum over history.
+# leave_year_balances snapshots each closed year for carry-forward; the year is
+# closed from Leave Management or here:
+#
+#   python leave_ledger.py close 2025            # snapshot balances, lapse above the cap
+#   python leave_ledger.py adjust 17 2.5 --note "Comp off for Diwali weekend"
+#   python leave_ledger.py show 17 2025
+#
+# Functions here never commit; callers decide the transaction boundary.
+
+DEFAULT_DB_PATH = 'employee.db'
+MONTHLY_ACCRUAL_DAYS = 1.5
+CARRY_FORWARD_CAP_DAYS = 30
+ENTRY_TYPES = ('accrual', 'consumption', 'adjustment', 'lapse')
+
+
+def get_balance(connection, employee_id):
+    row = connection.execute("SELECT balance FROM leave_balances WHERE employee_id = ?",
+                             (employee_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def lock_balance(connection, employee_id):
+    # The insert opens the write transaction, so nobody else can change this
+    # balance between our read and our update
+    connection.execute("INSERT INTO leave_balances (employee_id, balance) VALUES (?, 0) "
+                       "ON CONFLICT(employee_id) DO NOTHING", (employee_id,))
+    return get_balance(connection, employee_id)
+
+
+def post_entry(connection, employee_id, entry_type, days, entry_date=None, leave_id=None,
+               period=None, note=None, unpaid_days=0):
+    if entry_type not in ENTRY_TYPES:
+        raise ValueError(f"Unknown ledger entry type: {entry_type}")
+
+    entry_date = entry_date or date.today().isoformat()
+    balance = lock_balance(connection, employee_id) + days
+
+    connection.execute("""
+        INSERT INTO leave_ledger (employee_id, entry_date, entry_type, days, unpaid_days,
+                                  balance_after, leave_id, period, note)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (employee_id, entry_date, entry_type, days, unpaid_days, balance, leave_id, period, note))
+    connection.execute("UPDATE leave_balances SET balance = ? WHERE employee_id = ?", (balance, employee_id))
+    return balance
+
+
+def split_leave(balance, days):
+    # Days covered by the balance are paid; the rest are leave without pay
+    paid = min(max(balance, 0), days)
+    return paid, days - paid
+
+
+def consume_leave(connection, employee_id, leave_id, days, entry_date=None):
+    paid, unpaid = split_leave(lock_balance(connection, employee_id), days)
+    post_entry(connection, employee_id, 'consumption', -paid, entry_date, leave_id=leave_id,
+               unpaid_days=unpaid)
+    connection.execute("UPDATE leave_register SET unpaid_days = ? WHERE leave_id = ?", (unpaid, leave_id))
+    return paid, unpaid
+
+
+def adjust_balance(connection, employee_id, days, note=None, entry_date=None):
+    return post_entry(connection, employee_id, 'adjustment', days, entry_date, note=note)
+
+
+def accrue_month(connection, period, days=MONTHLY_ACCRUAL_DAYS):
+    # Credits every active employee once per period; re-running is a no-op
+    entry_date = f"{period}-01"
+    params = {'period': period, 'days': days, 'entry_date': entry_date}
+    pending = """
+        SELECT employee_id FROM employees e
+        WHERE e.status = 'active'
+        AND NOT EXISTS (SELECT 1 FROM leave_ledger l
+                        WHERE l.employee_id = e.employee_id
+                        AND l.entry_type = 'accrual' AND l.period = :period)
+    """
+
+    connection.execute(f"""
+        INSERT INTO leave_balances (employee_id, balance)
+        SELECT employee_id, 0 FROM ({pending})
+        WHERE true
+        ON CONFLICT(employee_id) DO NOTHING
+    """, params)
+    updated = connection.execute(f"""
+        UPDATE leave_balances SET balance = balance + :days
+        WHERE employee_id IN ({pending})
+    """, params).rowcount
+    connection.execute(f"""
+        INSERT INTO leave_ledger (employee_id, entry_date, entry_type, days, balance_after, period)
+        SELECT b.employee_id, :entry_date, 'accrual', :days, b.balance, :period
+        FROM leave_balances b
+        WHERE b.employee_id IN ({pending})
+    """, params)
+    return updated
+
+
+def close_year(connection, year, carry_forward_cap=CARRY_FORWARD_CAP_DAYS):
+    # Snapshots each balance at year end and lapses anything above the cap
+    if connection.execute("SELECT 1 FROM leave_year_balances WHERE year = ? LIMIT 1", (year,)).fetchone():
+        raise ValueError(f"Leave year {year} is already closed")
+
+    entry_date = date(year, 12, 31).isoformat()
+    # The closing balance is the ledger as of 31 December, not the live
+    # balance, which already holds any accruals or leave posted since
+    connection.execute("""
+        WITH closing AS (
+            SELECT b.employee_id,
+                   IFNULL((SELECT SUM(l.days) FROM leave_ledger l
+                           WHERE l.employee_id = b.employee_id AND l.entry_date <= :year_end), 0) AS balance
+            FROM leave_balances b
+        )
+        INSERT INTO leave_year_balances (employee_id, year, opening_balance, closing_balance, carried_forward)
+        SELECT c.employee_id, :year,
+               IFNULL((SELECT carried_forward FROM leave_year_balances p
+                       WHERE p.employee_id = c.employee_id AND p.year = :year - 1), 0),
+               c.balance,
+               MIN(c.balance, :cap)
+        FROM closing c
+    """, {'year': year, 'year_end': entry_date, 'cap': carry_forward_cap})
+
+    lapsing = connection.execute("""
+        SELECT employee_id, closing_balance - carried_forward FROM leave_year_balances
+        WHERE year = ? AND closing_balance > carried_forward
+    """, (year,)).fetchall()
+    for employee_id, lapse_days in lapsing:
+        post_entry(connection, employee_id, 'lapse', -lapse_days, entry_date,
+                   period=str(year), note=f"Above carry-forward cap of {carry_forward_cap} days")
+    return len(lapsing)
+
+
+def year_snapshot(connection, employee_id, year):
+    return connection.execute("""
+        SELECT opening_balance, closing_balance, carried_forward
+        FROM leave_year_balances WHERE employee_id = ? AND year = ?
+    """, (employee_id, year)).fetchone()
+
+
+def main():
+    import schema
+
+    parser = argparse.ArgumentParser(description="Close leave years and adjust leave balances")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    close = commands.add_parser("close", help="snapshot balances at year end and lapse days above the cap")
+    close.add_argument("year", type=int)
+    adjust = commands.add_parser("adjust", help="add (or with a negative number deduct) days")
+    adjust.add_argument("employee_id", type=int)
+    adjust.add_argument("days", type=float)
+    adjust.add_argument("--note")
+    show = commands.add_parser("show", help="an employee's balance and year-end snapshot")
+    show.add_argument("employee_id", type=int)
+    show.add_argument("year", type=int, nargs="?")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        if args.command == "close":
+            with connection:
+                lapsed = close_year(connection, args.year)
+            print(f"Leave year {args.year} closed; {lapsed} balances lapsed above "
+                  f"{CARRY_FORWARD_CAP_DAYS} days")
+        elif args.command == "adjust":
+            with connection:
+                balance = adjust_balance(connection, args.employee_id, args.days, args.note)
+            print(f"Employee {args.employee_id}: balance {balance:g} days")
+        else:
+            print(f"Employee {args.employee_id}: balance {get_balance(connection, args.employee_id):g} days")
+            if args.year:
+                snapshot = year_snapshot(connection, args.employee_id, args.year)
+                if snapshot:
+                    print(f"{args.year}: opening {snapshot[0]:g}, closing {snapshot[1]:g}, "
+                          f"carried forward {snapshot[2]:g}")
+                else:
+                    print(f"{args.year}: not closed")
+    except ValueError as err:
+        parser.error(str(err))
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
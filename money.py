@@ -0,0 +1,52 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Money is stored and computed as integer paise. Rupee strings only appear at the
+# edges: parsing user input and formatting values for display or export.
+
+PAISE_PER_RUPEE = 100
+
+# Columns holding paise amounts, used when rows leave the application (API, exports)
+MONEY_COLUMNS = frozenset({
+    'base_salary', 'hra', 'da', 'bonus',
+    'deducted_salary', 'income_tax', 'final_pay',
+})
+
+
+def to_paise(value):
+    # Accepts user input such as "25000", "25,000.50" or "₹1,200"
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    text = str(value).replace(",", "").replace("₹", "").strip()
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return int((amount * PAISE_PER_RUPEE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def divide_round(numerator, denominator):
+    # Integer division rounding half away from zero, so no float ever touches money
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def percent_of(amount, percent):
+    return divide_round(amount * percent, 100)
+
+
+def format_amount(paise):
+    # Plain decimal rupees, e.g. for edit boxes, CSV and JSON: "-1234.50"
+    sign = "-" if paise < 0 else ""
+    rupees, remainder = divmod(abs(int(paise)), PAISE_PER_RUPEE)
+    return f"{sign}{rupees}.{remainder:02d}"
+
+
+def format_inr(paise):
+    # Display format used across the UI: "₹1,234.50"
+    sign = "-" if paise < 0 else ""
+    rupees, remainder = divmod(abs(int(paise)), PAISE_PER_RUPEE)
+    return f"{sign}₹{rupees:,}.{remainder:02d}"
@@ -0,0 +1,186 @@
+import argparse
+import sqlite3
+
+# Org hierarchy: departments and cost centers in a tree, with employees
+# assigned to a unit. org_unit_closure stores every (ancestor, descendant,
+# depth) pair, each unit included as its own ancestor at depth 0, so "this
+# unit and everything below it" is one primary-key range at any depth and
+# filters never walk the tree in Python. Pay runs stamp each payroll row with
+# the employee's unit, and the payroll rollups carry it as a key column, so
+# subtree totals come from one indexed join against the closure.
+#
+# Functions here never commit; callers decide the transaction boundary.
+#
+#   python org_units.py add FIN "Finance" --type department
+#   python org_units.py add FIN-AP "Accounts Payable" --type cost_center --parent FIN
+#   python org_units.py totals 2025-04 2026-03
+
+DEFAULT_DB_PATH = 'employee.db'
+UNIT_TYPES = ('department', 'cost_center')
+UNIT_COLUMNS = ('unit_id', 'code', 'name', 'unit_type', 'parent_id')
+TOTAL_COLUMNS = ('unit_id', 'headcount', 'gross', 'net')
+
+# The ids of a unit's subtree, the unit itself included; bind the unit's code
+SUBTREE_BY_CODE = """
+    SELECT c.descendant_id FROM org_unit_closure c
+    JOIN org_units u ON u.unit_id = c.ancestor_id
+    WHERE u.code = ?
+"""
+
+
+def unit_by_code(connection, code):
+    row = connection.execute(f"SELECT {', '.join(UNIT_COLUMNS)} FROM org_units WHERE code = ?",
+                             (code.strip(),)).fetchone()
+    return dict(zip(UNIT_COLUMNS, row)) if row else None
+
+
+def list_units(connection):
+    # Every unit as (unit_id, code, name, unit_type, parent_id, depth) in tree
+    # order, each parent followed by its subtree. Depth and the sort path
+    # (ancestor codes joined by char(1), which sorts before any code
+    # character) come from the closure rather than a walk.
+    return connection.execute("""
+        SELECT u.unit_id, u.code, u.name, u.unit_type, u.parent_id,
+               (SELECT MAX(depth) FROM org_unit_closure WHERE descendant_id = u.unit_id)
+        FROM org_units u
+        ORDER BY (SELECT group_concat(code, char(1)) FROM (
+                      SELECT a.code FROM org_unit_closure c
+                      JOIN org_units a ON a.unit_id = c.ancestor_id
+                      WHERE c.descendant_id = u.unit_id
+                      ORDER BY c.depth DESC))
+    """).fetchall()
+
+
+def add_unit(connection, code, name, unit_type, parent_id=None):
+    if unit_type not in UNIT_TYPES:
+        raise ValueError(f"Unit type must be one of {', '.join(UNIT_TYPES)}")
+    if not code.strip() or not name.strip():
+        raise ValueError("Code and name are required")
+    try:
+        unit_id = connection.execute("INSERT INTO org_units (code, name, unit_type, parent_id) VALUES (?, ?, ?, ?)",
+                                     (code.strip(), name.strip(), unit_type, parent_id)).lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Org unit code {code.strip()} is already in use")
+
+    # The new unit's ancestors are its parent's ancestors one level further up
+    connection.execute("""
+        INSERT INTO org_unit_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, :unit, depth + 1 FROM org_unit_closure WHERE descendant_id = :parent
+        UNION ALL
+        SELECT :unit, :unit, 0
+    """, {'unit': unit_id, 'parent': parent_id})
+    return unit_id
+
+
+def move_unit(connection, unit_id, parent_id):
+    # Re-parents a unit with its whole subtree; parent_id None makes it a root
+    if parent_id is not None and connection.execute(
+            "SELECT 1 FROM org_unit_closure WHERE ancestor_id = ? AND descendant_id = ?",
+            (unit_id, parent_id)).fetchone():
+        raise ValueError("A unit cannot be moved under itself or one of its own units")
+
+    # Drop the paths from the old ancestors into the subtree, then link every
+    # new ancestor to every member of the subtree
+    connection.execute("""
+        DELETE FROM org_unit_closure
+        WHERE descendant_id IN (SELECT descendant_id FROM org_unit_closure WHERE ancestor_id = :unit)
+        AND ancestor_id NOT IN (SELECT descendant_id FROM org_unit_closure WHERE ancestor_id = :unit)
+    """, {'unit': unit_id})
+    connection.execute("""
+        INSERT INTO org_unit_closure (ancestor_id, descendant_id, depth)
+        SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+        FROM org_unit_closure above, org_unit_closure below
+        WHERE above.descendant_id = :parent AND below.ancestor_id = :unit
+    """, {'unit': unit_id, 'parent': parent_id})
+    connection.execute("UPDATE org_units SET parent_id = ? WHERE unit_id = ?", (parent_id, unit_id))
+
+
+def delete_unit(connection, unit_id):
+    # Only empty leaves go; pay history keeps pointing at the units it was paid under
+    in_use = connection.execute("""
+        SELECT EXISTS(SELECT 1 FROM org_units WHERE parent_id = :unit)
+            OR EXISTS(SELECT 1 FROM employees WHERE org_unit_id = :unit)
+            OR EXISTS(SELECT 1 FROM payroll_rollups WHERE org_unit_id = :unit)
+    """, {'unit': unit_id}).fetchone()[0]
+    if in_use:
+        raise ValueError("Only units without sub-units, employees or pay history can be deleted")
+    connection.execute("DELETE FROM org_unit_closure WHERE descendant_id = ?", (unit_id,))
+    connection.execute("DELETE FROM org_units WHERE unit_id = ?", (unit_id,))
+
+
+def assign_employee(connection, employee_id, unit_id):
+    connection.execute("UPDATE employees SET org_unit_id = ? WHERE employee_id = ?", (unit_id, employee_id))
+
+
+def subtree_totals(connection, start_period, end_period, unit_id=None):
+    # Headcount (payslips), gross and net per unit over its whole subtree for
+    # the periods, from the rollups in one grouped join; one unit or all of them
+    sql = """
+        SELECT c.ancestor_id, SUM(r.headcount), SUM(r.gross), SUM(r.net)
+        FROM org_unit_closure c
+        JOIN payroll_rollups r ON r.org_unit_id = c.descendant_id
+        WHERE r.period >= ? AND r.period <= ?
+    """
+    params = [start_period, end_period]
+    if unit_id is not None:
+        sql += " AND c.ancestor_id = ?"
+        params.append(unit_id)
+    return {row[0]: dict(zip(TOTAL_COLUMNS, row)) for row in connection.execute(sql + " GROUP BY c.ancestor_id",
+                                                                                params)}
+
+
+def main():
+    import money
+    import schema
+
+    parser = argparse.ArgumentParser(description="Manage departments and cost centers")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add an org unit")
+    add.add_argument("code")
+    add.add_argument("name")
+    add.add_argument("--type", choices=UNIT_TYPES, default='department')
+    add.add_argument("--parent", help="code of the parent unit")
+    move = commands.add_parser("move", help="move a unit and its sub-units under another parent")
+    move.add_argument("code")
+    move.add_argument("--parent", help="code of the new parent; omit for a top-level unit")
+    totals = commands.add_parser("totals", help="headcount, gross and net per unit and its sub-units")
+    totals.add_argument("start_period")
+    totals.add_argument("end_period")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+
+        def unit_id_for(code):
+            if code is None:
+                return None
+            unit = unit_by_code(connection, code)
+            if unit is None:
+                parser.error(f"Unknown org unit: {code}")
+            return unit['unit_id']
+
+        with connection:
+            if args.command == "add":
+                add_unit(connection, args.code, args.name, args.type, unit_id_for(args.parent))
+            elif args.command == "move":
+                move_unit(connection, unit_id_for(args.code), unit_id_for(args.parent))
+
+        if args.command == "totals":
+            results = subtree_totals(connection, args.start_period, args.end_period)
+        for unit_id, code, name, unit_type, _, depth in list_units(connection):
+            line = f"{'  ' * depth}{code:<12} {name} ({unit_type})"
+            if args.command == "totals":
+                total = results.get(unit_id, {'headcount': 0, 'gross': 0, 'net': 0})
+                line = (f"{line:<50} {total['headcount']:>7} {money.format_inr(total['gross']):>16} "
+                        f"{money.format_inr(total['net']):>16}")
+            print(line)
+    except ValueError as err:
+        parser.error(str(err))
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
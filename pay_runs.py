@@ -0,0 +1,145 @@
+import os
+import socket
+from datetime import datetime, timedelta
+
+import payroll_rollups
+
+# Pay-run registry. pay_runs holds one row per pay period (its unique key), so
+# "has this month been paid" is an index lookup rather than a scan of payroll,
+# and a stray payroll row no longer blocks a month. A run moves through
+#
+#   draft -> computing -> committed -> reverted (-> computing again)
+#
+# claim_run takes the period under BEGIN IMMEDIATE: of two stations starting
+# the same month, one gets the claim and the other is told who holds it. The
+# claimant computes outside the write lock and commits its payroll rows, each
+# carrying the run_id, together with the status change; a claim it no longer
+# holds is refused. A failed run goes back to draft with its error.
+
+STATUSES = ('draft', 'computing', 'committed', 'reverted')
+# A computing claim older than this belongs to a station that died mid-run
+CLAIM_TIMEOUT_MINUTES = 30
+
+RUN_COLUMNS = ('run_id', 'period', 'status', 'claimed_by', 'claimed_at', 'payment_date', 'employees',
+               'created_at', 'committed_at', 'reverted_at', 'last_error', 'policy_version')
+
+
+class PayRunConflict(ValueError):
+    # The period is committed, or claimed by another station
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def station_id():
+    # Who holds a claim, as shown to the other stations
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def timestamp(moment=None):
+    return (moment or datetime.now()).isoformat(timespec='seconds')
+
+
+def get_run(connection, period):
+    # Dict of RUN_COLUMNS, or None when the period has no run yet
+    row = connection.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM pay_runs WHERE period = ?",
+                             (period,)).fetchone()
+    return dict(zip(RUN_COLUMNS, row)) if row else None
+
+
+def run_status(connection, period):
+    row = connection.execute("SELECT status FROM pay_runs WHERE period = ?", (period,)).fetchone()
+    return row[0] if row else None
+
+
+def is_committed(connection, period):
+    return run_status(connection, period) == 'committed'
+
+
+def register_run(connection, period, now=None):
+    # Records a draft run, e.g. once the scheduler has queued the month; does not commit
+    connection.execute("""
+        INSERT INTO pay_runs (period, status, created_at) VALUES (?, 'draft', ?)
+        ON CONFLICT(period) DO NOTHING
+    """, (period, timestamp(now)))
+
+
+def claim_run(connection, period, owner, now=None):
+    # Returns the run_id now held by owner; raises PayRunConflict otherwise
+    now = now or datetime.now()
+    stale_before = timestamp(now - timedelta(minutes=CLAIM_TIMEOUT_MINUTES))
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        run = get_run(connection, period)
+        if run and run['status'] == 'committed':
+            raise PayRunConflict(f"Payroll has already been generated for {period}", 'committed')
+        if (run and run['status'] == 'computing' and run['claimed_by'] != owner
+                and run['claimed_at'] >= stale_before):
+            raise PayRunConflict(f"Payroll for {period} is being generated by {run['claimed_by']} "
+                                 f"(since {run['claimed_at']})", 'computing')
+
+        connection.execute("""
+            INSERT INTO pay_runs (period, status, claimed_by, claimed_at, created_at)
+            VALUES (:period, 'computing', :owner, :now, :now)
+            ON CONFLICT(period) DO UPDATE SET
+                status = 'computing', claimed_by = excluded.claimed_by,
+                claimed_at = excluded.claimed_at, last_error = NULL
+        """, {'period': period, 'owner': owner, 'now': timestamp(now)})
+        run_id = connection.execute("SELECT run_id FROM pay_runs WHERE period = ?", (period,)).fetchone()[0]
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return run_id
+
+
+def mark_committed(connection, run_id, owner, payment_date, employees, policy_version=None, now=None):
+    # Inside the transaction that writes the run's payroll rows
+    updated = connection.execute("""
+        UPDATE pay_runs SET status = 'committed', payment_date = ?, employees = ?, committed_at = ?,
+                            policy_version = ?
+        WHERE run_id = ? AND status = 'computing' AND claimed_by = ?
+    """, (payment_date, employees, timestamp(now), policy_version, run_id, owner)).rowcount
+    if not updated:
+        raise PayRunConflict("This station no longer holds the pay run; it was taken over or "
+                             "reverted while computing", 'computing')
+
+
+def release_run(connection, run_id, owner, error=None):
+    # Hands a failed or abandoned claim back as a draft
+    connection.execute("""
+        UPDATE pay_runs SET status = 'draft', claimed_by = NULL, claimed_at = NULL, last_error = ?
+        WHERE run_id = ? AND status = 'computing' AND claimed_by = ?
+    """, (error, run_id, owner))
+    connection.commit()
+
+
+def revert_run(connection, period, now=None):
+    # Deletes a committed run's payroll rows so the month can be run again;
+    # returns the number of rows removed
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        run = get_run(connection, period)
+        if not run or run['status'] != 'committed':
+            raise PayRunConflict(f"There is no committed pay run for {period}", run and run['status'])
+        deleted = connection.execute("DELETE FROM payroll WHERE run_id = ?", (run['run_id'],)).rowcount
+        if run['employees'] and not deleted:
+            raise ValueError(f"The pay run for {period} has been archived and cannot be reverted")
+        payroll_rollups.rebuild_period(connection, period)
+        # Arrears the run paid are owed again; those still owed for the month
+        # itself are dropped, as running it again pays the current salary
+        connection.execute("UPDATE salary_arrears SET settled_run_id = NULL WHERE settled_run_id = ?",
+                           (run['run_id'],))
+        connection.execute("DELETE FROM salary_arrears WHERE period = ? AND settled_run_id IS NULL", (period,))
+        connection.execute("""
+            UPDATE pay_runs SET status = 'reverted', claimed_by = NULL, claimed_at = NULL, reverted_at = ?
+            WHERE run_id = ?
+        """, (timestamp(now), run['run_id']))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return deleted
+
@@ -0,0 +1,516 @@
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import archive
+import money
+import pay_runs
+import payroll_engine
+import repositories
+import schema
+
+# Local HTTP/JSON service exposing the operations of the desktop app.
+# Requests are parsed on an asyncio loop; database work runs on a bounded pool of
+# SQLite connections in worker threads. Reads use their own read-only connections
+# and all writes go through a single writer connection, so under WAL a running
+# write never blocks the readers. Amounts are exchanged as decimal rupee strings
+# ("25000.00") and stored as integer paise.
+#
+#   python payroll_api.py --host 127.0.0.1 --port 8080 --readers 8
+
+DEFAULT_DB_PATH = 'employee.db'
+DEFAULT_READERS = 8
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BODY_BYTES = 1024 * 1024
+REQUEST_TIMEOUT = 30
+
+EMPLOYEE_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'address', 'city',
+                   'state', 'postal_code', 'country', 'hire_date', 'status')
+EMPLOYEE_STATUSES = ('active', 'on_leave', 'terminated')
+SALARY_FIELDS = ('base_salary', 'hra', 'da', 'bonus', 'effective_date')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def open_read_connection(db_path):
+    connection = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
+def open_write_connection(db_path):
+    connection = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    schema.upgrade_database(connection)
+    return connection
+
+
+class ConnectionPool:
+    # A fixed set of connections handed out one request at a time; callers queue
+    # on the pool instead of opening connections, which bounds SQLite contention
+    def __init__(self, factory, db_path, size):
+        self.connections = [factory(db_path) for _ in range(size)]
+        self.available = asyncio.Queue()
+        for connection in self.connections:
+            self.available.put_nowait(connection)
+
+    async def run(self, executor, func, *args):
+        connection = await self.available.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, connection, *args)
+        finally:
+            self.available.put_nowait(connection)
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+def page_params(query):
+    try:
+        after = int(query.get('after', 0))
+        limit = min(int(query.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "after and limit must be integers")
+    if limit < 1:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be positive")
+    return after, limit
+
+
+def serialize(row):
+    item = dict(row)
+    for key in money.MONEY_COLUMNS.intersection(item):
+        if item[key] is not None:
+            item[key] = money.format_amount(item[key])
+    return item
+
+
+def archived_rows(connection, table, sql, params, key, limit, start_date=None, end_date=None):
+    # sql selects FROM {source}, ordered by key and limited; archived fiscal
+    # years beyond the attach limit are read in batches and the pages merged
+    rows = []
+    for source in archive.table_sources(connection, table, start_date, end_date):
+        rows.extend(connection.execute(sql.format(source=source), params).fetchall())
+    return sorted(rows, key=lambda row: row[key])[:limit]
+
+
+def page_result(rows, key, limit):
+    items = [serialize(row) for row in rows]
+    # Keyset pagination: clients pass next_after back as ?after= for the next page
+    next_after = items[-1][key] if len(items) == limit else None
+    return {'items': items, 'next_after': next_after}
+
+
+def parse_period(value):
+    if not value or not re.fullmatch(r"\d{4}-\d{2}", value) or not 1 <= int(value[5:]) <= 12:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "period must be in YYYY-MM format")
+    return value
+
+
+def parse_date(value, field):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{field} must be in YYYY-MM-DD format")
+
+
+def require_fields(body, fields):
+    missing = [field for field in fields if body.get(field) in (None, "")]
+    if missing:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Missing fields: {', '.join(missing)}")
+
+
+# Employees
+
+def list_employees(connection, query, body):
+    after, limit = page_params(query)
+    sql = ("SELECT employee_id, first_name, last_name, email, phone, hire_date, status "
+           "FROM employees WHERE employee_id > ?")
+    params = [after]
+
+    search_term = query.get('search')
+    if search_term:
+        sql += " AND (first_name LIKE ? OR last_name LIKE ? OR email LIKE ?)"
+        params += [f"%{search_term}%"] * 3
+
+    sql += " ORDER BY employee_id LIMIT ?"
+    params.append(limit)
+    return HTTPStatus.OK, page_result(connection.execute(sql, params).fetchall(), 'employee_id', limit)
+
+
+def get_employee(connection, query, body, employee_id):
+    row = connection.execute("SELECT * FROM employees WHERE employee_id = ?", (employee_id,)).fetchone()
+    if not row:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Employee not found")
+    return HTTPStatus.OK, dict(row)
+
+
+def create_employee(connection, query, body):
+    body.setdefault('status', 'active')
+    require_fields(body, EMPLOYEE_FIELDS)
+    if body['status'] not in EMPLOYEE_STATUSES:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"status must be one of {', '.join(EMPLOYEE_STATUSES)}")
+    parse_date(body['hire_date'], 'hire_date')
+
+    cursor = connection.execute(f"""
+        INSERT INTO employees ({', '.join(EMPLOYEE_FIELDS)})
+        VALUES ({', '.join('?' * len(EMPLOYEE_FIELDS))})
+    """, [body[field] for field in EMPLOYEE_FIELDS])
+    connection.commit()
+    return HTTPStatus.CREATED, {'employee_id': cursor.lastrowid}
+
+
+def update_employee(connection, query, body, employee_id):
+    _, employee = get_employee(connection, query, body, employee_id)
+    employee.update({field: body[field] for field in EMPLOYEE_FIELDS if field in body})
+
+    require_fields(employee, ('first_name', 'last_name', 'email', 'hire_date'))
+    if employee['status'] not in EMPLOYEE_STATUSES:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"status must be one of {', '.join(EMPLOYEE_STATUSES)}")
+
+    connection.execute(f"""
+        UPDATE employees SET {', '.join(f'{field} = ?' for field in EMPLOYEE_FIELDS)}
+        WHERE employee_id = ?
+    """, [employee[field] for field in EMPLOYEE_FIELDS] + [employee_id])
+    connection.commit()
+    return HTTPStatus.OK, employee
+
+
+def delete_employee(connection, query, body, employee_id):
+    get_employee(connection, query, body, employee_id)
+
+    # Same rule as the desktop app, archived fiscal years included: employees
+    # with history are terminated, not deleted
+    if repositories.EmployeeRepo(connection).has_related_records(employee_id):
+        raise ApiError(HTTPStatus.CONFLICT,
+                       "Cannot delete employee with associated records. "
+                       "Consider changing status to 'terminated' instead.")
+
+    connection.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
+    connection.commit()
+    return HTTPStatus.NO_CONTENT, None
+
+
+# Salary records
+
+def list_salaries(connection, query, body, employee_id=None):
+    after, limit = page_params(query)
+    sql = "SELECT * FROM employee_salary WHERE salary_id > ?"
+    params = [after]
+
+    employee_id = employee_id or query.get('employee_id')
+    if employee_id:
+        sql += " AND employee_id = ?"
+        params.append(int(employee_id))
+
+    sql += " ORDER BY salary_id LIMIT ?"
+    params.append(limit)
+    return HTTPStatus.OK, page_result(connection.execute(sql, params).fetchall(), 'salary_id', limit)
+
+
+def salary_values(body):
+    require_fields(body, SALARY_FIELDS)
+    try:
+        amounts = [money.to_paise(body[field]) for field in ('base_salary', 'hra', 'da', 'bonus')]
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Salary components must be numbers")
+    parse_date(body['effective_date'], 'effective_date')
+    return amounts + [body['effective_date']]
+
+
+def create_salary(connection, query, body):
+    require_fields(body, ('employee_id',))
+    get_employee(connection, query, body, body['employee_id'])
+
+    cursor = connection.execute("""
+        INSERT INTO employee_salary (employee_id, base_salary, hra, da, bonus, effective_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [body['employee_id']] + salary_values(body))
+    connection.commit()
+    return HTTPStatus.CREATED, {'salary_id': cursor.lastrowid}
+
+
+def update_salary(connection, query, body, salary_id):
+    row = connection.execute("SELECT * FROM employee_salary WHERE salary_id = ?", (salary_id,)).fetchone()
+    if not row:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Salary record not found")
+    salary = serialize(row)
+    salary.update({field: body[field] for field in SALARY_FIELDS if field in body})
+
+    connection.execute("""
+        UPDATE employee_salary
+        SET base_salary = ?, hra = ?, da = ?, bonus = ?, effective_date = ?
+        WHERE salary_id = ?
+    """, salary_values(salary) + [salary_id])
+    connection.commit()
+    return HTTPStatus.OK, salary
+
+
+# Leave applications
+
+def list_leaves(connection, query, body, employee_id=None):
+    after, limit = page_params(query)
+    # Archived fiscal years included
+    sql = "SELECT * FROM {source} WHERE leave_id > ?"
+    params = [after]
+
+    employee_id = employee_id or query.get('employee_id')
+    if employee_id:
+        sql += " AND employee_id = ?"
+        params.append(int(employee_id))
+
+    sql += " ORDER BY leave_id LIMIT ?"
+    params.append(limit)
+    rows = archived_rows(connection, 'leave_register', sql, params, 'leave_id', limit)
+    return HTTPStatus.OK, page_result(rows, 'leave_id', limit)
+
+
+def get_leave_balance(connection, query, body, employee_id):
+    get_employee(connection, query, body, employee_id)
+    return HTTPStatus.OK, {'employee_id': employee_id,
+                           'balance': repositories.LeaveRepo(connection).balance(employee_id)}
+
+
+def create_leave(connection, query, body):
+    require_fields(body, ('employee_id', 'date_from', 'date_to', 'reason'))
+    _, employee = get_employee(connection, query, body, body['employee_id'])
+
+    from_date = parse_date(body['date_from'], 'date_from')
+    to_date = parse_date(body['date_to'], 'date_to')
+    leave_days = (to_date - from_date).days + 1
+    if leave_days < 1:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "date_to must not be before date_from")
+
+    leave_id, unpaid_days = repositories.LeaveRepo(connection).insert(
+        employee['employee_id'],
+        f"{employee['first_name']} {employee['last_name']}",
+        body['date_from'],
+        body['date_to'],
+        body['reason'],
+        leave_days
+    )
+    return HTTPStatus.CREATED, {'leave_id': leave_id, 'leaves': leave_days, 'unpaid_days': unpaid_days}
+
+
+# Payroll
+
+def list_payroll(connection, query, body):
+    after, limit = page_params(query)
+    date_range = (None, None)
+    if query.get('period'):
+        period = parse_period(query['period'])
+        date_range = (payroll_engine.month_bounds(period)[0], payroll_engine.next_month_start(period))
+
+    # Only the archived fiscal years the period reaches into, or all of them
+    sql = "SELECT * FROM {source} WHERE payroll_id > ?"
+    params = [after]
+    if query.get('period'):
+        sql += " AND payment_date >= ? AND payment_date < ?"
+        params += list(date_range)
+
+    sql += " ORDER BY payroll_id LIMIT ?"
+    params.append(limit)
+    rows = archived_rows(connection, 'payroll', sql, params, 'payroll_id', limit, *date_range)
+    return HTTPStatus.OK, page_result(rows, 'payroll_id', limit)
+
+
+def create_pay_run(connection, query, body):
+    period = parse_period(body.get('period') or payroll_engine.current_period())
+    if pay_runs.is_committed(connection, period):
+        raise ApiError(HTTPStatus.CONFLICT, f"Payroll has already been generated for {period}")
+
+    if body.get('dry_run'):
+        items = []
+        for record in payroll_engine.fetch_payroll_inputs(connection.cursor(), period):
+            pay = payroll_engine.compute_payroll(record)
+            for key in ('base', 'hra', 'da', 'bonus', 'gross', 'tax', 'leave_deduction', 'arrears', 'net'):
+                pay[key] = money.format_amount(pay[key])
+            items.append(pay)
+        return HTTPStatus.OK, {'period': period, 'items': items}
+
+    payment_date = payroll_engine.payment_date_for(period)
+    try:
+        count = payroll_engine.run_payroll(connection, period, pay_runs.station_id(), payment_date)
+    except pay_runs.PayRunConflict as err:
+        raise ApiError(HTTPStatus.CONFLICT, str(err))
+    return HTTPStatus.CREATED, {'period': period, 'payment_date': payment_date, 'employees': count}
+
+
+# (method, path pattern, handler, pool)
+ROUTES = [
+    ("GET", r"/employees", list_employees, 'read'),
+    ("POST", r"/employees", create_employee, 'write'),
+    ("GET", r"/employees/(\d+)", get_employee, 'read'),
+    ("PUT", r"/employees/(\d+)", update_employee, 'write'),
+    ("DELETE", r"/employees/(\d+)", delete_employee, 'write'),
+    ("GET", r"/employees/(\d+)/salaries", list_salaries, 'read'),
+    ("GET", r"/employees/(\d+)/leaves", list_leaves, 'read'),
+    ("GET", r"/salaries", list_salaries, 'read'),
+    ("POST", r"/salaries", create_salary, 'write'),
+    ("PUT", r"/salaries/(\d+)", update_salary, 'write'),
+    ("GET", r"/employees/(\d+)/leave-balance", get_leave_balance, 'read'),
+    ("GET", r"/leaves", list_leaves, 'read'),
+    ("POST", r"/leaves", create_leave, 'write'),
+    ("GET", r"/payroll", list_payroll, 'read'),
+    ("POST", r"/payroll/runs", create_pay_run, 'write'),
+]
+
+
+class PayrollApiServer:
+    def __init__(self, db_path=DEFAULT_DB_PATH, readers=DEFAULT_READERS):
+        self.db_path = db_path
+        self.readers = readers
+        self.routes = [(method, re.compile(pattern + "$"), handler, pool)
+                       for method, pattern, handler, pool in ROUTES]
+        self.read_pool = None
+        self.write_pool = None
+        self.executor = None
+
+    def start_pools(self):
+        # Writer first so the database is switched to WAL before readers attach
+        self.write_pool = ConnectionPool(open_write_connection, self.db_path, 1)
+        self.read_pool = ConnectionPool(open_read_connection, self.db_path, self.readers)
+        self.executor = ThreadPoolExecutor(max_workers=self.readers + 1,
+                                           thread_name_prefix="payroll-db")
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        for pool in (self.read_pool, self.write_pool):
+            if pool:
+                pool.close()
+
+    def resolve(self, method, path):
+        path_matched = False
+        for route_method, pattern, handler, pool in self.routes:
+            match = pattern.match(path)
+            if match:
+                path_matched = True
+                if route_method == method:
+                    return handler, pool, [int(arg) for arg in match.groups()]
+        if path_matched:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed")
+        raise ApiError(HTTPStatus.NOT_FOUND, "Not found")
+
+    def call_handler(self, connection, handler, query, body, args):
+        try:
+            return handler(connection, query, body, *args)
+        except Exception:
+            # Never hand a connection back to the pool mid-transaction
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+
+    async def dispatch(self, method, target, raw_body):
+        try:
+            url = urlsplit(target)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            handler, pool_name, args = self.resolve(method, url.path.rstrip("/") or "/")
+
+            body = {}
+            if raw_body:
+                try:
+                    body = json.loads(raw_body)
+                except ValueError:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be JSON")
+                if not isinstance(body, dict):
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+
+            pool = self.write_pool if pool_name == 'write' else self.read_pool
+            return await pool.run(self.executor, self.call_handler, handler, query, body, args)
+
+        except ApiError as err:
+            return err.status, {'error': err.message}
+        except ValueError as err:
+            return HTTPStatus.BAD_REQUEST, {'error': str(err)}
+        except sqlite3.IntegrityError as err:
+            return HTTPStatus.CONFLICT, {'error': str(err)}
+        except sqlite3.Error as err:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Database error: {err}"}
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self.send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                    {'error': "Request body too large"}, keep_alive=False)
+                    break
+                raw_body = await asyncio.wait_for(reader.readexactly(length), REQUEST_TIMEOUT) if length else b""
+
+                status, payload = await self.dispatch(method.upper(), target, raw_body)
+                keep_alive = (version == "HTTP/1.1" and headers.get('connection', '').lower() != 'close')
+                await self.send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, payload, keep_alive):
+        body = b"" if payload is None else json.dumps(payload, default=str).encode('utf-8')
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host, port, backlog=1024):
+        self.start_pools()
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=backlog)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payroll JSON API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS,
+                        help="number of pooled read connections")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(PayrollApiServer(args.db, args.readers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import calendar
+from datetime import date, datetime
+from fractions import Fraction
+
+import money
+import pay_runs
+import payroll_rollups
+import salary_policy
+
+# Pay-run computation shared by the desktop app and the JSON API. Everything here
+# takes a cursor/connection so callers decide which connection does the work.
+# All amounts are integer paise (see money.py). Leave days are the unpaid days
+# of the leave register plus the loss-of-pay days from attendance.py; unpaid
+# arrears for earlier months (see arrears.py) are added to the run. HRA, DA
+# and bonus come from the salary policy's formulas where it has one (see
+# salary_policy.py), otherwise from the salary record.
+
+TAX_PERCENT = 10  # 10% tax
+LEAVE_DAYS_PER_MONTH = 30  # 1 day of leave = basic / 30
+
+PAYROLL_INPUT_QUERY = """
+    SELECT
+        e.employee_id,
+        e.first_name || ' ' || e.last_name AS employee_name,
+        IFNULL(l.leaves, 0) + IFNULL(a.lop_days, 0) AS leaves,
+        s.base_salary AS gross_salary,
+        s.hra,
+        s.da,
+        s.bonus,
+        e.org_unit_id,
+        e.city,
+        e.status,
+        e.hire_date,
+        IFNULL(ar.gross, 0) AS arrears_gross,
+        IFNULL(ar.income_tax, 0) AS arrears_tax,
+        IFNULL(ar.deductions, 0) AS arrears_deductions,
+        ar.last_arrear_id AS arrears_through
+    FROM
+        employees e
+    JOIN
+        employee_salary s ON e.employee_id = s.employee_id
+    LEFT JOIN
+        (SELECT employee_id, SUM(unpaid_days) AS leaves
+         FROM leave_register
+         WHERE date_from <= :month_end
+         AND date_to >= :month_start
+         GROUP BY employee_id) l
+    ON e.employee_id = l.employee_id
+    LEFT JOIN
+        attendance_monthly a ON a.period = :period AND a.employee_id = e.employee_id
+    LEFT JOIN
+        (SELECT employee_id, SUM(gross) AS gross, SUM(income_tax) AS income_tax,
+                SUM(deductions) AS deductions, MAX(arrear_id) AS last_arrear_id
+         FROM salary_arrears
+         WHERE settled_run_id IS NULL
+         GROUP BY employee_id) ar
+    ON e.employee_id = ar.employee_id
+    WHERE e.status = 'active'
+    AND s.effective_date = (
+        SELECT MAX(effective_date)
+        FROM employee_salary
+        WHERE employee_id = e.employee_id
+    )
+"""
+
+
+def current_period():
+    return datetime.now().strftime("%Y-%m")
+
+
+def period_label(period):
+    return datetime.strptime(period, "%Y-%m").strftime("%B %Y")
+
+
+def month_bounds(period):
+    # "YYYY-MM" -> (first day, last day) as ISO dates
+    year, month = (int(part) for part in period.split("-"))
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1).isoformat(), date(year, month, last_day).isoformat()
+
+
+def next_month_start(period):
+    year, month = (int(part) for part in period.split("-"))
+    return date(year + month // 12, month % 12 + 1, 1).isoformat()
+
+
+def payment_date_for(period):
+    # Runs for the current month are paid today, back-dated runs on the month end
+    today = date.today().isoformat()
+    month_start, month_end = month_bounds(period)
+    return today if month_start <= today <= month_end else month_end
+
+
+def payroll_input_params(period):
+    month_start, month_end = month_bounds(period)
+    return {"period": period, "month_start": month_start, "month_end": month_end}
+
+
+def fetch_payroll_inputs(cursor, period):
+    # One dict per employee with the salary policy applied to everyone in one
+    # pass; policy_version says which policy, if any, the amounts came from
+    params = payroll_input_params(period)
+    cursor.execute(PAYROLL_INPUT_QUERY, params)
+    columns = [column[0] for column in cursor.description]
+    records = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    policy = salary_policy.load_policy(cursor.connection)
+    if policy:
+        policy.evaluate(records, params['month_end'])
+    for record in records:
+        record['policy_version'] = policy and policy.version
+    return records
+
+
+def compute_payroll(record):
+    base = int(record['gross_salary'])
+    hra = int(record['hra'])
+    da = int(record['da'])
+    bonus = int(record['bonus'] or 0)
+    # Unpaid leave days can be fractional once balances accrue in half days
+    leave_days = Fraction(str(record['leaves'] or 0))
+    leaves = int(leave_days) if leave_days.denominator == 1 else float(leave_days)
+
+    gross = base + hra + da + bonus
+    tax = money.percent_of(gross, TAX_PERCENT)
+
+    # Deduct for leaves (assuming 1 day = basic/30), rounded to the nearest paisa
+    leave_deduction = money.divide_round(base * leave_days.numerator,
+                                         LEAVE_DAYS_PER_MONTH * leave_days.denominator) if leave_days > 0 else 0
+    # Arrears for earlier months come on top, each part as it was computed
+    arrears = record['arrears_gross'] - record['arrears_tax'] - record['arrears_deductions']
+    gross += record['arrears_gross']
+    tax += record['arrears_tax']
+    leave_deduction += record['arrears_deductions']
+    net = gross - tax - leave_deduction
+
+    return {
+        'employee_id': record['employee_id'],
+        'employee_name': record['employee_name'],
+        'leaves': leaves,
+        'base': base,
+        'hra': hra,
+        'da': da,
+        'bonus': bonus,
+        'gross': gross,
+        'tax': tax,
+        'leave_deduction': leave_deduction,
+        'net': net,
+        'org_unit_id': record['org_unit_id'],
+        'status': record['status'],
+        'arrears': arrears,
+        'arrears_through': record['arrears_through'],
+    }
+
+
+def commit_payroll(connection, run_id, owner, records, payment_date):
+    # Writes a claimed run (see pay_runs.claim_run): its payroll rows, their
+    # rollups and the committed status go in one transaction
+    rows, settled = [], []
+    for record in records:
+        pay = compute_payroll(record)
+        if pay['arrears_through'] is not None:
+            settled.append((run_id, pay['employee_id'], pay['arrears_through']))
+        rows.append((
+            pay['employee_id'],
+            pay['employee_name'],
+            pay['leaves'],
+            pay['leave_deduction'],
+            pay['bonus'],
+            pay['tax'],
+            pay['net'],
+            payment_date,
+            run_id,
+            pay['org_unit_id'],
+            pay['status'],
+            pay['arrears']
+        ))
+
+    try:
+        # The write lock is taken before reading the last id, so the rollup
+        # update below sees exactly the rows of this run
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        policy_version = records[0]['policy_version'] if records else None
+        pay_runs.mark_committed(connection, run_id, owner, payment_date, len(rows), policy_version)
+        last_id = payroll_rollups.last_payroll_id(connection)
+        connection.executemany("""
+            INSERT INTO payroll (
+                employee_id, employee_name, leaves, deducted_salary,
+                bonus, income_tax, final_pay, payment_date, run_id, org_unit_id, employee_status, arrears
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        # Arrears lines computed after the inputs were read wait for the next run
+        connection.executemany("""
+            UPDATE salary_arrears SET settled_run_id = ?
+            WHERE employee_id = ? AND arrear_id <= ? AND settled_run_id IS NULL
+        """, settled)
+        payroll_rollups.add_run_to_rollups(connection, last_id)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return len(rows)
+
+
+def run_payroll(connection, period, owner, payment_date=None):
+    # Claims the period, computes it from current data and commits it. Returns
+    # the number of employees paid; raises pay_runs.PayRunConflict when the
+    # period is already paid or another station is running it.
+    run_id = pay_runs.claim_run(connection, period, owner)
+    try:
+        records = fetch_payroll_inputs(connection.cursor(), period)
+        return commit_payroll(connection, run_id, owner, records, payment_date or payment_date_for(period))
+    except pay_runs.PayRunConflict:
+        raise
+    except Exception as err:
+        pay_runs.release_run(connection, run_id, owner, str(err))
+        raise
@@ -0,0 +1,101 @@
+# Pre-aggregated pay-run totals for trend reports. payroll_rollups holds one
+# row per pay period, employee status and org unit (headcount, gross, tax,
+# deductions, net, all in paise); each pay run adds its own totals in the same
+# transaction that inserts its payroll rows, so trend queries never scan the
+# payroll table. An org unit filter covers the unit's whole subtree through
+# org_unit_closure.
+#
+# Functions here never commit; callers decide the transaction boundary.
+
+# Gross is reconstructed from the stored columns: net + tax + leave deduction.
+# Status and org unit are those recorded on the row when it was paid, so a
+# later change to the employee never moves history between rollups.
+ROLLUP_SELECT = """
+    SELECT substr(p.payment_date, 1, 7), IFNULL(p.employee_status, 'unknown'), IFNULL(p.org_unit_id, 0),
+           COUNT(*), SUM(p.final_pay + p.income_tax + p.deducted_salary),
+           SUM(p.income_tax), SUM(p.deducted_salary), SUM(p.final_pay)
+    FROM payroll p
+"""
+
+TREND_COLUMNS = ('period', 'headcount', 'gross', 'income_tax', 'deductions', 'net')
+ROLLUP_COLUMNS = "period, status, org_unit_id, headcount, gross, income_tax, deductions, net"
+SUBTREE_FILTER = "org_unit_id IN (SELECT descendant_id FROM org_unit_closure WHERE ancestor_id = ?)"
+
+
+def last_payroll_id(connection):
+    return connection.execute("SELECT IFNULL(MAX(payroll_id), 0) FROM payroll").fetchone()[0]
+
+
+def add_run_to_rollups(connection, after_payroll_id):
+    # Folds the payroll rows inserted after after_payroll_id into the rollups
+    connection.execute(f"""
+        INSERT INTO payroll_rollups ({ROLLUP_COLUMNS})
+        {ROLLUP_SELECT}
+        WHERE p.payroll_id > ?
+        GROUP BY 1, 2, 3
+        ON CONFLICT(period, status, org_unit_id) DO UPDATE SET
+            headcount = headcount + excluded.headcount,
+            gross = gross + excluded.gross,
+            income_tax = income_tax + excluded.income_tax,
+            deductions = deductions + excluded.deductions,
+            net = net + excluded.net
+    """, (after_payroll_id,))
+
+
+def rebuild_rollups(connection):
+    # Recomputes every period still in the payroll table, for backfills and
+    # repairs; periods moved to archive databases keep their rollups
+    connection.execute("""
+        DELETE FROM payroll_rollups
+        WHERE period IN (SELECT DISTINCT substr(payment_date, 1, 7) FROM payroll)
+    """)
+    connection.execute(f"""
+        INSERT INTO payroll_rollups ({ROLLUP_COLUMNS})
+        {ROLLUP_SELECT}
+        GROUP BY 1, 2, 3
+    """)
+
+
+def rebuild_period(connection, period):
+    # Recomputes one period from its payroll rows, e.g. after a run is reverted
+    connection.execute("DELETE FROM payroll_rollups WHERE period = ?", (period,))
+    connection.execute(f"""
+        INSERT INTO payroll_rollups ({ROLLUP_COLUMNS})
+        {ROLLUP_SELECT}
+        WHERE p.payment_date >= ? AND p.payment_date <= ?
+        GROUP BY 1, 2, 3
+    """, (f"{period}-01", f"{period}-31"))
+
+
+def trend(connection, start_period=None, end_period=None, status=None, org_unit_id=None):
+    # One row per period in TREND_COLUMNS order, oldest first
+    sql = """
+        SELECT period, SUM(headcount), SUM(gross), SUM(income_tax), SUM(deductions), SUM(net)
+        FROM payroll_rollups
+        WHERE period >= ? AND period <= ?
+    """
+    params = [start_period or '0000-00', end_period or '9999-99']
+    if status:
+        sql += " AND status = ?"
+        params.append(status)
+    if org_unit_id is not None:
+        sql += " AND " + SUBTREE_FILTER
+        params.append(org_unit_id)
+    return connection.execute(sql + " GROUP BY period ORDER BY period", params).fetchall()
+
+
+def trend_by_status(connection, start_period=None, end_period=None):
+    return connection.execute("""
+        SELECT period, status, SUM(headcount), SUM(gross), SUM(income_tax), SUM(deductions), SUM(net)
+        FROM payroll_rollups
+        WHERE period >= ? AND period <= ?
+        GROUP BY period, status
+        ORDER BY period, status
+    """, (start_period or '0000-00', end_period or '9999-99')).fetchall()
+
+
+def trend_start(end_period, years):
+    # First period of a window of whole years ending at end_period
+    year, month = (int(part) for part in end_period.split("-"))
+    month_index = year * 12 + month - 1 - (years * 12 - 1)
+    return f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
@@ -1,77 +1,53 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import sqlite3
 from datetime import datetime, date
 import os
-
-
-def initialize_database():
+import threading
+
+import change_events
+import db_maintenance
+import leave_ledger
+import money
+import pay_runs
+import payroll_engine
+import repositories
+import schema
+import settings
+from startup_profile import StartupProfile
+import ui_telemetry
+
+# Modules only needed by individual screens (payslips, snapshots, worker
+# processes) are imported where they are used to keep startup fast.
+
+DEFAULT_DB_PATH = 'employee.db'
+# Tagged on UI metrics so responsiveness can be compared across releases
+APP_VERSION = '1.4.0'
+# Methods that open a window of their own; timed as dialogs by UI telemetry
+DIALOG_METHODS = ('add_employee', 'edit_employee', 'add_salary_record', 'edit_salary_record',
+                  'generate_payroll', 'apply_leave', 'show_reconciliation', 'show_payroll_trends',
+                  'show_group_summary', 'show_cost_forecast', 'show_org_units', 'show_salary_formulas')
+# Background jobs start once the app has settled after login
+JOB_WORKER_DELAY_MS = 30 * 1000
+
+
+def initialize_database(db_path=DEFAULT_DB_PATH, notify=True):
     try:
         # Connect to SQLite database (creates if doesn't exist)
-        connection = sqlite3.connect('employee.db')
+        connection = sqlite3.connect(db_path)
         cursor = connection.cursor()
 
-        # Create tables
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS employees (
-                employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                first_name TEXT NOT NULL,
-                last_name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phone TEXT,
-                address TEXT,
-                city TEXT,
-                state TEXT,
-                postal_code TEXT,
-                country TEXT,
-                hire_date TEXT NOT NULL,
-                status TEXT DEFAULT 'active' CHECK(status IN ('active', 'on_leave', 'terminated'))
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS payroll (
-                payroll_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                employee_name TEXT NOT NULL,
-                leaves INTEGER DEFAULT 0,
-                deducted_salary REAL DEFAULT 0,
-                bonus REAL DEFAULT 0,
-                income_tax REAL DEFAULT 0,
-                final_pay REAL NOT NULL,
-                payment_date TEXT NOT NULL,
-                FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS leave_register (
-                leave_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                employee_name TEXT NOT NULL,
-                date_from TEXT NOT NULL,
-                date_to TEXT NOT NULL,
-                reason TEXT,
-                leaves INTEGER NOT NULL,
-                current_leaves INTEGER NOT NULL,
-                FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS employee_salary (
-                salary_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                base_salary REAL NOT NULL,
-                hra REAL NOT NULL,
-                da REAL NOT NULL,
-                bonus REAL DEFAULT 0,
-                effective_date TEXT NOT NULL,
-                FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
-            )
-        """)
+        # Must be set before the first table is created to take effect
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        # Create tables and bring an existing database up to the current schema
+        schema.upgrade_database(connection)
         connection.commit()
-        messagebox.showinfo("Success", "Database initialized successfully")
+        if notify:
+            messagebox.showinfo("Success", "Database initialized successfully")
 
     except sqlite3.Error as err:
         messagebox.showerror("Database Error", f"Error initializing database:\n{err}")
@@ -80,14 +56,20 @@ def initialize_database():
             connection.close()
 
 
-def create_db_connection():
+def create_db_connection(db_path=DEFAULT_DB_PATH):
     try:
-        # Check if database exists, if not initialize it
-        if not os.path.exists('employee.db'):
-            initialize_database()
+        # Check if database exists, if not initialize it (quietly, this runs at startup)
+        if not os.path.exists(db_path):
+            initialize_database(db_path, notify=False)
 
-        connection = sqlite3.connect('employee.db')
+        connection = sqlite3.connect(db_path, timeout=10)
         connection.row_factory = sqlite3.Row  # To access columns by name
+
+        # WAL lets report/export snapshots read while payroll inserts are committing
+        connection.execute("PRAGMA journal_mode=WAL")
+
+        # Older databases are migrated in place (e.g. REAL rupees -> INTEGER paise)
+        schema.upgrade_database(connection)
         return connection
     except sqlite3.Error as err:
         messagebox.showerror("Database Error", f"Failed to connect to database:\n{err}")
@@ -96,17 +78,24 @@ def create_db_connection():
 
 # Main application code
 class PayrollSystem:
-    def __init__(self, root):
+    def __init__(self, root, profile=None, db_path=DEFAULT_DB_PATH, company_name=None):
         self.root = root
-        self.root.title("Payroll Management System")
+        self.profile = profile or StartupProfile()
+        # Each group company has its own database (see sharding.py)
+        self.db_path = db_path
+        self.company_name = company_name
+        self.root.title(f"Payroll Management System - {company_name}" if company_name
+                        else "Payroll Management System")
         self.root.geometry("1000x700")
         self.root.configure(bg="#f5f7fa")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        # Initialize database connection
-        self.connection = create_db_connection()
-        if not self.connection:
-            return
-        self.cursor = self.connection.cursor()
+        # The database is opened once the login screen is on screen (see connect_database)
+        self.connection = None
+
+        # Open lists that change events patch; None until their screen is shown
+        self.employee_tree = self.salary_list = self.leave_list = None
+        self.employee_search = (None, None)
 
         # User credentials
         self.user_pass_data_set = {
@@ -117,7 +106,88 @@ class PayrollSystem:
 
         # UI Setup
         self.setup_styles()
+        self.profile.mark("styles")
         self.show_login_screen()
+        self.profile.mark("login screen")
+
+        # Idle callbacks run after the pending redraws, i.e. after the first paint
+        self.root.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        self.profile.mark("first paint")
+        self.connect_database()
+
+    def connect_database(self):
+        if self.connection:
+            return True
+
+        # Initialize database connection (includes the schema check/upgrade)
+        self.connection = create_db_connection(self.db_path)
+        if not self.connection:
+            return False
+        self.profile.mark("database + schema")
+
+        # Data access for the screens; each repository has its own tuned connection.
+        # Their writes publish change events that patch the open lists row by row.
+        self.change_bus = change_events.ChangeBus()
+        self.query_clock = repositories.QueryClock()
+        repo_options = dict(db_path=self.db_path, events=self.change_bus, clock=self.query_clock)
+        self.employee_repo = repositories.EmployeeRepo(**repo_options)
+        self.salary_repo = repositories.SalaryRepo(**repo_options)
+        self.leave_repo = repositories.LeaveRepo(**repo_options)
+        self.payroll_repo = repositories.PayrollRepo(**repo_options)
+        self.change_bus.subscribe('employees', self.on_employee_changed)
+        self.change_bus.subscribe('employee_salary',
+                                  lambda event: self.patch_list_row(self.salary_list, event))
+        self.change_bus.subscribe('leave_register',
+                                  lambda event: self.patch_list_row(self.leave_list, event))
+        self.profile.mark("repositories")
+
+        # Event-loop lag and screen/dialog timings, written to ui_metrics.jsonl
+        if settings.get_setting(self.connection, 'ui_telemetry') == '1':
+            self.telemetry = ui_telemetry.UiTelemetry(self.root, self.query_clock, APP_VERSION)
+            self.telemetry.instrument(self, DIALOG_METHODS)
+            self.telemetry.start()
+
+        # Routine maintenance while the app is open, and once more on exit
+        self.root.after(db_maintenance.OPTIMIZE_INTERVAL_MS, self.run_scheduled_maintenance)
+
+        # Scheduled pay runs, reports and backups; jobs only start off-peak and
+        # only on the station holding the runner lease
+        self.root.after(JOB_WORKER_DELAY_MS, self.start_job_worker)
+
+        self.profile.report()
+        return True
+
+    def start_job_worker(self):
+        import scheduler
+
+        self.job_worker = scheduler.JobWorker(self.db_path)
+        threading.Thread(target=self.job_worker.run_forever, daemon=True).start()
+
+    def run_scheduled_maintenance(self):
+        try:
+            db_maintenance.run_routine_maintenance(self.connection)
+        except sqlite3.Error:
+            # Busy database; try again at the next interval
+            pass
+        self.root.after(db_maintenance.OPTIMIZE_INTERVAL_MS, self.run_scheduled_maintenance)
+
+    def on_close(self):
+        if getattr(self, 'telemetry', None):
+            self.telemetry.stop()
+        if getattr(self, 'job_worker', None):
+            # The worker releases its lease when its current poll finishes
+            self.job_worker.stop()
+        if self.connection:
+            try:
+                db_maintenance.optimize(self.connection)
+                for repo in (self.employee_repo, self.salary_repo, self.leave_repo, self.payroll_repo):
+                    repo.close()
+                self.connection.close()
+            except sqlite3.Error:
+                pass
+        self.root.destroy()
 
     def setup_styles(self):
         self.style = ttk.Style()
@@ -191,7 +261,7 @@ class PayrollSystem:
 
         # Add database initialization button for admin
         init_db_btn = ttk.Button(footer_frame, text="Initialize Database",
-                                 command=initialize_database)
+                                 command=lambda: initialize_database(self.db_path))
         init_db_btn.pack(pady=10)
 
     def attempt_login(self):
@@ -199,6 +269,9 @@ class PayrollSystem:
         password = self.password_var.get()
 
         if username in self.user_pass_data_set and self.user_pass_data_set[username] == password:
+            # Normally connected right after the first paint; covers a very fast login
+            if not self.connect_database():
+                return
             self.logged_in_user = username
             self.user_role = "admin" if username == "admin" else "user"
             self.user_name_var.set("")
@@ -306,21 +379,13 @@ class PayrollSystem:
         metrics_frame.pack(fill="x", pady=10)
 
         # Get metrics from database
-        self.cursor.execute("SELECT COUNT(*) as total FROM employees")
-        total_employees = self.cursor.fetchone()[0]
-
-        current_month = datetime.now().strftime("%Y-%m")
-        self.cursor.execute("SELECT COUNT(*) as total FROM payroll WHERE strftime('%Y-%m', payment_date) = ?",
-                            (current_month,))
-        current_month_payroll = self.cursor.fetchone()[0]
-
-        self.cursor.execute("""
-            SELECT COUNT(*) as total 
-            FROM leave_register 
-            WHERE date_from <= date('now', 'start of month', '+1 month', '-1 day')
-            AND date_to >= date('now', 'start of month')
-        """)
-        active_leaves = self.cursor.fetchone()[0]
+        total_employees = self.employee_repo.count()
+
+        current_month = payroll_engine.current_period()
+        current_month_payroll = self.payroll_repo.count_for_period(current_month)
+
+        month_start, month_end = payroll_engine.month_bounds(current_month)
+        active_leaves = self.leave_repo.count_overlapping(month_start, month_end)
 
         # Metric cards
         metric_cards = [
@@ -348,13 +413,7 @@ class PayrollSystem:
 
         ttk.Label(payroll_frame, text="Recent Payroll", font=("Segoe UI", 10, "bold")).pack(anchor="w")
 
-        self.cursor.execute("""
-            SELECT employee_name, final_pay, payment_date 
-            FROM payroll 
-            ORDER BY payment_date DESC 
-            LIMIT 5
-        """)
-        recent_payroll = self.cursor.fetchall()
+        recent_payroll = self.payroll_repo.recent(5)
 
         columns = ("Name", "Amount", "Date")
         tree = ttk.Treeview(payroll_frame, columns=columns, show="headings", height=5)
@@ -365,7 +424,7 @@ class PayrollSystem:
 
         for item in recent_payroll:
             tree.insert("", "end", values=(
-                item['employee_name'], f"₹{item['final_pay']:,}", item['payment_date']))
+                item['employee_name'], money.format_inr(item['final_pay']), item['payment_date']))
 
         # Recent leaves
         leaves_frame = ttk.Frame(activities_frame, style="TFrame")
@@ -373,13 +432,7 @@ class PayrollSystem:
 
         ttk.Label(leaves_frame, text="Recent Leave Requests", font=("Segoe UI", 10, "bold")).pack(anchor="w")
 
-        self.cursor.execute("""
-            SELECT employee_name, date_from, date_to, leaves 
-            FROM leave_register 
-            ORDER BY date_from DESC 
-            LIMIT 5
-        """)
-        recent_leaves = self.cursor.fetchall()
+        recent_leaves = self.leave_repo.recent(5)
 
         columns = ("Name", "From", "To", "Days")
         tree = ttk.Treeview(leaves_frame, columns=columns, show="headings", height=5)
@@ -414,10 +467,17 @@ class PayrollSystem:
         search_var = tk.StringVar()
         search_entry = ttk.Entry(controls_frame, textvariable=search_var, width=30)
         search_entry.pack(side="left", padx=5)
-        search_entry.bind("<Return>", lambda e: self.refresh_employee_list(search_var.get()))
+        search_entry.bind("<Return>", lambda e: self.refresh_employee_list(search_var.get(), org_unit_var.get()))
+
+        # Org unit code; the unit's sub-units are included
+        ttk.Label(controls_frame, text="Org Unit:").pack(side="left", padx=(5, 2))
+        org_unit_var = tk.StringVar()
+        org_unit_entry = ttk.Entry(controls_frame, textvariable=org_unit_var, width=8)
+        org_unit_entry.pack(side="left", padx=(0, 5))
+        org_unit_entry.bind("<Return>", lambda e: self.refresh_employee_list(search_var.get(), org_unit_var.get()))
 
         search_btn = ttk.Button(controls_frame, text="🔍 Search", style="TButton",
-                                command=lambda: self.refresh_employee_list(search_var.get()))
+                                command=lambda: self.refresh_employee_list(search_var.get(), org_unit_var.get()))
         search_btn.pack(side="left", padx=5)
 
         refresh_btn = ttk.Button(controls_frame, text="🔄 Refresh", style="TButton",
@@ -437,6 +497,10 @@ class PayrollSystem:
                                 command=self.export_employees_to_csv)
         export_btn.pack(side="left", padx=5)
 
+        org_btn = ttk.Button(actions_frame, text="🏛 Org Units", style="TButton",
+                             command=self.show_org_units)
+        org_btn.pack(side="left", padx=5)
+
         # Employee list
         list_frame = ttk.Frame(self.content_frame, style="TFrame")
         list_frame.pack(fill="both", expand=True)
@@ -448,7 +512,7 @@ class PayrollSystem:
         vsb = ttk.Scrollbar(tree_scroll, orient="vertical")
         hsb = ttk.Scrollbar(tree_scroll, orient="horizontal")
 
-        columns = ("ID", "Name", "Email", "Phone", "Hire Date", "Status")
+        columns = ("ID", "Name", "Email", "Phone", "Hire Date", "Status", "Org Unit")
         self.employee_tree = ttk.Treeview(tree_scroll, columns=columns, show="headings",
                                           yscrollcommand=vsb.set, xscrollcommand=hsb.set)
 
@@ -462,7 +526,7 @@ class PayrollSystem:
         # Configure columns
         col_widths = {
             "ID": 50, "Name": 150, "Email": 200,
-            "Phone": 100, "Hire Date": 100, "Status": 80
+            "Phone": 100, "Hire Date": 100, "Status": 80, "Org Unit": 80
         }
 
         for col in columns:
@@ -475,31 +539,38 @@ class PayrollSystem:
         # Add double-click event for editing
         self.employee_tree.bind("<Double-1>", lambda e: self.edit_employee())
 
-    def refresh_employee_list(self, search_term=None):
-        query = "SELECT employee_id, first_name, last_name, email, phone, hire_date, status FROM employees"
-        params = ()
-
-        if search_term:
-            query += " WHERE first_name LIKE ? OR last_name LIKE ? OR email LIKE ?"
-            params = (f"%{search_term}%", f"%{search_term}%", f"%{search_term}%")
-
-        self.cursor.execute(query, params)
-        employees = self.cursor.fetchall()
+    def refresh_employee_list(self, search_term=None, org_unit=None):
+        employees = self.employee_repo.list(search_term, org_unit)
+        # Kept so change events can tell whether an edited employee still matches
+        self.employee_search = (search_term, org_unit)
 
         # Clear existing data
-        for item in self.employee_tree.get_children():
-            self.employee_tree.delete(item)
+        self.employee_tree.delete(*self.employee_tree.get_children())
 
-        # Add new data
+        # Add new data; rows are keyed by employee_id for in-place updates
         for emp in employees:
-            self.employee_tree.insert("", "end", values=(
-                emp['employee_id'],
-                f"{emp['first_name']} {emp['last_name']}",
-                emp['email'],
-                emp['phone'],
-                emp['hire_date'],
-                emp['status'].capitalize()
-            ))
+            self.employee_tree.insert("", "end", iid=emp['employee_id'], values=self.employee_row_values(emp))
+
+    def employee_row_values(self, emp):
+        return (
+            emp['employee_id'],
+            f"{emp['first_name']} {emp['last_name']}",
+            emp['email'],
+            emp['phone'],
+            emp['hire_date'],
+            emp['status'].capitalize(),
+            emp['org_unit'] or ""
+        )
+
+    def on_employee_changed(self, event):
+        tree = self.employee_tree
+        if tree is None or not tree.winfo_exists():
+            return
+        employee = None
+        if event.kind != change_events.DELETE:
+            employee = self.employee_repo.summary(event.key, *self.employee_search)
+        # The list is in employee_id order, so new employees belong at the end
+        self.patch_tree_row(tree, event, employee and self.employee_row_values(employee), "end")
 
     def add_employee(self):
         add_window = tk.Toplevel(self.root)
@@ -540,6 +611,8 @@ class PayrollSystem:
         status_menu = ttk.OptionMenu(status_frame, status_var, "active", "active", "on_leave", "terminated")
         status_menu.pack(side="right", expand=True, fill="x")
 
+        org_unit_var, org_unit_ids = self.org_unit_picker(add_window)
+
         # Submit button
         def submit_employee():
             try:
@@ -551,30 +624,13 @@ class PayrollSystem:
                 if not all(employee_data.values()):
                     messagebox.showerror("Error", "All fields are required")
                     return
+                # The org unit is optional
+                employee_data['org_unit_id'] = org_unit_ids.get(org_unit_var.get())
 
                 # Insert into database
-                self.cursor.execute("""
-                    INSERT INTO employees (first_name, last_name, email, phone, address, 
-                                         city, state, postal_code, country, hire_date, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    employee_data['first_name'],
-                    employee_data['last_name'],
-                    employee_data['email'],
-                    employee_data['phone'],
-                    employee_data['address'],
-                    employee_data['city'],
-                    employee_data['state'],
-                    employee_data['postal_code'],
-                    employee_data['country'],
-                    employee_data['hire_date'],
-                    employee_data['status']
-                ))
-
-                self.connection.commit()
+                self.employee_repo.insert(employee_data)
                 messagebox.showinfo("Success", "Employee added successfully")
                 add_window.destroy()
-                self.refresh_employee_list()
 
             except sqlite3.Error as err:
                 messagebox.showerror("Database Error", f"Failed to add employee:\n{err}")
@@ -606,6 +662,17 @@ class PayrollSystem:
                                  command=self.refresh_salary_list)
         refresh_btn.pack(side="left")
 
+        if self.user_role == "admin":
+            formulas_btn = ttk.Button(actions_frame, text="ƒ Salary Formulas", style="TButton",
+                                      command=self.show_salary_formulas)
+            formulas_btn.pack(side="left", padx=5)
+
+        # Filter builder
+        salary_filters = self.setup_list_filters(self.content_frame, [
+            ("Employee:", 'employee', 14), ("From:", 'period_from', 8), ("To:", 'period_to', 8),
+            ("Base ≥", 'amount_min', 9), ("Base ≤", 'amount_max', 9),
+        ], self.refresh_salary_list)
+
         # Salary list
         list_frame = ttk.Frame(self.content_frame, style="TFrame")
         list_frame.pack(fill="both", expand=True)
@@ -638,51 +705,44 @@ class PayrollSystem:
             self.salary_tree.heading(col, text=col)
             self.salary_tree.column(col, width=col_widths.get(col, 100), anchor="center")
 
+        self.salary_list = self.setup_sorted_list(
+            list_frame, self.salary_tree, self.salary_repo, salary_filters, {
+                "Salary ID": 'salary_id', "Base Salary": 'base_salary',
+                "HRA": 'hra', "DA": 'da', "Bonus": 'bonus', "Effective Date": 'effective_date',
+            }, 'effective_date', self.refresh_salary_list, self.salary_row_values)
+
         # Add double-click event for editing
         self.salary_tree.bind("<Double-1>", lambda e: self.edit_salary_record())
 
         # Initial data load
         self.refresh_salary_list()
 
-    def refresh_salary_list(self):
+    def refresh_salary_list(self, more=False):
         try:
             # Check if the columns exist
-            self.cursor.execute("PRAGMA table_info(employee_salary)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-
-            if not all(col in columns for col in ['hra', 'da', 'bonus']):
+            if not self.salary_repo.has_component_columns():
                 messagebox.showwarning("Warning",
                                        "Salary table structure is incomplete. Please initialize database.")
                 return
 
-            self.cursor.execute("""
-                SELECT s.salary_id, e.first_name, e.last_name, 
-                       s.base_salary, s.hra, s.da, s.bonus, s.effective_date
-                FROM employee_salary s
-                JOIN employees e ON s.employee_id = e.employee_id
-                ORDER BY s.effective_date DESC
-            """)
-            salaries = self.cursor.fetchall()
-
-            # Clear existing data
-            for item in self.salary_tree.get_children():
-                self.salary_tree.delete(item)
-
-            # Add new data
-            for salary in salaries:
-                self.salary_tree.insert("", "end", values=(
-                    salary['salary_id'],
-                    f"{salary['first_name']} {salary['last_name']}",
-                    f"₹{salary['base_salary']:,}",
-                    f"₹{salary['hra']:,}",
-                    f"₹{salary['da']:,}",
-                    f"₹{salary['bonus']:,}",
-                    salary['effective_date']
-                ))
+            self.load_list_page(self.salary_list, more=more)
 
+        except ValueError:
+            messagebox.showerror("Error", "Please enter months as YYYY-MM and amounts as numbers")
         except sqlite3.Error as err:
             messagebox.showerror("Database Error", f"Failed to load salary data:\n{err}")
 
+    def salary_row_values(self, salary):
+        return (
+            salary['salary_id'],
+            salary['employee_name'],
+            money.format_inr(salary['base_salary']),
+            money.format_inr(salary['hra']),
+            money.format_inr(salary['da']),
+            money.format_inr(salary['bonus']),
+            salary['effective_date']
+        )
+
     def add_salary_record(self):
         add_window = tk.Toplevel(self.root)
         add_window.title("Add Salary Record")
@@ -696,8 +756,7 @@ class PayrollSystem:
         ttk.Label(employee_frame, text="Employee").pack(side="left")
         self.employee_var = tk.StringVar()
 
-        self.cursor.execute("SELECT employee_id, first_name || ' ' || last_name AS name FROM employees")
-        employees = {row['name']: row['employee_id'] for row in self.cursor.fetchall()}
+        employees = self.employee_repo.names()
 
         employee_dropdown = ttk.Combobox(employee_frame, textvariable=self.employee_var,
                                          values=list(employees.keys()))
@@ -732,10 +791,10 @@ class PayrollSystem:
 
                 salary_data = {
                     'employee_id': employees[employee_name],
-                    'base_salary': float(self.salary_entries['base_salary'].get()),
-                    'hra': float(self.salary_entries['hra'].get()),
-                    'da': float(self.salary_entries['da'].get()),
-                    'bonus': float(self.salary_entries['bonus'].get()),
+                    'base_salary': money.to_paise(self.salary_entries['base_salary'].get()),
+                    'hra': money.to_paise(self.salary_entries['hra'].get()),
+                    'da': money.to_paise(self.salary_entries['da'].get()),
+                    'bonus': money.to_paise(self.salary_entries['bonus'].get()),
                     'effective_date': self.salary_entries['effective_date'].get()
                 }
 
@@ -744,23 +803,10 @@ class PayrollSystem:
                     return
 
                 # Insert into database
-                self.cursor.execute("""
-                    INSERT INTO employee_salary 
-                    (employee_id, base_salary, hra, da, bonus, effective_date)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    salary_data['employee_id'],
-                    salary_data['base_salary'],
-                    salary_data['hra'],
-                    salary_data['da'],
-                    salary_data['bonus'],
-                    salary_data['effective_date']
-                ))
-
-                self.connection.commit()
+                self.salary_repo.insert(**salary_data)
                 messagebox.showinfo("Success", "Salary record added successfully")
                 add_window.destroy()
-                self.refresh_salary_list()
+                self.record_arrears(salary_data['employee_id'], salary_data['effective_date'])
 
             except ValueError:
                 messagebox.showerror("Error", "Please enter valid numbers for salary components")
@@ -785,13 +831,7 @@ class PayrollSystem:
         edit_window.configure(bg=self.light_bg)
 
         # Fetch salary data
-        self.cursor.execute("""
-            SELECT s.*, e.first_name || ' ' || e.last_name AS employee_name
-            FROM employee_salary s
-            JOIN employees e ON s.employee_id = e.employee_id
-            WHERE s.salary_id = ?
-        """, (salary_id,))
-        salary = self.cursor.fetchone()
+        salary = self.salary_repo.get(salary_id)
 
         if not salary:
             messagebox.showerror("Error", "Salary record not found")
@@ -822,7 +862,8 @@ class PayrollSystem:
 
             ttk.Label(frame, text=label).pack(side="left")
             entry = ttk.Entry(frame)
-            entry.insert(0, str(salary[field]))
+            value = salary[field]
+            entry.insert(0, money.format_amount(value) if field in money.MONEY_COLUMNS else str(value))
             entry.pack(side="right", expand=True, fill="x")
             self.salary_entries[field] = entry
 
@@ -831,10 +872,10 @@ class PayrollSystem:
             try:
                 salary_data = {
                     'salary_id': salary_id,
-                    'base_salary': float(self.salary_entries['base_salary'].get()),
-                    'hra': float(self.salary_entries['hra'].get()),
-                    'da': float(self.salary_entries['da'].get()),
-                    'bonus': float(self.salary_entries['bonus'].get()),
+                    'base_salary': money.to_paise(self.salary_entries['base_salary'].get()),
+                    'hra': money.to_paise(self.salary_entries['hra'].get()),
+                    'da': money.to_paise(self.salary_entries['da'].get()),
+                    'bonus': money.to_paise(self.salary_entries['bonus'].get()),
                     'effective_date': self.salary_entries['effective_date'].get()
                 }
 
@@ -843,27 +884,11 @@ class PayrollSystem:
                     return
 
                 # Update in database
-                self.cursor.execute("""
-                    UPDATE employee_salary 
-                    SET base_salary = ?, 
-                        hra = ?, 
-                        da = ?, 
-                        bonus = ?, 
-                        effective_date = ?
-                    WHERE salary_id = ?
-                """, (
-                    salary_data['base_salary'],
-                    salary_data['hra'],
-                    salary_data['da'],
-                    salary_data['bonus'],
-                    salary_data['effective_date'],
-                    salary_data['salary_id']
-                ))
-
-                self.connection.commit()
+                self.salary_repo.update(**salary_data)
                 messagebox.showinfo("Success", "Salary record updated successfully")
                 edit_window.destroy()
-                self.refresh_salary_list()
+                self.record_arrears(salary['employee_id'],
+                                    min(salary['effective_date'], salary_data['effective_date']))
 
             except ValueError:
                 messagebox.showerror("Error", "Please enter valid numbers for salary components")
@@ -874,6 +899,22 @@ class PayrollSystem:
                                 command=update_salary)
         update_btn.pack(pady=20)
 
+    def record_arrears(self, employee_id, effective_date):
+        # A salary taking effect in a month already paid is settled in the next pay run
+        if effective_date[:7] >= payroll_engine.current_period():
+            return
+
+        import arrears
+
+        try:
+            result = arrears.compute_arrears(self.salary_repo.connection, effective_date[:7], employee_id)
+        except (ValueError, sqlite3.Error) as err:
+            messagebox.showerror("Error", f"Failed to compute arrears:\n{err}")
+            return
+        if result.lines:
+            messagebox.showinfo("Arrears", f"Arrears of {money.format_inr(result.net)} for {result.lines} "
+                                           f"paid months will be paid in the next pay run.")
+
     def edit_employee(self):
         try:
             selected_item = self.employee_tree.selection()
@@ -890,8 +931,7 @@ class PayrollSystem:
             edit_window.configure(bg=self.light_bg)
 
             # Fetch employee data
-            self.cursor.execute("SELECT * FROM employees WHERE employee_id = ?", (employee_id,))
-            employee = self.cursor.fetchone()
+            employee = self.employee_repo.get(employee_id)
 
             if not employee:
                 messagebox.showerror("Error", "Employee not found in database")
@@ -933,6 +973,8 @@ class PayrollSystem:
             status_menu = ttk.OptionMenu(status_frame, status_var, "active", "active", "on_leave", "terminated")
             status_menu.pack(side="right", expand=True, fill="x")
 
+            org_unit_var, org_unit_ids = self.org_unit_picker(edit_window, employee['org_unit_id'])
+
             # Action buttons frame
             button_frame = ttk.Frame(edit_window, style="TFrame")
             button_frame.pack(fill="x", pady=10)
@@ -940,7 +982,8 @@ class PayrollSystem:
             # Update button
             update_btn = ttk.Button(button_frame, text="Update Employee", style="Success.TButton",
                                     command=lambda: self.update_employee_data(
-                                        employee_id, entries, status_var, edit_window))
+                                        employee_id, entries, status_var, edit_window,
+                                        org_unit_ids.get(org_unit_var.get())))
             update_btn.pack(side="left", padx=10, expand=True)
 
             # Delete button
@@ -951,11 +994,12 @@ class PayrollSystem:
         except Exception as e:
             messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
 
-    def update_employee_data(self, employee_id, entries, status_var, window):
+    def update_employee_data(self, employee_id, entries, status_var, window, org_unit_id=None):
         try:
             # Get all values from entries
             employee_data = {field: entry.get() for field, entry in entries.items()}
             employee_data['status'] = status_var.get()
+            employee_data['org_unit_id'] = org_unit_id
             employee_data['employee_id'] = employee_id
 
             # Basic validation
@@ -966,66 +1010,48 @@ class PayrollSystem:
                     return
 
             # Update in database
-            self.cursor.execute("""
-                UPDATE employees 
-                SET first_name = ?, last_name = ?, email = ?, 
-                    phone = ?, address = ?, city = ?, state = ?, 
-                    postal_code = ?, country = ?, hire_date = ?, 
-                    status = ?
-                WHERE employee_id = ?
-            """, (
-                employee_data['first_name'],
-                employee_data['last_name'],
-                employee_data['email'],
-                employee_data['phone'],
-                employee_data['address'],
-                employee_data['city'],
-                employee_data['state'],
-                employee_data['postal_code'],
-                employee_data['country'],
-                employee_data['hire_date'],
-                employee_data['status'],
-                employee_data['employee_id']
-            ))
-
-            self.connection.commit()
+            self.employee_repo.update(employee_id, employee_data)
             messagebox.showinfo("Success", "Employee updated successfully")
             window.destroy()
-            self.refresh_employee_list()
 
         except sqlite3.Error as err:
             messagebox.showerror("Database Error", f"Failed to update employee:\n{err}")
-            self.connection.rollback()
+            self.employee_repo.rollback()
+
+    def org_unit_picker(self, window, current_id=None):
+        # "Org Unit" row for the employee forms; returns (code variable, code -> unit_id)
+        import org_units
+
+        units = org_units.list_units(self.connection)
+        unit_ids = {code: unit_id for unit_id, code, *_ in units}
+        current = next((code for code, unit_id in unit_ids.items() if unit_id == current_id), "")
+
+        frame = ttk.Frame(window, style="TFrame")
+        frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(frame, text="Org Unit").pack(side="left")
+        org_unit_var = tk.StringVar(value=current)
+        ttk.Combobox(frame, textvariable=org_unit_var, state="readonly",
+                     values=[""] + list(unit_ids)).pack(side="right", expand=True, fill="x")
+        return org_unit_var, unit_ids
 
     def delete_employee(self, employee_id, window):
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this employee?"):
             try:
                 # First check if employee has any related records
-                self.cursor.execute("SELECT COUNT(*) FROM payroll WHERE employee_id = ?", (employee_id,))
-                payroll_count = self.cursor.fetchone()[0]
-
-                self.cursor.execute("SELECT COUNT(*) FROM leave_register WHERE employee_id = ?", (employee_id,))
-                leave_count = self.cursor.fetchone()[0]
-
-                self.cursor.execute("SELECT COUNT(*) FROM employee_salary WHERE employee_id = ?", (employee_id,))
-                salary_count = self.cursor.fetchone()[0]
-
-                if payroll_count > 0 or leave_count > 0 or salary_count > 0:
+                if self.employee_repo.has_related_records(employee_id):
                     messagebox.showwarning("Warning",
                                            "Cannot delete employee with associated records. "
                                            "Consider changing status to 'Terminated' instead.")
                     return
 
                 # Delete employee if no related records exist
-                self.cursor.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
-                self.connection.commit()
+                self.employee_repo.delete(employee_id)
                 messagebox.showinfo("Success", "Employee deleted successfully")
                 window.destroy()
-                self.refresh_employee_list()
 
             except sqlite3.Error as err:
                 messagebox.showerror("Database Error", f"Failed to delete employee:\n{err}")
-                self.connection.rollback()
+                self.employee_repo.rollback()
 
     def export_employees_to_csv(self):
         file_path = filedialog.asksaveasfilename(defaultextension=".csv",
@@ -1033,15 +1059,15 @@ class PayrollSystem:
         if not file_path:
             return
 
-        self.cursor.execute("SELECT * FROM employees")
-        employees = self.cursor.fetchall()
-
         import csv
-        with open(file_path, mode='w', newline='') as file:
+        from db_snapshot import ReadSnapshot
+
+        # Export from a point-in-time snapshot so the write lock is never held up
+        with ReadSnapshot(self.db_path, mode='wal') as snapshot, open(file_path, mode='w', newline='') as file:
             writer = csv.writer(file)
             writer.writerow(["ID", "First Name", "Last Name", "Email", "Phone", "Hire Date", "Status"])
 
-            for emp in employees:
+            for emp in snapshot.execute("SELECT * FROM employees"):
                 writer.writerow([
                     emp['employee_id'],
                     emp['first_name'],
@@ -1077,11 +1103,40 @@ class PayrollSystem:
                               command=lambda: self.refresh_payroll_list())
         view_btn.pack(side="left", padx=5)
 
+        payslip_btn = ttk.Button(controls_frame, text="🧾 Payslips", style="TButton",
+                                 command=self.generate_payslips)
+        payslip_btn.pack(side="left", padx=5)
+
+        reconcile_btn = ttk.Button(controls_frame, text="🔍 Reconcile", style="TButton",
+                                   command=self.show_reconciliation)
+        reconcile_btn.pack(side="left", padx=5)
+
         if self.user_role in ["admin", "hr"]:
             gen_btn = ttk.Button(controls_frame, text="Generate Payroll", style="Success.TButton",
                                  command=self.generate_payroll)
             gen_btn.pack(side="left", padx=5)
 
+        if self.user_role == "admin":
+            revert_btn = ttk.Button(controls_frame, text="↩ Revert Run", style="Danger.TButton",
+                                    command=self.revert_pay_run)
+            revert_btn.pack(side="left", padx=5)
+
+            bank_btn = ttk.Button(controls_frame, text="🏦 Bank Files", style="TButton",
+                                  command=self.export_bank_files)
+            bank_btn.pack(side="left", padx=5)
+
+            group_btn = ttk.Button(controls_frame, text="🏢 Run All Companies", style="TButton",
+                                   command=self.run_group_payroll)
+            group_btn.pack(side="left", padx=5)
+
+        # Filter builder; an empty From/To falls back to the month above
+        payroll_filters = self.setup_list_filters(self.content_frame, [
+            ("Employee:", 'employee', 12), ("From:", 'period_from', 8), ("To:", 'period_to', 8),
+            ("Net ≥", 'net_min', 8), ("Net ≤", 'net_max', 8), ("Tax ≥", 'tax_min', 7),
+            ("Tax ≤", 'tax_max', 7), ("Leaves ≥", 'leaves_min', 4), ("Leaves ≤", 'leaves_max', 4),
+            ("Org Unit:", 'org_unit', 8),
+        ], self.refresh_payroll_list)
+
         # Payroll list
         list_frame = ttk.Frame(self.content_frame, style="TFrame")
         list_frame.pack(fill="both", expand=True)
@@ -1115,56 +1170,59 @@ class PayrollSystem:
             self.payroll_tree.heading(col, text=col)
             self.payroll_tree.column(col, width=col_widths.get(col, 100), anchor="center")
 
+        self.payroll_list = self.setup_sorted_list(
+            list_frame, self.payroll_tree, self.payroll_repo, payroll_filters, {
+                "ID": 'payroll_id', "Employee": 'employee_name', "Leaves": 'leaves',
+                "Deductions": 'deducted_salary', "Bonus": 'bonus', "Tax": 'income_tax',
+                "Net Pay": 'final_pay', "Payment Date": 'payment_date',
+            }, 'payment_date', self.refresh_payroll_list, self.payroll_row_values)
+
         # Initial data load
         self.refresh_payroll_list()
 
-    def refresh_payroll_list(self):
+    def refresh_payroll_list(self, more=False):
         try:
             # Get the selected month or show all if not specified
-            if hasattr(self, 'month_var'):
-                month_filter = self.month_var.get()
-                if month_filter:
-                    year, month = month_filter.split("-")
-                    self.cursor.execute("""
-                        SELECT * FROM payroll 
-                        WHERE strftime('%Y', payment_date) = ? 
-                        AND strftime('%m', payment_date) = ?
-                        ORDER BY payment_date DESC
-                    """, (year, month))
-                else:
-                    self.cursor.execute("SELECT * FROM payroll ORDER BY payment_date DESC")
-            else:
-                self.cursor.execute("SELECT * FROM payroll ORDER BY payment_date DESC")
-
-            payrolls = self.cursor.fetchall()
-
-            # Clear existing data
-            for item in self.payroll_tree.get_children():
-                self.payroll_tree.delete(item)
-
-            # Add new data
-            for pay in payrolls:
-                self.payroll_tree.insert("", "end", values=(
-                    pay['payroll_id'],
-                    pay['employee_name'],
-                    pay['leaves'],
-                    f"₹{pay['deducted_salary']:,.2f}",
-                    f"₹{pay['bonus']:,.2f}",
-                    f"₹{pay['income_tax']:,.2f}",
-                    f"₹{pay['final_pay']:,.2f}",
-                    pay['payment_date']
-                ))
+            filters = self.list_filter_values(self.payroll_list)
+            month_filter = self.month_var.get() if hasattr(self, 'month_var') else None
+            if month_filter and not filters['period_from'] and not filters['period_to']:
+                filters['period_from'] = filters['period_to'] = month_filter
+
+            self.load_list_page(self.payroll_list, filters, more)
 
+        except ValueError:
+            messagebox.showerror("Error", "Please enter months as YYYY-MM and amounts as numbers")
         except sqlite3.Error as err:
             messagebox.showerror("Database Error", f"Failed to load payroll data:\n{err}")
 
+    def payroll_row_values(self, pay):
+        return (
+            pay['payroll_id'],
+            pay['employee_name'],
+            pay['leaves'],
+            money.format_inr(pay['deducted_salary']),
+            money.format_inr(pay['bonus']),
+            money.format_inr(pay['income_tax']),
+            money.format_inr(pay['final_pay']),
+            pay['payment_date']
+        )
+
     def generate_payroll(self):
         # Check if payroll has already been generated this month
-        current_month = datetime.now().strftime("%Y-%m")
-        self.cursor.execute("SELECT * FROM payroll WHERE strftime('%Y-%m', payment_date) = ?", (current_month,))
-        if self.cursor.fetchone():
+        period = payroll_engine.current_period()
+        run = self.payroll_repo.get_run(period)
+        if run and run['status'] == 'committed':
             messagebox.showwarning("Warning", "Payroll has already been generated for this month!")
             return
+        # A month being computed elsewhere is left to claim_run, which takes
+        # over a claim gone stale after a station crashed mid-run
+
+        # Salary formulas are evaluated here; one that fails for an employee stops the run
+        try:
+            estimated_data = self.payroll_repo.fetch_inputs(period)
+        except ValueError as err:
+            messagebox.showerror("Error", str(err))
+            return
 
         # Show estimated payroll preview
         preview_window = tk.Toplevel(self.root)
@@ -1176,37 +1234,6 @@ class PayrollSystem:
                   text=f"Payroll Preview for {datetime.now().strftime('%B %Y')}",
                   style="Header.TLabel").pack(pady=10)
 
-        # Calculate estimated payroll using employee_salary table
-        self.cursor.execute("""
-            SELECT 
-                e.employee_id, 
-                e.first_name || ' ' || e.last_name AS employee_name,
-                IFNULL(l.leaves, 0) AS leaves,
-                s.base_salary AS gross_salary,
-                s.hra,
-                s.da,
-                s.bonus
-            FROM 
-                employees e
-            JOIN 
-                employee_salary s ON e.employee_id = s.employee_id
-            LEFT JOIN 
-                (SELECT employee_id, SUM(leaves) AS leaves 
-                 FROM leave_register 
-                 WHERE date_from <= date('now', 'start of month', '+1 month', '-1 day')
-                 AND date_to >= date('now', 'start of month')
-                 GROUP BY employee_id) l 
-            ON e.employee_id = l.employee_id
-            WHERE e.status = 'active'
-            AND s.effective_date = (
-                SELECT MAX(effective_date) 
-                FROM employee_salary 
-                WHERE employee_id = e.employee_id
-            )
-        """)
-
-        estimated_data = self.cursor.fetchall()
-
         # Create treeview
         tree_frame = ttk.Frame(preview_window)
         tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -1214,7 +1241,7 @@ class PayrollSystem:
         vsb = ttk.Scrollbar(tree_frame, orient="vertical")
         hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
 
-        columns = ["ID", "Employee", "Leaves", "Basic", "HRA", "DA", "Bonus", "Gross", "Tax", "Net Pay"]
+        columns = ["ID", "Employee", "Leaves", "Basic", "HRA", "DA", "Bonus", "Arrears", "Gross", "Tax", "Net Pay"]
         tree = ttk.Treeview(tree_frame, columns=columns, show="headings",
                             yscrollcommand=vsb.set, xscrollcommand=hsb.set)
 
@@ -1229,31 +1256,20 @@ class PayrollSystem:
             tree.column(col, width=80, anchor="center")
 
         for record in estimated_data:
-            # Convert all values to float for calculations
-            base = float(record['gross_salary'])
-            hra = float(record['hra'])
-            da = float(record['da'])
-            bonus = float(record['bonus'])
-            leaves = int(record['leaves'])
-
-            gross = base + hra + da + bonus
-            tax = gross * 0.1  # 10% tax
-
-            # Deduct for leaves (assuming 1 day = basic/30)
-            leave_deduction = (base / 30) * leaves if leaves > 0 else 0
-            net = gross - tax - leave_deduction
+            pay = payroll_engine.compute_payroll(record)
 
             tree.insert("", "end", values=(
-                record['employee_id'],
-                record['employee_name'],
-                leaves,
-                f"₹{base:,.2f}",
-                f"₹{hra:,.2f}",
-                f"₹{da:,.2f}",
-                f"₹{bonus:,.2f}",
-                f"₹{gross:,.2f}",
-                f"₹{tax:,.2f}",
-                f"₹{net:,.2f}"
+                pay['employee_id'],
+                pay['employee_name'],
+                pay['leaves'],
+                money.format_inr(pay['base']),
+                money.format_inr(pay['hra']),
+                money.format_inr(pay['da']),
+                money.format_inr(pay['bonus']),
+                money.format_inr(pay['arrears']),
+                money.format_inr(pay['gross']),
+                money.format_inr(pay['tax']),
+                money.format_inr(pay['net'])
             ))
 
         # Action buttons
@@ -1261,47 +1277,37 @@ class PayrollSystem:
         btn_frame.pack(pady=10)
 
         def on_confirm():
+            # Claim the month first; another station may have started it meanwhile
+            owner = pay_runs.station_id()
+            try:
+                run_id = self.payroll_repo.claim_run(period, owner)
+            except pay_runs.PayRunConflict as err:
+                messagebox.showwarning("Warning", str(err))
+                preview_window.destroy()
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to generate payroll:\n{err}")
+                return
+
             try:
                 # Generate actual payroll
                 payment_date = datetime.now().date().isoformat()
+                self.payroll_repo.commit_run(run_id, owner, estimated_data, payment_date)
 
-                for emp in estimated_data:
-                    # Convert all values to float for calculations
-                    base = float(emp['gross_salary'])
-                    hra = float(emp['hra'])
-                    da = float(emp['da'])
-                    bonus = float(emp['bonus'])
-                    leaves = int(emp['leaves'])
-
-                    gross = base + hra + da + bonus
-                    tax = gross * 0.1
-                    leave_deduction = (base / 30) * leaves if leaves > 0 else 0
-                    net = gross - tax - leave_deduction
-
-                    self.cursor.execute("""
-                        INSERT INTO payroll (
-                            employee_id, employee_name, leaves, deducted_salary, 
-                            bonus, income_tax, final_pay, payment_date
-                        )
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        emp['employee_id'],
-                        emp['employee_name'],
-                        leaves,
-                        leave_deduction,
-                        bonus,
-                        tax,
-                        net,
-                        payment_date
-                    ))
-
-                self.connection.commit()
                 messagebox.showinfo("Success", "Payroll generated successfully!")
                 preview_window.destroy()
                 self.refresh_payroll_list()
 
-            except sqlite3.Error as err:
-                messagebox.showerror("Database Error", f"Failed to generate payroll:\n{err}")
+            except pay_runs.PayRunConflict as err:
+                messagebox.showwarning("Warning", str(err))
+            except Exception as err:
+                # Hand the month back whatever went wrong, or it stays claimed
+                # until the claim goes stale
+                try:
+                    self.payroll_repo.release_run(run_id, owner, str(err))
+                except sqlite3.Error:
+                    pass
+                messagebox.showerror("Error", f"Failed to generate payroll:\n{err}")
 
         confirm_btn = ttk.Button(btn_frame, text="Confirm and Generate",
                                  style="Success.TButton", command=on_confirm)
@@ -1311,6 +1317,247 @@ class PayrollSystem:
                                 style="Danger.TButton", command=preview_window.destroy)
         cancel_btn.pack(side="left", padx=10)
 
+    def revert_pay_run(self):
+        period = self.month_var.get()
+        try:
+            payroll_engine.month_bounds(period)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the month as YYYY-MM")
+            return
+        if not messagebox.askyesno("Revert Pay Run", f"Delete every payroll record of the "
+                                                     f"{payroll_engine.period_label(period)} pay run "
+                                                     f"so the month can be run again?"):
+            return
+
+        try:
+            deleted = self.payroll_repo.revert_run(period)
+        except ValueError as err:
+            messagebox.showerror("Error", str(err))
+            return
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to revert the pay run:\n{err}")
+            return
+
+        messagebox.showinfo("Success", f"{deleted} payroll records removed")
+        self.refresh_payroll_list()
+
+    def generate_payslips(self):
+        period = self.month_var.get()
+        try:
+            payroll_engine.month_bounds(period)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the month as YYYY-MM")
+            return
+
+        file_path = filedialog.asksaveasfilename(defaultextension=".zip",
+                                                 initialfile=f"payslips_{period}.zip",
+                                                 filetypes=[("Zip archive", "*.zip")])
+        if not file_path:
+            return
+
+        import payslip_generation
+
+        company = (self.company_name or settings.get_setting(self.connection, 'company_name')
+                   or payslip_generation.DEFAULT_COMPANY)
+
+        def run_generation():
+            # Rendering fans out to worker processes; keep the UI thread free meanwhile
+            try:
+                count = payslip_generation.generate_payslips(period, file_path, db_path=self.db_path,
+                                                             company=company)
+                self.root.after(0, lambda: messagebox.showinfo(
+                    "Success", f"{count} payslips saved to {file_path}"))
+            except (sqlite3.Error, OSError) as err:
+                message = f"Failed to generate payslips:\n{err}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+
+        threading.Thread(target=run_generation, daemon=True).start()
+
+    def export_bank_files(self):
+        period = self.month_var.get()
+        try:
+            payroll_engine.month_bounds(period)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the month as YYYY-MM")
+            return
+        if not self.payroll_repo.exists_for_period(period):
+            messagebox.showerror("Error", f"There is no committed pay run for {period}")
+            return
+
+        target = filedialog.askdirectory(title="Folder for the bank files")
+        if not target:
+            return
+        fmt = 'fixed' if messagebox.askyesno("Bank Files", "Write fixed-width upload files?\n\n"
+                                                           "Choose No for CSV.") else 'csv'
+
+        import disbursement
+
+        def run_export():
+            connection = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                result = disbursement.export_disbursement(connection, period, target, fmt)
+                message = (f"{result.rows} transfers totalling {money.format_inr(result.total)} "
+                           f"in {len(result.files)} files.\nControl totals and checksums: {result.manifest}")
+                if result.exceptions:
+                    message += (f"\n\n{len(result.exceptions)} employees are not in the files; "
+                                f"see the exceptions file.")
+                self.root.after(0, lambda: messagebox.showinfo("Bank Files", message))
+            except (OSError, ValueError, sqlite3.Error) as err:
+                message = f"Failed to write the bank files:\n{err}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+            finally:
+                connection.close()
+
+        threading.Thread(target=run_export, daemon=True).start()
+
+    def show_reconciliation(self):
+        import reconciliation
+
+        current_period = self.month_var.get()
+        try:
+            previous_period = reconciliation.previous_period(current_period)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the month as YYYY-MM")
+            return
+
+        recon_window = tk.Toplevel(self.root)
+        recon_window.title("Pay Run Reconciliation")
+        recon_window.geometry("950x600")
+        recon_window.configure(bg=self.light_bg)
+
+        controls = ttk.Frame(recon_window)
+        controls.pack(fill="x", padx=10, pady=10)
+
+        ttk.Label(controls, text="Previous:").pack(side="left")
+        previous_var = tk.StringVar(value=previous_period)
+        ttk.Entry(controls, textvariable=previous_var, width=8).pack(side="left", padx=5)
+
+        ttk.Label(controls, text="Current:").pack(side="left")
+        current_var = tk.StringVar(value=current_period)
+        ttk.Entry(controls, textvariable=current_var, width=8).pack(side="left", padx=5)
+
+        ttk.Label(controls, text="Threshold (₹):").pack(side="left")
+        threshold_var = tk.StringVar(value="0")
+        ttk.Entry(controls, textvariable=threshold_var, width=8).pack(side="left", padx=5)
+
+        summary_label = ttk.Label(recon_window, text="")
+        summary_label.pack(anchor="w", padx=10)
+
+        tree_frame = ttk.Frame(recon_window)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        columns = ("ID", "Employee", "Change", "Previous Net", "Current Net", "Difference", "Changed")
+        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=vsb.set)
+        vsb.config(command=tree.yview)
+        tree.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="right", fill="y")
+
+        col_widths = {"ID": 60, "Employee": 180, "Change": 80, "Changed": 220}
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=col_widths.get(col, 110), anchor="center")
+
+        # Only one page of the diff is ever in the tree, however large the run
+        state = {'rows': [], 'page': 0, 'threshold': 0}
+        pager = ttk.Frame(recon_window)
+        pager.pack(fill="x", padx=10, pady=(0, 10))
+        page_label = ttk.Label(pager, text="")
+
+        def show_page(page):
+            page_count = max(1, -(-len(state['rows']) // reconciliation.PAGE_SIZE))
+            state['page'] = min(max(page, 0), page_count - 1)
+            start = state['page'] * reconciliation.PAGE_SIZE
+
+            tree.delete(*tree.get_children())
+            for row in state['rows'][start:start + reconciliation.PAGE_SIZE]:
+                tree.insert("", "end", values=reconciliation.display_values(row, state['threshold']))
+            page_label.config(text=f"Page {state['page'] + 1} of {page_count}")
+
+        def run_comparison():
+            try:
+                threshold = money.to_paise(threshold_var.get() or "0")
+                rows = reconciliation.reconcile(self.connection, previous_var.get(), current_var.get(), threshold)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter months as YYYY-MM and a valid threshold",
+                                     parent=recon_window)
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to reconcile pay runs:\n{err}",
+                                     parent=recon_window)
+                return
+
+            state['rows'], state['threshold'] = rows, threshold
+            summary = reconciliation.summarize(rows)
+            summary_label.config(text=f"{summary['new']} new, {summary['exit']} exits, "
+                                      f"{summary['changed']} changed - net pay moved by "
+                                      f"{money.format_inr(summary['net_delta'])}")
+            show_page(0)
+
+        def export_diff():
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".csv", parent=recon_window,
+                initialfile=f"reconciliation_{previous_var.get()}_{current_var.get()}.csv",
+                filetypes=[("CSV files", "*.csv")])
+            if not file_path:
+                return
+            try:
+                count = reconciliation.export_csv(state['rows'], file_path, state['threshold'])
+                messagebox.showinfo("Success", f"{count} rows exported to {file_path}", parent=recon_window)
+            except OSError as err:
+                messagebox.showerror("Error", f"Failed to export:\n{err}", parent=recon_window)
+
+        ttk.Button(controls, text="Compare", style="Primary.TButton",
+                   command=run_comparison).pack(side="left", padx=5)
+        ttk.Button(controls, text="Export CSV", style="TButton",
+                   command=export_diff).pack(side="left", padx=5)
+
+        ttk.Button(pager, text="◀ Previous", style="TButton",
+                   command=lambda: show_page(state['page'] - 1)).pack(side="left", padx=5)
+        page_label.pack(side="left", padx=10)
+        ttk.Button(pager, text="Next ▶", style="TButton",
+                   command=lambda: show_page(state['page'] + 1)).pack(side="left", padx=5)
+
+        run_comparison()
+
+    def run_group_payroll(self):
+        import sharding
+
+        period = self.month_var.get()
+        try:
+            payroll_engine.month_bounds(period)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter the month as YYYY-MM")
+            return
+
+        shards = sharding.list_shards()
+        if not shards:
+            messagebox.showinfo("Info", "No companies are registered in the shard registry")
+            return
+        if not messagebox.askyesno("Confirm", f"Run payroll for {period} in all {len(shards)} companies?"):
+            return
+
+        def run_all():
+            # Each company runs in its own worker process against its own database
+            try:
+                results = sharding.run_group_payroll(period)
+            except (sqlite3.Error, OSError) as err:
+                message = f"Failed to run group payroll:\n{err}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+                return
+
+            lines = []
+            for company_code, result in results.items():
+                if result is None:
+                    lines.append(f"{company_code}: already generated")
+                elif isinstance(result, int):
+                    lines.append(f"{company_code}: {result} employees paid")
+                else:
+                    lines.append(f"{company_code}: failed - {result}")
+            self.root.after(0, lambda: messagebox.showinfo("Group Payroll", "\n".join(lines)))
+
+        threading.Thread(target=run_all, daemon=True).start()
+
     def show_leave_management(self):
         # Clear previous content
         for widget in self.content_frame.winfo_children():
@@ -1334,6 +1581,33 @@ class PayrollSystem:
                                  command=self.refresh_leave_list)
         refresh_btn.pack(side="left")
 
+        if self.user_role == "admin":
+            accrue_btn = ttk.Button(actions_frame, text="➕ Monthly Accrual", style="TButton",
+                                    command=self.accrue_monthly_leave)
+            accrue_btn.pack(side="left", padx=5)
+
+            adjust_btn = ttk.Button(actions_frame, text="± Adjust Balance", style="TButton",
+                                    command=self.adjust_leave_balance)
+            adjust_btn.pack(side="left", padx=5)
+
+            close_year_btn = ttk.Button(actions_frame, text="📅 Close Leave Year", style="TButton",
+                                        command=self.close_leave_year)
+            close_year_btn.pack(side="left", padx=5)
+
+            import_btn = ttk.Button(actions_frame, text="📥 Import Leaves", style="TButton",
+                                    command=self.import_leaves)
+            import_btn.pack(side="left", padx=5)
+
+            punches_btn = ttk.Button(actions_frame, text="🕒 Import Punches", style="TButton",
+                                     command=self.import_punches)
+            punches_btn.pack(side="left", padx=5)
+
+        # Filter builder
+        leave_filters = self.setup_list_filters(self.content_frame, [
+            ("Employee:", 'employee', 14), ("From:", 'period_from', 8), ("To:", 'period_to', 8),
+            ("Days ≥", 'leaves_min', 4), ("Days ≤", 'leaves_max', 4),
+        ], self.refresh_leave_list)
+
         # Leave list
         list_frame = ttk.Frame(self.content_frame, style="TFrame")
         list_frame.pack(fill="both", expand=True)
@@ -1366,35 +1640,243 @@ class PayrollSystem:
             self.leave_tree.heading(col, text=col)
             self.leave_tree.column(col, width=col_widths.get(col, 100), anchor="center")
 
+        self.leave_list = self.setup_sorted_list(
+            list_frame, self.leave_tree, self.leave_repo, leave_filters, {
+                "Leave ID": 'leave_id', "From": 'date_from',
+                "To": 'date_to', "Days": 'leaves',
+            }, 'date_from', self.refresh_leave_list, self.leave_row_values)
+
         # Initial data load
         self.refresh_leave_list()
 
-    def refresh_leave_list(self):
-        self.cursor.execute("""
-            SELECT l.leave_id, e.first_name, e.last_name, l.date_from, l.date_to, 
-                   l.leaves, l.reason, l.current_leaves
-            FROM leave_register l
-            JOIN employees e ON l.employee_id = e.employee_id
-            ORDER BY l.date_from DESC
-        """)
-        leaves = self.cursor.fetchall()
+    def refresh_leave_list(self, more=False):
+        try:
+            self.load_list_page(self.leave_list, more=more)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter months as YYYY-MM and days as numbers")
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to load leave data:\n{err}")
+
+    def leave_row_values(self, leave):
+        status = "Approved" if leave['leaves'] == leave['current_leaves'] else "Pending"
+        return (
+            leave['leave_id'],
+            leave['employee_name'],
+            leave['date_from'],
+            leave['date_to'],
+            leave['leaves'],
+            leave['reason'][:50] + "..." if leave['reason'] and len(leave['reason']) > 50 else leave['reason'],
+            status
+        )
+
+    def setup_list_filters(self, parent, fields, refresh):
+        # Filter builder row: (label, filter name, width) per field, applied on Enter or Apply
+        filter_frame = ttk.Frame(parent, style="TFrame")
+        filter_frame.pack(fill="x", pady=(0, 10))
+
+        variables = {}
+        for label, name, width in fields:
+            ttk.Label(filter_frame, text=label).pack(side="left", padx=(5, 2))
+            variables[name] = tk.StringVar()
+            entry = ttk.Entry(filter_frame, textvariable=variables[name], width=width)
+            entry.pack(side="left")
+            entry.bind("<Return>", lambda e: refresh())
+
+        def clear_filters():
+            for variable in variables.values():
+                variable.set("")
+            refresh()
+
+        ttk.Button(filter_frame, text="Apply", style="Primary.TButton",
+                   command=lambda: refresh()).pack(side="left", padx=(10, 5))
+        ttk.Button(filter_frame, text="Clear", style="TButton", command=clear_filters).pack(side="left")
+        return variables
+
+    def setup_sorted_list(self, parent, tree, repo, filters, sort_columns, default_sort, refresh, row_values):
+        # Heading clicks re-run the query with a different ORDER BY; the tree only
+        # ever holds the pages loaded so far and Load More fetches the next one
+        listing = {
+            'tree': tree, 'repo': repo, 'filters': filters, 'sort_columns': sort_columns,
+            'sort': default_sort, 'descending': True, 'after': None, 'row_values': row_values,
+        }
 
-        # Clear existing data
-        for item in self.leave_tree.get_children():
-            self.leave_tree.delete(item)
-
-        # Add new data
-        for leave in leaves:
-            status = "Approved" if leave['leaves'] == leave['current_leaves'] else "Pending"
-            self.leave_tree.insert("", "end", values=(
-                leave['leave_id'],
-                f"{leave['first_name']} {leave['last_name']}",
-                leave['date_from'],
-                leave['date_to'],
-                leave['leaves'],
-                leave['reason'][:50] + "..." if leave['reason'] and len(leave['reason']) > 50 else leave['reason'],
-                status
-            ))
+        def sort_by(key):
+            listing['descending'] = not listing['descending'] if listing['sort'] == key else False
+            listing['sort'] = key
+            refresh()
+
+        for col, key in sort_columns.items():
+            tree.heading(col, command=lambda key=key: sort_by(key))
+
+        listing['more_btn'] = ttk.Button(parent, text="Load More", style="TButton", state="disabled",
+                                         command=lambda: refresh(more=True))
+        listing['more_btn'].pack(pady=5)
+        return listing
+
+    def list_filter_values(self, listing):
+        return {name: variable.get().strip() for name, variable in listing['filters'].items()}
+
+    def load_list_page(self, listing, filters=None, more=False):
+        tree = listing['tree']
+        if filters is None:
+            filters = self.list_filter_values(listing)
+
+        repo = listing['repo']
+        records, next_after = repo.page(filters, listing['sort'], listing['descending'],
+                                        listing['after'] if more else None)
+
+        if not more:
+            tree.delete(*tree.get_children())
+        # Rows are keyed by primary key so change events can patch them in place
+        key_attribute = repo.PRIMARY_KEY[1]
+        for record in records:
+            iid = str(getattr(record, key_attribute))
+            if tree.exists(iid):
+                # Added on top by a change event; this page is where it sorts
+                tree.item(iid, values=listing['row_values'](record))
+                tree.move(iid, "", "end")
+            else:
+                tree.insert("", "end", iid=iid, values=listing['row_values'](record))
+
+        listing['applied_filters'] = filters
+        listing['after'] = next_after
+        listing['more_btn'].config(state="normal" if next_after else "disabled")
+
+        # Arrow on the sorted column's heading
+        for col, key in listing['sort_columns'].items():
+            arrow = (" ▼" if listing['descending'] else " ▲") if key == listing['sort'] else ""
+            tree.heading(col, text=col + arrow)
+
+    def import_leaves(self):
+        import leave_import
+
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+        if not file_path:
+            return
+
+        try:
+            result = leave_import.import_file(self.leave_repo.connection, file_path)
+        except (OSError, ValueError) as err:
+            messagebox.showerror("Error", f"Could not read {os.path.basename(file_path)}:\n{err}")
+            return
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to import leaves:\n{err}")
+            return
+
+        # A bulk write: reload the list rather than patching row by row
+        self.refresh_leave_list()
+        message = f"{result.inserted} leaves imported."
+        if not result.rejected:
+            messagebox.showinfo("Leave Import", message)
+            return
+        if messagebox.askyesno("Leave Import", f"{message} {len(result.rejected)} rows were rejected "
+                                               f"(overlaps, duplicates or invalid data).\n\n"
+                                               f"Save the rejected rows to a CSV file?"):
+            rejects_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                                        filetypes=[("CSV files", "*.csv")])
+            if rejects_path:
+                leave_import.export_rejections(result.rejected, rejects_path)
+
+    def import_punches(self):
+        file_path = filedialog.askopenfilename(filetypes=[("Punch logs", "*.csv *.jsonl *.json"),
+                                                          ("All files", "*.*")])
+        if not file_path:
+            return
+
+        import attendance
+
+        def run_import():
+            # Millions of punches: stream them on a connection of its own, off the UI thread
+            connection = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                result = attendance.import_file(connection, file_path)
+                months = ", ".join(sorted(result.periods)) or "none"
+                self.root.after(0, lambda: messagebox.showinfo(
+                    "Attendance Import", f"{result.punches} punches imported for {months}; "
+                                         f"{result.error_count} rows rejected."))
+            except (OSError, ValueError) as err:
+                message = f"Could not import {os.path.basename(file_path)}:\n{err}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+            except sqlite3.Error as err:
+                message = f"Failed to import punches:\n{err}"
+                self.root.after(0, lambda: messagebox.showerror("Database Error", message))
+            finally:
+                connection.close()
+
+        threading.Thread(target=run_import, daemon=True).start()
+
+    def patch_list_row(self, listing, event):
+        # Applies one change event to an open sorted list: the row is re-read by
+        # primary key under the filters the list was loaded with
+        if listing is None or not listing['tree'].winfo_exists():
+            return
+        record = None
+        if event.kind != change_events.DELETE:
+            record = listing['repo'].fetch_matching(event.key, listing.get('applied_filters'))
+        # New rows go on top until the next reload puts them in sort order
+        self.patch_tree_row(listing['tree'], event, record and listing['row_values'](record), 0)
+
+    def patch_tree_row(self, tree, event, values, position):
+        # values is None when the row is gone or no longer passes the list's filters
+        iid = str(event.key)
+        if values is None:
+            if tree.exists(iid):
+                tree.delete(iid)
+        elif tree.exists(iid):
+            tree.item(iid, values=values)
+        elif event.kind == change_events.INSERT:
+            tree.insert("", position, iid=iid, values=values)
+            tree.see(iid)
+
+    def accrue_monthly_leave(self):
+        period = payroll_engine.current_period()
+        try:
+            credited = self.leave_repo.accrue_month(period)
+            messagebox.showinfo("Success", f"Leave accrued for {credited} employees for {period}")
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to accrue leave:\n{err}")
+
+    def adjust_leave_balance(self):
+        employee_id = simpledialog.askinteger("Adjust Leave Balance", "Employee ID:", minvalue=1,
+                                              parent=self.root)
+        if employee_id is None:
+            return
+        days = simpledialog.askfloat("Adjust Leave Balance",
+                                     f"Days to add to employee {employee_id}'s balance (negative to deduct):",
+                                     parent=self.root)
+        if not days:
+            return
+        note = simpledialog.askstring("Adjust Leave Balance", "Reason for the adjustment:", parent=self.root)
+        if note is None:
+            return
+
+        try:
+            if self.employee_repo.get(employee_id) is None:
+                messagebox.showerror("Error", f"There is no employee {employee_id}")
+                return
+            balance = self.leave_repo.adjust_balance(employee_id, days, note.strip() or None)
+            messagebox.showinfo("Success", f"Employee {employee_id}'s leave balance is now {balance:g} days")
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to adjust the leave balance:\n{err}")
+
+    def close_leave_year(self):
+        last_year = date.today().year - 1
+        year = simpledialog.askinteger("Close Leave Year", "Leave year to close:", initialvalue=last_year,
+                                       minvalue=1900, maxvalue=last_year, parent=self.root)
+        if year is None:
+            return
+        if not messagebox.askyesno("Confirm", f"Snapshot every leave balance at the end of {year} and lapse "
+                                              f"days above the {leave_ledger.CARRY_FORWARD_CAP_DAYS}-day "
+                                              f"carry-forward cap?"):
+            return
+
+        try:
+            lapsed = self.leave_repo.close_year(year)
+            messagebox.showinfo("Success", f"Leave year {year} closed; {lapsed} balances lapsed above the cap")
+        except ValueError as err:
+            messagebox.showerror("Error", str(err))
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to close the leave year:\n{err}")
 
     def apply_leave(self):
         apply_window = tk.Toplevel(self.root)
@@ -1409,13 +1891,24 @@ class PayrollSystem:
         ttk.Label(employee_frame, text="Employee").pack(side="left")
         employee_var = tk.StringVar()
 
-        self.cursor.execute("SELECT employee_id, first_name || ' ' || last_name AS name FROM employees")
-        employees = {row['name']: row['employee_id'] for row in self.cursor.fetchall()}
+        employees = self.employee_repo.names()
 
         employee_dropdown = ttk.Combobox(employee_frame, textvariable=employee_var,
                                          values=list(employees.keys()))
         employee_dropdown.pack(side="right", expand=True, fill="x")
 
+        # Current leave balance, a single lookup per selection
+        balance_label = ttk.Label(apply_window, text="Leave balance: -")
+        balance_label.pack(anchor="w", padx=10, pady=5)
+
+        def show_balance(event=None):
+            employee_name = employee_var.get()
+            if employee_name in employees:
+                balance = self.leave_repo.balance(employees[employee_name])
+                balance_label.config(text=f"Leave balance: {balance:g} days")
+
+        employee_dropdown.bind("<<ComboboxSelected>>", show_balance)
+
         # Leave dates
         date_frame = ttk.Frame(apply_window, style="TFrame")
         date_frame.pack(fill="x", padx=10, pady=5)
@@ -1459,28 +1952,32 @@ class PayrollSystem:
                 from_date_dt = datetime.strptime(from_date, "%Y-%m-%d").date()
                 to_date_dt = datetime.strptime(to_date, "%Y-%m-%d").date()
                 leave_days = (to_date_dt - from_date_dt).days + 1
+                if leave_days < 1:
+                    messagebox.showerror("Error", "To Date cannot be before From Date")
+                    return
+
+                # One leave per employee per day
+                clash = self.leave_repo.overlapping(employees[employee_name], from_date_dt.isoformat(),
+                                                    to_date_dt.isoformat())
+                if clash:
+                    messagebox.showerror("Error", f"{employee_name} already has leave from {clash['date_from']} "
+                                                  f"to {clash['date_to']} (leave {clash['leave_id']})")
+                    return
+
+                # Days beyond the balance are deducted from pay; confirm before submitting
+                balance = self.leave_repo.balance(employees[employee_name])
+                _, unpaid_days = leave_ledger.split_leave(balance, leave_days)
+                if unpaid_days and not messagebox.askyesno(
+                        "Leave Without Pay",
+                        f"Leave balance is {balance:g} days. {unpaid_days:g} of {leave_days} days "
+                        f"will be leave without pay. Continue?"):
+                    return
 
                 # Insert leave application
-                self.cursor.execute("""
-                    INSERT INTO leave_register (
-                        employee_id, employee_name, date_from, date_to, 
-                        reason, leaves, current_leaves
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    employees[employee_name],
-                    employee_name,
-                    from_date,
-                    to_date,
-                    reason,
-                    leave_days,
-                    leave_days  # Initially current_leaves = total leaves
-                ))
-
-                self.connection.commit()
+                self.leave_repo.insert(employees[employee_name], employee_name, from_date, to_date,
+                                       reason, leave_days)
                 messagebox.showinfo("Success", "Leave application submitted successfully")
                 apply_window.destroy()
-                self.refresh_leave_list()
 
             except ValueError:
                 messagebox.showerror("Error", "Please enter dates in YYYY-MM-DD format")
@@ -1521,6 +2018,30 @@ class PayrollSystem:
                                     command=self.generate_tax_report)
         tax_report_btn.pack(fill="x", pady=5)
 
+        # Month-by-month trends from the payroll rollups
+        trend_report_btn = ttk.Button(report_frame, text="📈 Payroll Trends",
+                                      style="Primary.TButton",
+                                      command=self.show_payroll_trends)
+        trend_report_btn.pack(fill="x", pady=5)
+
+        # Headcount and pay per department / cost center, sub-units included
+        org_report_btn = ttk.Button(report_frame, text="🏛 Org Unit Costs",
+                                    style="Primary.TButton",
+                                    command=self.show_org_units)
+        org_report_btn.pack(fill="x", pady=5)
+
+        # Consolidated report across the group companies
+        group_report_btn = ttk.Button(report_frame, text="🏢 Group Payroll Summary",
+                                      style="Primary.TButton",
+                                      command=self.show_group_summary)
+        group_report_btn.pack(fill="x", pady=5)
+
+        # What-if salary cost scenarios over the coming months
+        forecast_report_btn = ttk.Button(report_frame, text="🔮 What-If Cost Forecast",
+                                         style="Primary.TButton",
+                                         command=self.show_cost_forecast)
+        forecast_report_btn.pack(fill="x", pady=5)
+
     def generate_payroll_report(self):
         file_path = filedialog.asksaveasfilename(defaultextension=".pdf",
                                                  filetypes=[("PDF files", "*.pdf")])
@@ -1541,13 +2062,476 @@ class PayrollSystem:
         messagebox.showinfo("Info", f"Leave report would be generated and saved to {file_path}")
 
     def generate_tax_report(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".pdf",
-                                                 filetypes=[("PDF files", "*.pdf")])
+        import archive
+
+        # Annual statements for the last completed fiscal year by default
+        last_year = archive.fiscal_year_of(date.today().isoformat()) - 1
+        fiscal_year = simpledialog.askinteger("Tax Statements", "Fiscal year (the year it starts in, "
+                                                                "e.g. 2024 for FY 2024-25):",
+                                              initialvalue=last_year, minvalue=1900, maxvalue=9999,
+                                              parent=self.root)
+        if fiscal_year is None:
+            return
+
+        file_path = filedialog.asksaveasfilename(defaultextension=".zip",
+                                                 initialfile=f"tax_statements_fy{fiscal_year}.zip",
+                                                 filetypes=[("Zip archive", "*.zip")])
         if not file_path:
             return
 
-        # In a real application, you would generate an actual report here
-        messagebox.showinfo("Info", f"Tax report would be generated and saved to {file_path}")
+        import payslip_generation
+        import tax_statements
+
+        company = (self.company_name or settings.get_setting(self.connection, 'company_name')
+                   or payslip_generation.DEFAULT_COMPANY)
+
+        def run_generation():
+            # Rendering fans out to worker processes; keep the UI thread free meanwhile
+            try:
+                count = tax_statements.generate_statements(fiscal_year, file_path, db_path=self.db_path,
+                                                           company=company)
+                self.root.after(0, lambda: messagebox.showinfo(
+                    "Success", f"{count} tax statements for {archive.fiscal_year_label(fiscal_year)} "
+                               f"saved to {file_path}"))
+            except (sqlite3.Error, OSError) as err:
+                message = f"Failed to generate tax statements:\n{err}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+
+        threading.Thread(target=run_generation, daemon=True).start()
+
+    def show_payroll_trends(self):
+        import org_units
+        import payroll_rollups
+
+        trend_window = tk.Toplevel(self.root)
+        trend_window.title("Payroll Trends")
+        trend_window.geometry("950x650")
+        trend_window.configure(bg=self.light_bg)
+
+        controls = ttk.Frame(trend_window)
+        controls.pack(fill="x", padx=10, pady=10)
+
+        ttk.Label(controls, text="Up to (YYYY-MM):").pack(side="left")
+        end_var = tk.StringVar(value=payroll_engine.current_period())
+        ttk.Entry(controls, textvariable=end_var, width=8).pack(side="left", padx=5)
+
+        ttk.Label(controls, text="Years:").pack(side="left")
+        years_var = tk.StringVar(value="3")
+        ttk.Combobox(controls, textvariable=years_var, values=["1", "2", "3", "5", "10"],
+                     width=4, state="readonly").pack(side="left", padx=5)
+
+        ttk.Label(controls, text="Status:").pack(side="left")
+        status_var = tk.StringVar(value="All")
+        ttk.Combobox(controls, textvariable=status_var, values=["All", "active", "on_leave", "terminated"],
+                     width=10, state="readonly").pack(side="left", padx=5)
+
+        # Org unit code; totals include its sub-units
+        ttk.Label(controls, text="Org Unit:").pack(side="left")
+        org_unit_var = tk.StringVar()
+        ttk.Entry(controls, textvariable=org_unit_var, width=8).pack(side="left", padx=5)
+
+        canvas = tk.Canvas(trend_window, height=260, bg="white", highlightthickness=0)
+        canvas.pack(fill="x", padx=10)
+
+        columns = ("Month", "Employees", "Gross", "Tax", "Deductions", "Net Pay")
+        tree = ttk.Treeview(trend_window, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120, anchor="center")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def load_trends():
+            try:
+                end_period = end_var.get()
+                payroll_engine.month_bounds(end_period)
+                start_period = payroll_rollups.trend_start(end_period, int(years_var.get()))
+                status = None if status_var.get() == "All" else status_var.get()
+                org_unit_id = None
+                if org_unit_var.get().strip():
+                    unit = org_units.unit_by_code(self.connection, org_unit_var.get())
+                    if unit is None:
+                        messagebox.showerror("Error", f"Unknown org unit: {org_unit_var.get().strip()}",
+                                             parent=trend_window)
+                        return
+                    org_unit_id = unit['unit_id']
+                rows = payroll_rollups.trend(self.connection, start_period, end_period, status, org_unit_id)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter the month as YYYY-MM", parent=trend_window)
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to load payroll trends:\n{err}",
+                                     parent=trend_window)
+                return
+
+            tree.delete(*tree.get_children())
+            for period, headcount, gross, tax, deductions, net in reversed(rows):
+                tree.insert("", "end", values=(
+                    period, headcount, money.format_inr(gross), money.format_inr(tax),
+                    money.format_inr(deductions), money.format_inr(net)))
+            self.draw_trend_chart(canvas, rows)
+
+        ttk.Button(controls, text="Load", style="Primary.TButton", command=load_trends).pack(side="left", padx=5)
+        load_trends()
+
+    def show_salary_formulas(self):
+        import salary_policy
+
+        try:
+            policy = salary_policy.load_policy(self.connection)
+        except (ValueError, sqlite3.Error) as err:
+            messagebox.showerror("Error", f"Failed to load the salary formulas:\n{err}")
+            return
+
+        formula_window = tk.Toplevel(self.root)
+        formula_window.title("Salary Formulas")
+        formula_window.geometry("700x360")
+        formula_window.configure(bg=self.light_bg)
+
+        version = f"Policy version {policy.version}" if policy else "No formulas yet"
+        ttk.Label(formula_window, text=version, style="Header.TLabel").pack(pady=10)
+        ttk.Label(formula_window, text=f"Amounts in rupees. Names: {', '.join(salary_policy.VARIABLES)}; "
+                                       f"min(), max(), and/or, x if condition else y.\n"
+                                       f"Leave a formula empty to use the amount on the salary record.",
+                  wraplength=660).pack(padx=10)
+
+        entries = {}
+        for component in salary_policy.COMPONENTS:
+            frame = ttk.Frame(formula_window, style="TFrame")
+            frame.pack(fill="x", padx=10, pady=5)
+            ttk.Label(frame, text=component.upper(), width=8).pack(side="left")
+            entry = ttk.Entry(frame)
+            entry.insert(0, policy.formulas.get(component, "") if policy else "")
+            entry.pack(side="right", expand=True, fill="x")
+            entries[component] = entry
+
+        def save_formulas():
+            try:
+                with self.connection:
+                    new_version = salary_policy.save_policy(self.connection, {
+                        component: entry.get() for component, entry in entries.items()})
+            except salary_policy.FormulaError as err:
+                messagebox.showerror("Error", str(err), parent=formula_window)
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to save the formulas:\n{err}",
+                                     parent=formula_window)
+                return
+            messagebox.showinfo("Success", f"Saved as policy version {new_version}; "
+                                           f"it applies from the next pay run.", parent=formula_window)
+            formula_window.destroy()
+
+        ttk.Button(formula_window, text="Save as New Version", style="Success.TButton",
+                   command=save_formulas).pack(pady=15)
+
+    def show_org_units(self):
+        import org_units
+
+        org_window = tk.Toplevel(self.root)
+        org_window.title("Org Units")
+        org_window.geometry("850x600")
+        org_window.configure(bg=self.light_bg)
+
+        controls = ttk.Frame(org_window)
+        controls.pack(fill="x", padx=10, pady=10)
+
+        current = payroll_engine.current_period()
+        ttk.Label(controls, text="From (YYYY-MM):").pack(side="left")
+        start_var = tk.StringVar(value=f"{current[:4]}-01")
+        ttk.Entry(controls, textvariable=start_var, width=8).pack(side="left", padx=5)
+        ttk.Label(controls, text="To:").pack(side="left")
+        end_var = tk.StringVar(value=current)
+        ttk.Entry(controls, textvariable=end_var, width=8).pack(side="left", padx=5)
+
+        # Each row's figures cover the unit and everything below it
+        columns = ("Name", "Type", "Payslips", "Gross", "Net Pay")
+        tree = ttk.Treeview(org_window, columns=columns, show="tree headings")
+        tree.heading("#0", text="Code")
+        tree.column("#0", width=160)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=180 if col == "Name" else 110, anchor="w" if col == "Name" else "center")
+        tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        def load_units():
+            try:
+                start_period, end_period = start_var.get().strip(), end_var.get().strip()
+                payroll_engine.month_bounds(start_period)
+                payroll_engine.month_bounds(end_period)
+                units = org_units.list_units(self.connection)
+                totals = org_units.subtree_totals(self.connection, start_period, end_period)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter months as YYYY-MM", parent=org_window)
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to load org units:\n{err}", parent=org_window)
+                return
+
+            tree.delete(*tree.get_children())
+            # Tree order puts every parent ahead of its children
+            for unit_id, code, name, unit_type, parent_id, _ in units:
+                total = totals.get(unit_id, {'headcount': 0, 'gross': 0, 'net': 0})
+                tree.insert(parent_id or "", "end", iid=unit_id, text=code, open=True, values=(
+                    name, unit_type.replace("_", " ").title(), total['headcount'],
+                    money.format_inr(total['gross']), money.format_inr(total['net'])))
+
+        ttk.Button(controls, text="Load", style="Primary.TButton", command=load_units).pack(side="left", padx=5)
+
+        if self.user_role == "admin":
+            def selected_unit():
+                selection = tree.selection()
+                return int(selection[0]) if selection else None
+
+            def save_unit(change, message):
+                try:
+                    with self.connection:
+                        change()
+                except ValueError as err:
+                    messagebox.showerror("Error", str(err), parent=org_window)
+                    return
+                except sqlite3.Error as err:
+                    messagebox.showerror("Database Error", f"{message}:\n{err}", parent=org_window)
+                    return
+                load_units()
+
+            def add_unit():
+                # The new unit goes under the selected one, if any
+                code = simpledialog.askstring("Add Org Unit", "Code (e.g. FIN-AP):", parent=org_window)
+                if not code:
+                    return
+                name = simpledialog.askstring("Add Org Unit", "Name:", parent=org_window)
+                if not name:
+                    return
+                unit_type = 'cost_center' if messagebox.askyesno(
+                    "Add Org Unit", "Is this a cost center? (No = department)", parent=org_window) else 'department'
+                save_unit(lambda: org_units.add_unit(self.connection, code, name, unit_type, selected_unit()),
+                          "Failed to add the org unit")
+
+            def move_unit():
+                unit_id = selected_unit()
+                if unit_id is None:
+                    messagebox.showwarning("Warning", "Please select a unit to move", parent=org_window)
+                    return
+                parent_code = simpledialog.askstring("Move Org Unit", "Code of the new parent unit "
+                                                                      "(leave empty for top level):",
+                                                     parent=org_window)
+                if parent_code is None:
+                    return
+
+                def move():
+                    parent = org_units.unit_by_code(self.connection, parent_code) if parent_code.strip() else None
+                    if parent_code.strip() and parent is None:
+                        raise ValueError(f"Unknown org unit: {parent_code.strip()}")
+                    org_units.move_unit(self.connection, unit_id, parent and parent['unit_id'])
+                save_unit(move, "Failed to move the org unit")
+
+            def delete_unit():
+                unit_id = selected_unit()
+                if unit_id is None:
+                    messagebox.showwarning("Warning", "Please select a unit to delete", parent=org_window)
+                    return
+                save_unit(lambda: org_units.delete_unit(self.connection, unit_id), "Failed to delete the org unit")
+
+            actions = ttk.Frame(org_window)
+            actions.pack(pady=(0, 10))
+            ttk.Button(actions, text="➕ Add Unit", style="Success.TButton", command=add_unit).pack(side="left", padx=5)
+            ttk.Button(actions, text="Move Unit", style="TButton", command=move_unit).pack(side="left", padx=5)
+            ttk.Button(actions, text="Delete Unit", style="Danger.TButton",
+                       command=delete_unit).pack(side="left", padx=5)
+
+        load_units()
+
+    def draw_trend_chart(self, canvas, rows):
+        # Net pay as bars with gross as a line over them, one slot per month
+        canvas.delete("all")
+        canvas.update_idletasks()
+        width = max(canvas.winfo_width(), 600)
+        height = int(canvas.cget("height"))
+        left, right, top, bottom = 70, 20, 20, 30
+
+        if not rows:
+            canvas.create_text(width // 2, height // 2, text="No pay runs in this range", fill=self.dark_text)
+            return
+
+        peak = max(row[2] for row in rows) or 1
+        slot = (width - left - right) / len(rows)
+
+        def y_for(paise):
+            return top + (height - top - bottom) * (1 - paise / peak)
+
+        canvas.create_line(left, height - bottom, width - right, height - bottom, fill="#d1d3e2")
+        canvas.create_text(left - 5, top, text=money.format_inr(peak).split(".")[0], anchor="e",
+                           fill=self.dark_text, font=("Segoe UI", 8))
+
+        gross_points = []
+        for index, (period, _, gross, _, _, net) in enumerate(rows):
+            x = left + slot * index
+            canvas.create_rectangle(x + slot * 0.15, y_for(net), x + slot * 0.85, height - bottom,
+                                    fill=self.primary_color, outline="")
+            gross_points += [x + slot / 2, y_for(gross)]
+            # Label January and the first month so long ranges stay readable
+            if index == 0 or period.endswith("-01"):
+                canvas.create_text(x + slot / 2, height - bottom + 12, text=period,
+                                   fill=self.dark_text, font=("Segoe UI", 8))
+
+        if len(gross_points) >= 4:
+            canvas.create_line(*gross_points, fill=self.secondary_color, width=2)
+
+        canvas.create_text(width - right, top, anchor="ne", fill=self.dark_text, font=("Segoe UI", 8),
+                           text="■ Net pay   — Gross")
+
+    def show_group_summary(self):
+        import sharding
+
+        summary_window = tk.Toplevel(self.root)
+        summary_window.title("Group Payroll Summary")
+        summary_window.geometry("800x450")
+        summary_window.configure(bg=self.light_bg)
+
+        controls = ttk.Frame(summary_window)
+        controls.pack(fill="x", padx=10, pady=10)
+
+        ttk.Label(controls, text="Month (YYYY-MM):").pack(side="left")
+        period_var = tk.StringVar(value=payroll_engine.current_period())
+        ttk.Entry(controls, textvariable=period_var, width=8).pack(side="left", padx=5)
+
+        columns = ("Company", "Name", "Employees", "Gross", "Tax", "Deductions", "Net Pay")
+        tree = ttk.Treeview(summary_window, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=150 if col == "Name" else 100, anchor="center")
+        tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        def load_summary():
+            try:
+                summary = sharding.consolidated_payroll_summary(period_var.get())
+            except ValueError:
+                messagebox.showerror("Error", "Please enter the month as YYYY-MM", parent=summary_window)
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to load group summary:\n{err}",
+                                     parent=summary_window)
+                return
+
+            for item in tree.get_children():
+                tree.delete(item)
+            for row in summary + [sharding.group_totals(summary)]:
+                tree.insert("", "end", values=row[:3] + tuple(money.format_inr(value) for value in row[3:]))
+
+        ttk.Button(controls, text="Load", style="Primary.TButton", command=load_summary).pack(side="left", padx=5)
+        load_summary()
+
+    def show_cost_forecast(self):
+        import forecasting
+
+        forecast_window = tk.Toplevel(self.root)
+        forecast_window.title("What-If Cost Forecast")
+        forecast_window.geometry("950x700")
+        forecast_window.configure(bg=self.light_bg)
+
+        ttk.Label(forecast_window, text="Scenarios, one per line (percent changes to base, hra, da, bonus; "
+                                        "tax rate; first month):").pack(anchor="w", padx=10, pady=(10, 0))
+        scenario_text = tk.Text(forecast_window, height=5, font=("Segoe UI", 10))
+        scenario_text.pack(fill="x", padx=10, pady=5)
+        scenario_text.insert("1.0", "7% raise: base=7 da=2\nRaise from month 4: base=7 da=2 start=4\n")
+
+        controls = ttk.Frame(forecast_window)
+        controls.pack(fill="x", padx=10, pady=5)
+        ttk.Label(controls, text="Months:").pack(side="left")
+        months_var = tk.StringVar(value=str(forecasting.DEFAULT_MONTHS))
+        ttk.Entry(controls, textvariable=months_var, width=4).pack(side="left", padx=5)
+        status_label = ttk.Label(controls, text="")
+        status_label.pack(side="right")
+
+        canvas = tk.Canvas(forecast_window, height=240, bg="white", highlightthickness=0)
+        canvas.pack(fill="x", padx=10)
+
+        columns = ("Scenario", "Gross", "Tax", "Net Pay", "Vs Current")
+        tree = ttk.Treeview(forecast_window, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=220 if col == "Scenario" else 150, anchor="center")
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        # Salaries are read once per window; re-running scenarios reuses them
+        salaries = []
+
+        def run_forecast():
+            try:
+                months = int(months_var.get())
+                if not 1 <= months <= 120:
+                    raise ValueError("Months must be between 1 and 120")
+                lines = [line for line in scenario_text.get("1.0", "end").splitlines() if line.strip()]
+                scenarios = [forecasting.Scenario("Current salaries")]
+                scenarios += [forecasting.Scenario.parse(line) for line in lines]
+            except ValueError as err:
+                messagebox.showerror("Error", f"Invalid scenario:\n{err}", parent=forecast_window)
+                return
+            try:
+                if not salaries:
+                    salaries.append(forecasting.SalaryColumns.load(self.connection))
+                # Scenarios that change formula inputs run the salary formulas again
+                curves = forecasting.evaluate(salaries[0], scenarios, months)
+            except ValueError as err:
+                messagebox.showerror("Error", f"Salary formula failed:\n{err}", parent=forecast_window)
+                return
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to load salaries:\n{err}", parent=forecast_window)
+                return
+
+            baseline = curves[0].total()
+            tree.delete(*tree.get_children())
+            for curve in curves:
+                tree.insert("", "end", values=(
+                    curve.scenario.name, money.format_inr(curve.total()), money.format_inr(curve.total('tax')),
+                    money.format_inr(curve.total('net')), money.format_inr(curve.total() - baseline)))
+            status_label.config(text=f"{len(salaries[0])} employees, {curves[0].periods[0]} to "
+                                     f"{curves[0].periods[-1]}")
+            self.draw_forecast_chart(canvas, curves)
+
+        ttk.Button(controls, text="Run", style="Primary.TButton", command=run_forecast).pack(side="left", padx=5)
+        run_forecast()
+
+    def draw_forecast_chart(self, canvas, curves):
+        # Monthly gross cost per scenario as one line each
+        canvas.delete("all")
+        canvas.update_idletasks()
+        width = max(canvas.winfo_width(), 600)
+        height = int(canvas.cget("height"))
+        left, right, top, bottom = 70, 160, 20, 30
+        colors = [self.dark_text, self.primary_color, self.secondary_color, self.danger_color,
+                  "#f6c23e", "#36b9cc", "#858796"]
+
+        peak = max((max(curve.gross) for curve in curves), default=0)
+        if not peak:
+            canvas.create_text(width // 2, height // 2, text="No active salaries to forecast",
+                               fill=self.dark_text)
+            return
+        low = min(min(curve.gross) for curve in curves) * 0.95
+        periods = curves[0].periods
+        slot = (width - left - right) / max(len(periods) - 1, 1)
+
+        def y_for(paise):
+            return top + (height - top - bottom) * (1 - (paise - low) / ((peak - low) or 1))
+
+        canvas.create_line(left, height - bottom, width - right, height - bottom, fill="#d1d3e2")
+        canvas.create_text(left - 5, top, text=money.format_inr(peak).split(".")[0], anchor="e",
+                           fill=self.dark_text, font=("Segoe UI", 8))
+        canvas.create_text(left - 5, height - bottom, text=money.format_inr(round(low)).split(".")[0],
+                           anchor="e", fill=self.dark_text, font=("Segoe UI", 8))
+        for index, period in enumerate(periods):
+            if index == 0 or index == len(periods) - 1 or period.endswith("-01"):
+                canvas.create_text(left + slot * index, height - bottom + 12, text=period,
+                                   fill=self.dark_text, font=("Segoe UI", 8))
+
+        for number, curve in enumerate(curves):
+            color = colors[number % len(colors)]
+            points = []
+            for index, amount in enumerate(curve.gross):
+                points += [left + slot * index, y_for(amount)]
+            if len(points) >= 4:
+                canvas.create_line(*points, fill=color, width=2)
+            canvas.create_text(width - right + 10, top + 14 * number, anchor="w", fill=color,
+                               font=("Segoe UI", 8), text=f"— {curve.scenario.name[:24]}")
 
     def show_settings(self):
         # Clear previous content
@@ -1561,28 +2545,228 @@ class PayrollSystem:
         settings_frame = ttk.Frame(self.content_frame, style="TFrame")
         settings_frame.pack(fill="both", expand=True)
 
-        # Company name
-        ttk.Label(settings_frame, text="Company Name:").grid(row=0, column=0, sticky="e", padx=5, pady=5)
-        company_entry = ttk.Entry(settings_frame)
-        company_entry.grid(row=0, column=1, sticky="ew", padx=5, pady=5)
+        try:
+            current = settings.load_settings(self.connection)
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to load settings:\n{err}")
+            return
 
-        # Payroll day
-        ttk.Label(settings_frame, text="Payroll Day:").grid(row=1, column=0, sticky="e", padx=5, pady=5)
-        payroll_day_entry = ttk.Entry(settings_frame)
-        payroll_day_entry.grid(row=1, column=1, sticky="ew", padx=5, pady=5)
+        # Company name, payroll day and the off-peak window for scheduled jobs
+        fields = [
+            ("Company Name:", 'company_name'),
+            ("Payroll Day:", 'payroll_day'),
+            ("Off-peak From (hour):", 'offpeak_start_hour'),
+            ("Off-peak To (hour):", 'offpeak_end_hour'),
+        ]
+        entries = {}
+        for row, (label, key) in enumerate(fields):
+            ttk.Label(settings_frame, text=label).grid(row=row, column=0, sticky="e", padx=5, pady=5)
+            entries[key] = ttk.Entry(settings_frame)
+            entries[key].insert(0, current[key])
+            entries[key].grid(row=row, column=1, sticky="ew", padx=5, pady=5)
+
+        backup_var = tk.BooleanVar(value=current['nightly_backup'] == '1')
+        ttk.Checkbutton(settings_frame, text="Nightly backup in the off-peak window",
+                        variable=backup_var).grid(row=4, column=1, sticky="w", padx=5, pady=5)
+        telemetry_var = tk.BooleanVar(value=current['ui_telemetry'] == '1')
+        ttk.Checkbutton(settings_frame, text="Record responsiveness metrics (from next start)",
+                        variable=telemetry_var).grid(row=5, column=1, sticky="w", padx=5, pady=5)
 
         # Save button
         def save_settings():
-            # In a real application, you would save these settings to database
-            messagebox.showinfo("Success", "Settings saved successfully")
+            values = {key: entry.get().strip() for key, entry in entries.items()}
+            values['nightly_backup'] = '1' if backup_var.get() else '0'
+            values['ui_telemetry'] = '1' if telemetry_var.get() else '0'
+            try:
+                settings.save_settings(self.connection, values)
+                messagebox.showinfo("Success", "Settings saved successfully")
+            except ValueError as err:
+                messagebox.showerror("Error", f"Invalid settings:\n{err}")
+            except sqlite3.Error as err:
+                messagebox.showerror("Database Error", f"Failed to save settings:\n{err}")
 
         save_btn = ttk.Button(settings_frame, text="Save Settings", style="Success.TButton",
                               command=save_settings)
-        save_btn.grid(row=2, column=0, columnspan=2, pady=20)
+        save_btn.grid(row=6, column=0, columnspan=2, pady=20)
+
+        # Database maintenance
+        ttk.Label(settings_frame, text="Database Maintenance", font=("Segoe UI", 10, "bold")).grid(
+            row=7, column=0, columnspan=2, sticky="w", padx=5, pady=(20, 5))
+
+        maintenance_frame = ttk.Frame(settings_frame, style="TFrame")
+        maintenance_frame.grid(row=8, column=0, columnspan=2, sticky="w", padx=5)
+
+        self.maintenance_status = ttk.Label(settings_frame, text="")
+        self.maintenance_status.grid(row=9, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+
+        backup_btn = ttk.Button(maintenance_frame, text="💾 Backup Now", style="Primary.TButton",
+                                command=self.backup_database)
+        backup_btn.pack(side="left", padx=5)
+
+        compact_btn = ttk.Button(maintenance_frame, text="🗜 Reclaim Space", style="TButton",
+                                 command=self.reclaim_database_space)
+        compact_btn.pack(side="left", padx=5)
+
+        vacuum_into_btn = ttk.Button(maintenance_frame, text="📦 Save Compacted Copy", style="TButton",
+                                     command=self.save_compacted_copy)
+        vacuum_into_btn.pack(side="left", padx=5)
+
+        if self.user_role == "admin":
+            archive_btn = ttk.Button(maintenance_frame, text="🗄 Archive Fiscal Year", style="TButton",
+                                     command=self.archive_fiscal_year)
+            archive_btn.pack(side="left", padx=5)
+
+        # Scheduled jobs run by the background worker
+        ttk.Label(settings_frame, text="Scheduled Jobs", font=("Segoe UI", 10, "bold")).grid(
+            row=10, column=0, columnspan=2, sticky="w", padx=5, pady=(20, 5))
+
+        columns = ("ID", "Job", "Status", "Run After", "Attempts", "Result")
+        jobs_tree = ttk.Treeview(settings_frame, columns=columns, show="headings", height=6)
+        col_widths = {"ID": 50, "Job": 70, "Status": 70, "Run After": 140, "Attempts": 70, "Result": 350}
+        for col in columns:
+            jobs_tree.heading(col, text=col)
+            jobs_tree.column(col, width=col_widths[col], anchor="w" if col == "Result" else "center")
+        jobs_tree.grid(row=11, column=0, columnspan=2, sticky="ew", padx=5)
+
+        try:
+            import scheduler
+
+            for job in scheduler.recent_jobs(self.connection):
+                jobs_tree.insert("", "end", values=tuple(job[:5]) + (job[5] or "",))
+        except sqlite3.Error as err:
+            messagebox.showerror("Database Error", f"Failed to load scheduled jobs:\n{err}")
+
+    def backup_database(self):
+        status_label = self.maintenance_status
+        status_label.config(text="Backup in progress...")
+
+        def report(text):
+            # Tk widgets may only be touched from the main thread
+            self.root.after(0, lambda: status_label.winfo_exists() and status_label.config(text=text))
+
+        def run_backup():
+            try:
+                path = db_maintenance.backup_database(
+                    self.db_path,
+                    progress=lambda done, total: report(f"Backup in progress... {done}/{total} pages"))
+                report(f"Backup saved to {path}")
+            except (sqlite3.Error, OSError) as err:
+                report(f"Backup failed: {err}")
+
+        threading.Thread(target=run_backup, daemon=True).start()
+
+    def reclaim_database_space(self):
+        status_label = self.maintenance_status
+        status_label.config(text="Reclaiming space...")
+
+        def report(text):
+            self.root.after(0, lambda: status_label.winfo_exists() and status_label.config(text=text))
+
+        def run_reclaim():
+            # The first run converts the database with a full VACUUM, which
+            # can take minutes on a large file
+            connection = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                if db_maintenance.enable_incremental_vacuum(connection):
+                    report("Database converted to incremental auto-vacuum and compacted")
+                    return
+                freed = db_maintenance.reclaim_space(connection)
+                db_maintenance.optimize(connection)
+                report(f"Reclaimed {freed} free pages")
+            except sqlite3.Error as err:
+                message = f"Failed to reclaim space:\n{err}"
+                report("Reclaim failed")
+                self.root.after(0, lambda: messagebox.showerror("Database Error", message))
+            finally:
+                connection.close()
+
+        threading.Thread(target=run_reclaim, daemon=True).start()
+
+    def archive_fiscal_year(self):
+        import archive
+
+        # Default to the most recent fiscal year that has closed
+        last_closed = archive.fiscal_year_of(date.today().isoformat()) - 1
+        fiscal_year = simpledialog.askinteger(
+            "Archive Fiscal Year", "Fiscal year to archive (the year it starts in, April-March):",
+            initialvalue=last_closed, minvalue=1900, maxvalue=last_closed, parent=self.root)
+        if fiscal_year is None:
+            return
+        if not messagebox.askyesno("Confirm", f"Move {archive.fiscal_year_label(fiscal_year)} payroll and leave "
+                                              "records into an archive database?"):
+            return
+
+        status_label = self.maintenance_status
+        status_label.config(text=f"Archiving {archive.fiscal_year_label(fiscal_year)}...")
+
+        def report(text):
+            self.root.after(0, lambda: status_label.winfo_exists() and status_label.config(text=text))
+
+        def run_archive():
+            # Copying a year out and reclaiming the freed pages can take a
+            # while on a large file; keep the UI thread free meanwhile
+            connection = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                target, payroll_rows, leave_rows = archive.archive_fiscal_year(connection, self.db_path,
+                                                                               fiscal_year)
+                db_maintenance.reclaim_space(connection)
+                report(f"{payroll_rows} payroll and {leave_rows} leave records moved to {target}")
+            except ValueError as err:
+                message = str(err)
+                report("Archive failed")
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+            except (sqlite3.Error, OSError) as err:
+                message = f"Failed to archive fiscal year:\n{err}"
+                report("Archive failed")
+                self.root.after(0, lambda: messagebox.showerror("Database Error", message))
+            finally:
+                connection.close()
+
+        threading.Thread(target=run_archive, daemon=True).start()
+
+    def save_compacted_copy(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".db",
+                                                 filetypes=[("SQLite database", "*.db")])
+        if not file_path:
+            return
+
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            db_maintenance.compact_into(self.connection, file_path)
+            messagebox.showinfo("Success", f"Compacted copy saved to {file_path}")
+        except (sqlite3.Error, OSError) as err:
+            messagebox.showerror("Database Error", f"Failed to save compacted copy:\n{err}")
 
 
 # Initialize and run the application
 if __name__ == "__main__":
+    import multiprocessing
+
+    # Needed for the payslip worker processes in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Payroll Management System")
+    parser.add_argument("--company", help="open this company's database from the shard registry")
+    parser.add_argument("--startup-profile", action="store_true", help="report startup time per phase")
+    args = parser.parse_args()
+
+    profile = StartupProfile(args.startup_profile, STARTUP_STARTED)
+    profile.mark("imports")
     root = tk.Tk()
-    app = PayrollSystem(root)
+    profile.mark("tk init")
+
+    db_path, company_name = DEFAULT_DB_PATH, None
+    if args.company:
+        import sharding
+
+        shard = sharding.get_shard(args.company)
+        if shard is None:
+            messagebox.showerror("Error", f"Unknown company code: {args.company}")
+            raise SystemExit(1)
+        db_path, company_name = shard.db_path, shard.company_name
+
+    app = PayrollSystem(root, profile, db_path, company_name)
     root.mainloop()
\ No newline at end of file
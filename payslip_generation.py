@@ -0,0 +1,267 @@
+import argparse
+import html
+import os
+import re
+import sqlite3
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from string import Template
+
+import archive
+import money
+import payroll_engine
+
+# Bulk payslip generation for a committed pay run. Rows are streamed out of the
+# payroll table (or the fiscal year's archive) in batches, rendered to HTML or PDF across a process pool and
+# written into a zip archive or a directory tree as the batches come back.
+#
+#   python payslip_generation.py 2025-03 payslips.zip --format pdf
+
+DEFAULT_DB_PATH = 'employee.db'
+DEFAULT_COMPANY = 'Payroll Management System'
+BATCH_SIZE = 500
+PAYSLIP_FORMATS = ('pdf', 'html')
+
+PAYSLIP_QUERY = """
+    SELECT p.payroll_id, p.employee_id, p.employee_name, e.email, p.leaves,
+           p.deducted_salary, p.bonus, p.arrears, p.income_tax, p.final_pay, p.payment_date
+    FROM {source} p
+    LEFT JOIN employees e ON e.employee_id = p.employee_id
+    WHERE p.payment_date >= ? AND p.payment_date < ?
+    ORDER BY p.employee_id
+"""
+
+# Templates are parsed once per process, not once per payslip
+HTML_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Payslip $period - $employee_name</title>
+<style>
+body { font-family: "Segoe UI", Arial, sans-serif; color: #5a5c69; margin: 40px; }
+h1 { color: #4e73df; margin-bottom: 0; }
+table { border-collapse: collapse; width: 480px; margin-top: 20px; }
+td { padding: 6px 10px; border-bottom: 1px solid #e3e6f0; }
+td.amount { text-align: right; }
+tr.total td { font-weight: bold; border-top: 2px solid #4e73df; }
+</style>
+</head>
+<body>
+<h1>$company</h1>
+<p>Payslip for $period_label</p>
+<table>
+<tr><td>Employee ID</td><td>$employee_id</td></tr>
+<tr><td>Employee</td><td>$employee_name</td></tr>
+<tr><td>Email</td><td>$email</td></tr>
+<tr><td>Payment Date</td><td>$payment_date</td></tr>
+<tr><td>Leave Days</td><td>$leaves</td></tr>
+</table>
+<table>
+<tr><td>Gross Earnings</td><td class="amount">$gross</td></tr>
+<tr><td>Bonus (included)</td><td class="amount">$bonus</td></tr>
+<tr><td>Arrears (net, included)</td><td class="amount">$arrears</td></tr>
+<tr><td>Leave Deduction</td><td class="amount">$deducted_salary</td></tr>
+<tr><td>Income Tax</td><td class="amount">$income_tax</td></tr>
+<tr class="total"><td>Net Pay</td><td class="amount">$final_pay</td></tr>
+</table>
+</body>
+</html>
+""")
+
+PDF_LINES = (
+    (20, "$company"),
+    (12, "Payslip for $period_label"),
+    (10, ""),
+    (10, "Employee ID:      $employee_id"),
+    (10, "Employee:         $employee_name"),
+    (10, "Email:            $email"),
+    (10, "Payment Date:     $payment_date"),
+    (10, "Leave Days:       $leaves"),
+    (10, ""),
+    (10, "Gross Earnings:   $gross"),
+    (10, "Bonus (included): $bonus"),
+    (10, "Arrears (net):    $arrears"),
+    (10, "Leave Deduction:  $deducted_salary"),
+    (10, "Income Tax:       $income_tax"),
+    (12, "Net Pay:          $final_pay"),
+)
+PDF_TEMPLATES = tuple((size, Template(text)) for size, text in PDF_LINES)
+
+
+def iter_pay_run(connection, period, batch_size=BATCH_SIZE):
+    # Yields lists of plain tuples, cheap to pickle across to the workers
+    month_start, _ = payroll_engine.month_bounds(period)
+    next_start = payroll_engine.next_month_start(period)
+    source = archive.table_source(connection, 'payroll', month_start, next_start)
+    cursor = connection.cursor()
+    cursor.execute(PAYSLIP_QUERY.format(source=source), (month_start, next_start))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def payslip_fields(row, period, company, currency):
+    (payroll_id, employee_id, employee_name, email, leaves,
+     deducted_salary, bonus, arrears, income_tax, final_pay, payment_date) = row
+    gross = final_pay + income_tax + deducted_salary
+
+    def amount(paise):
+        return money.format_inr(paise).replace("₹", currency)
+
+    return {
+        'company': company,
+        'period': period,
+        'period_label': payroll_engine.period_label(period),
+        'employee_id': employee_id,
+        'employee_name': employee_name,
+        'email': email or "",
+        'payment_date': payment_date,
+        'leaves': leaves,
+        'gross': amount(gross),
+        'bonus': amount(bonus),
+        'arrears': amount(arrears),
+        'deducted_salary': amount(deducted_salary),
+        'income_tax': amount(income_tax),
+        'final_pay': amount(final_pay),
+    }
+
+
+def payslip_filename(employee_id, employee_name, period, fmt):
+    safe_name = re.sub(r"[^A-Za-z0-9]+", "_", employee_name).strip("_") or "employee"
+    return f"{period}/{employee_id}_{safe_name}.{fmt}"
+
+
+def render_html(fields):
+    return HTML_TEMPLATE.substitute({key: html.escape(str(value)) for key, value in fields.items()}).encode('utf-8')
+
+
+def pdf_text(value):
+    # Core PDF fonts only cover Latin-1; escape the string delimiters
+    text = value.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(fields, templates=PDF_TEMPLATES):
+    # One A4 page of (font size, Template) lines; tax_statements.py has its own
+    y = 790
+    content = []
+    for size, template in templates:
+        text = pdf_text(template.substitute(fields))
+        content.append(f"BT /F1 {size} Tf 50 {y} Td ({text}) Tj ET")
+        y -= size + 10
+    stream = "\n".join(content).encode('latin-1')
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def render_batch(rows, period, fmt, company):
+    # Runs in a worker process
+    results = []
+    for row in rows:
+        if fmt == 'pdf':
+            document = render_pdf(payslip_fields(row, period, company, "Rs. "))
+        else:
+            document = render_html(payslip_fields(row, period, company, "₹"))
+        results.append((payslip_filename(row[1], row[2], period, fmt), document))
+    return results
+
+
+class PayslipWriter:
+    # Zip archive when the target ends in .zip, otherwise a directory tree
+    def __init__(self, target):
+        self.target = target
+        self.archive = None
+        if target.lower().endswith(".zip"):
+            self.archive = zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            os.makedirs(target, exist_ok=True)
+
+    def write(self, filename, document):
+        if self.archive:
+            self.archive.writestr(filename, document)
+            return
+        path = os.path.join(self.target, *filename.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(document)
+
+    def close(self):
+        if self.archive:
+            self.archive.close()
+
+
+def generate_payslips(period, target, fmt='pdf', db_path=DEFAULT_DB_PATH, company=DEFAULT_COMPANY,
+                      workers=None, batch_size=BATCH_SIZE, progress=None):
+    if fmt not in PAYSLIP_FORMATS:
+        raise ValueError(f"Unknown payslip format: {fmt}")
+
+    workers = workers or os.cpu_count() or 1
+    connection = sqlite3.connect(db_path, timeout=10)
+    writer = PayslipWriter(target)
+    written = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of batches in flight so memory stays flat
+            max_pending = workers * 2
+            pending = set()
+            batches = iter_pay_run(connection, period, batch_size)
+
+            while True:
+                for rows in batches:
+                    pending.add(executor.submit(render_batch, rows, period, fmt, company))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for filename, document in future.result():
+                        writer.write(filename, document)
+                        written += 1
+                if progress:
+                    progress(written)
+    finally:
+        writer.close()
+        connection.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate payslips for a pay run")
+    parser.add_argument("period", help="pay period, YYYY-MM")
+    parser.add_argument("target", help="output .zip file or directory")
+    parser.add_argument("--format", choices=PAYSLIP_FORMATS, default='pdf')
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--company", default=DEFAULT_COMPANY)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    count = generate_payslips(args.period, args.target, args.format, args.db, args.company, args.workers)
+    print(f"{count} payslips written to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
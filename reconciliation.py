@@ -0,0 +1,186 @@
+import argparse
+import csv
+import sqlite3
+from collections import Counter
+
+import archive
+import money
+import payroll_engine
+
+# Month-over-month reconciliation of committed pay runs. Both periods are read
+# with one join per direction over the (payment_date, employee_id) index:
+# employees paid this period are joined to last period's rows (new hires and
+# changes), and last period's rows without a match this period are exits.
+# Unchanged rows, the vast majority, are discarded inside SQLite by comparing
+# a fingerprint of the compared columns before any threshold check.
+#
+#   python reconciliation.py 2025-02 2025-03 --threshold 1.00 --csv diff.csv
+
+DEFAULT_DB_PATH = 'employee.db'
+PAGE_SIZE = 200
+
+CHANGE_NEW = 'new'
+CHANGE_EXIT = 'exit'
+CHANGE_CHANGED = 'changed'
+
+# Compared per employee; leaves is a day count, the rest are paise
+DIFF_FIELDS = ('leaves', 'deducted_salary', 'bonus', 'income_tax', 'final_pay')
+FIELD_LABELS = {
+    'leaves': 'Leaves',
+    'deducted_salary': 'Deductions',
+    'bonus': 'Bonus',
+    'income_tax': 'Tax',
+    'final_pay': 'Net Pay',
+}
+
+# {previous_source}/{current_source} are payroll, or a union with the archived
+# fiscal year holding that period (see archive.table_source)
+RECONCILIATION_QUERY = """
+    WITH previous AS MATERIALIZED (
+        SELECT employee_id, employee_name, leaves, deducted_salary, bonus, income_tax, final_pay
+        FROM {previous_source}
+        WHERE payment_date >= :previous_start AND payment_date < :previous_end
+    ),
+    current AS MATERIALIZED (
+        SELECT employee_id, employee_name, leaves, deducted_salary, bonus, income_tax, final_pay
+        FROM {current_source}
+        WHERE payment_date >= :current_start AND payment_date < :current_end
+    )
+    SELECT c.employee_id, c.employee_name,
+           CASE WHEN p.employee_id IS NULL THEN 'new' ELSE 'changed' END,
+           p.leaves, c.leaves, p.deducted_salary, c.deducted_salary, p.bonus, c.bonus,
+           p.income_tax, c.income_tax, p.final_pay, c.final_pay
+    FROM current c
+    LEFT JOIN previous p ON p.employee_id = c.employee_id
+    WHERE p.employee_id IS NULL
+       OR ((c.leaves, c.deducted_salary, c.bonus, c.income_tax, c.final_pay)
+           IS NOT (p.leaves, p.deducted_salary, p.bonus, p.income_tax, p.final_pay)
+           AND (c.leaves IS NOT p.leaves
+                OR ABS(c.deducted_salary - p.deducted_salary) > :threshold
+                OR ABS(c.bonus - p.bonus) > :threshold
+                OR ABS(c.income_tax - p.income_tax) > :threshold
+                OR ABS(c.final_pay - p.final_pay) > :threshold))
+    UNION ALL
+    SELECT p.employee_id, p.employee_name, 'exit',
+           p.leaves, NULL, p.deducted_salary, NULL, p.bonus, NULL,
+           p.income_tax, NULL, p.final_pay, NULL
+    FROM previous p
+    WHERE NOT EXISTS (SELECT 1 FROM current c WHERE c.employee_id = p.employee_id)
+    ORDER BY 1
+"""
+
+
+class DiffRow:
+    __slots__ = ('employee_id', 'employee_name', 'change', 'previous', 'current')
+
+    def __init__(self, employee_id, employee_name, change, *values):
+        self.employee_id = employee_id
+        self.employee_name = employee_name
+        self.change = change
+        # values alternate previous/current per field, in DIFF_FIELDS order
+        self.previous = dict(zip(DIFF_FIELDS, values[0::2]))
+        self.current = dict(zip(DIFF_FIELDS, values[1::2]))
+
+    def delta(self, field):
+        return (self.current[field] or 0) - (self.previous[field] or 0)
+
+    def changed_fields(self, threshold=0):
+        if self.change != CHANGE_CHANGED:
+            return []
+        return [field for field in DIFF_FIELDS
+                if self.previous[field] != self.current[field]
+                and (field == 'leaves' or abs(self.delta(field)) > threshold)]
+
+
+def reconcile(connection, previous_period, current_period, threshold=0):
+    # threshold is in paise; money changes at or below it are ignored
+    previous_start, _ = payroll_engine.month_bounds(previous_period)
+    current_start, _ = payroll_engine.month_bounds(current_period)
+    params = {
+        'previous_start': previous_start,
+        'previous_end': payroll_engine.next_month_start(previous_period),
+        'current_start': current_start,
+        'current_end': payroll_engine.next_month_start(current_period),
+        'threshold': threshold,
+    }
+    sql = RECONCILIATION_QUERY.format(
+        previous_source=archive.table_source(connection, 'payroll', previous_start, params['previous_end']),
+        current_source=archive.table_source(connection, 'payroll', current_start, params['current_end']))
+    return [DiffRow(*row) for row in connection.execute(sql, params)]
+
+
+def previous_period(period):
+    year, month = (int(part) for part in period.split("-"))
+    return f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+
+
+def summarize(rows):
+    counts = Counter(row.change for row in rows)
+    return {
+        CHANGE_NEW: counts[CHANGE_NEW],
+        CHANGE_EXIT: counts[CHANGE_EXIT],
+        CHANGE_CHANGED: counts[CHANGE_CHANGED],
+        'net_delta': sum(row.delta('final_pay') for row in rows),
+    }
+
+
+def display_values(row, threshold=0):
+    # Treeview/CSV cells: previous and current net pay plus the fields that moved
+    def amount(value):
+        return "" if value is None else money.format_amount(value)
+
+    return (row.employee_id, row.employee_name, row.change,
+            amount(row.previous['final_pay']), amount(row.current['final_pay']),
+            money.format_amount(row.delta('final_pay')),
+            ", ".join(FIELD_LABELS[field] for field in row.changed_fields(threshold)))
+
+
+def export_csv(rows, file_path, threshold=0):
+    with open(file_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        header = ['Employee ID', 'Employee', 'Change']
+        for field in DIFF_FIELDS:
+            header += [f"Previous {FIELD_LABELS[field]}", f"Current {FIELD_LABELS[field]}"]
+        writer.writerow(header + ['Changed Fields'])
+
+        for row in rows:
+            line = [row.employee_id, row.employee_name, row.change]
+            for field in DIFF_FIELDS:
+                for value in (row.previous[field], row.current[field]):
+                    if value is None:
+                        line.append("")
+                    elif field == 'leaves':
+                        line.append(value)
+                    else:
+                        line.append(money.format_amount(value))
+            line.append(";".join(FIELD_LABELS[field] for field in row.changed_fields(threshold)))
+            writer.writerow(line)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two pay runs employee by employee")
+    parser.add_argument("previous", help="earlier pay period, YYYY-MM")
+    parser.add_argument("current", help="later pay period, YYYY-MM")
+    parser.add_argument("--threshold", default="0", help="ignore money changes up to this many rupees")
+    parser.add_argument("--csv", help="write the full diff to this CSV file")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    threshold = money.to_paise(args.threshold)
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        rows = reconcile(connection, args.previous, args.current, threshold)
+    finally:
+        connection.close()
+
+    summary = summarize(rows)
+    print(f"{summary[CHANGE_NEW]} new, {summary[CHANGE_EXIT]} exits, {summary[CHANGE_CHANGED]} changed; "
+          f"net pay moved by {money.format_amount(summary['net_delta'])}")
+    if args.csv:
+        export_csv(rows, args.csv, threshold)
+        print(f"Diff written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
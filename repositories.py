@@ -0,0 +1,612 @@
+import sqlite3
+import time
+
+import archive
+import attendance
+import change_events
+import leave_ledger
+import money
+import org_units
+import pay_runs
+import payroll_engine
+
+# Data-access layer shared by the desktop app, the CLI tools and batch jobs.
+# Each repository owns a tuned connection (or borrows one for a shared
+# transaction) and hands back compact __slots__ records instead of sqlite3.Row.
+# List methods return iterators backed by fetchmany, so callers that stream
+# never hold a whole table in memory. page() serves the list screens: filters
+# and sort keys are whitelisted per repository, sorting happens in SQLite and
+# the next page continues from the last row's sort key (keyset paging).
+# Single-record writes publish a change event (see change_events.py) after
+# they commit, so open lists can patch one row instead of reloading.
+# Given a QueryClock, a repository adds the time its statements spend in
+# SQLite (execute and fetch) to it; UI telemetry uses this to tell query time
+# from render time.
+
+DEFAULT_DB_PATH = 'employee.db'
+STATEMENT_CACHE_SIZE = 256
+FETCH_BATCH_SIZE = 1000
+PAGE_SIZE = 500
+
+
+def open_connection(db_path=DEFAULT_DB_PATH, cached_statements=STATEMENT_CACHE_SIZE):
+    connection = sqlite3.connect(db_path, timeout=10, cached_statements=cached_statements)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL is durable across application crashes and avoids an fsync per commit
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA cache_size=-16000")
+    connection.execute("PRAGMA temp_store=MEMORY")
+    return connection
+
+
+class QueryClock:
+    __slots__ = ('seconds',)
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+class TimedCursor(sqlite3.Cursor):
+    # Rows come back lazily, so fetches are timed as well as execute
+    clock = None
+
+    def timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.clock.seconds += time.perf_counter() - started
+
+    def execute(self, sql, params=()):
+        return self.timed(super().execute, sql, params)
+
+    def fetchone(self):
+        return self.timed(super().fetchone)
+
+    def fetchmany(self, *size):
+        return self.timed(super().fetchmany, *size)
+
+    def fetchall(self):
+        return self.timed(super().fetchall)
+
+    def __next__(self):
+        return self.timed(super().__next__)
+
+
+def filter_value(kind, value):
+    # Filter builder text -> bound parameter; raises ValueError on bad input
+    if kind == 'text':
+        return f"%{value}%"
+    if kind == 'code':
+        return value.strip()
+    if kind == 'month_start':
+        return payroll_engine.month_bounds(value)[0]
+    if kind == 'month_end':
+        return payroll_engine.next_month_start(value)
+    if kind == 'money':
+        return money.to_paise(value)
+    if kind == 'number':
+        return float(value)
+    raise ValueError(f"Unknown filter kind: {kind}")
+
+
+class Record:
+    # Subclasses list their columns in __slots__, in SELECT order
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        return cls(*row)
+
+    def __getitem__(self, key):
+        # Lets records stand in where sqlite3.Row was used: record['first_name']
+        if isinstance(key, int):
+            return getattr(self, self.__slots__[key])
+        return getattr(self, key)
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Employee(Record):
+    __slots__ = ('employee_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city',
+                 'state', 'postal_code', 'country', 'hire_date', 'status', 'org_unit_id')
+
+
+class EmployeeSummary(Record):
+    __slots__ = ('employee_id', 'first_name', 'last_name', 'email', 'phone', 'hire_date', 'status', 'org_unit')
+
+
+class SalaryRecord(Record):
+    __slots__ = ('salary_id', 'employee_id', 'employee_name', 'base_salary', 'hra', 'da', 'bonus',
+                 'effective_date')
+
+
+class LeaveRecord(Record):
+    __slots__ = ('leave_id', 'employee_id', 'employee_name', 'date_from', 'date_to', 'reason',
+                 'leaves', 'current_leaves')
+
+
+class PayrollRecord(Record):
+    __slots__ = ('payroll_id', 'employee_id', 'employee_name', 'leaves', 'deducted_salary', 'bonus',
+                 'income_tax', 'final_pay', 'payment_date')
+
+
+def sort_value(value):
+    # Orders like SQLite's ORDER BY, where NULL comes first
+    return (value is not None, value)
+
+
+class Repository:
+    # For page(): the record type, its primary key as (SQL, attribute), the
+    # allowed filters as name -> (clause, value kind) and the allowed sort keys
+    # as name -> ((SQL, attribute), ...), each ending up ahead of the primary key.
+    # TABLE names the table in the change events this repository publishes.
+    TABLE = None
+    RECORD = None
+    PRIMARY_KEY = None
+    FILTERS = {}
+    SORT_KEYS = {}
+    DEFAULT_SORT = None
+
+    def __init__(self, connection=None, db_path=DEFAULT_DB_PATH, events=None, clock=None):
+        self.owns_connection = connection is None
+        self.connection = connection or open_connection(db_path)
+        self.events = events
+        self.clock = clock
+
+    def notify(self, kind, key):
+        # Called after the write has committed
+        if self.events is not None:
+            self.events.publish(self.TABLE, kind, key)
+
+    def cursor(self):
+        if self.clock is None:
+            return self.connection.cursor()
+        cursor = self.connection.cursor(TimedCursor)
+        cursor.clock = self.clock
+        return cursor
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def scalar(self, sql, params=()):
+        row = self.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    def query(self, record_type, sql, params=()):
+        cursor = self.cursor()
+        cursor.row_factory = record_type.from_row
+        return cursor.execute(sql, params)
+
+    def fetch_one(self, record_type, sql, params=()):
+        return self.query(record_type, sql, params).fetchone()
+
+    def iterate(self, record_type, sql, params=(), batch_size=FETCH_BATCH_SIZE):
+        cursor = self.query(record_type, sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def filter_clauses(self, filters):
+        clauses, params = [], []
+        for name, value in (filters or {}).items():
+            if value in (None, ""):
+                continue
+            if name not in self.FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            clause, kind = self.FILTERS[name]
+            clauses.append(clause)
+            params.append(filter_value(kind, value))
+        return clauses, params
+
+    def page(self, filters=None, sort=None, descending=False, after=None, limit=PAGE_SIZE):
+        # Returns (records, next_after); next_after is None on the last page
+        clauses, params = self.filter_clauses(filters)
+
+        sort = sort or self.DEFAULT_SORT
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        keys = self.SORT_KEYS[sort] + (self.PRIMARY_KEY,)
+
+        if after is not None:
+            # Row-value comparison continues exactly after the previous page's last row
+            clauses.append(f"({', '.join(sql for sql, _ in keys)}) {'<' if descending else '>'} "
+                           f"({', '.join('?' * len(keys))})")
+            params.extend(after)
+
+        tail = " WHERE " + " AND ".join(clauses) if clauses else ""
+        direction = " DESC" if descending else ""
+        tail += " ORDER BY " + ", ".join(sql_key + direction for sql_key, _ in keys) + " LIMIT ?"
+
+        # More archived years than can be attached at once are read in
+        # batches, each sorted and limited, and the pages merged
+        records, batches = [], 0
+        for select in self.selects_for(filters or {}):
+            records.extend(self.query(self.RECORD, select + tail, params + [limit + 1]).fetchall())
+            batches += 1
+        if batches > 1:
+            records.sort(key=lambda record: tuple(sort_value(getattr(record, attribute)) for _, attribute in keys),
+                         reverse=descending)
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, tuple(getattr(records[-1], attribute) for _, attribute in keys)
+
+    def fetch_matching(self, key, filters=None):
+        # The record with this primary key if it passes the filters, else None;
+        # how a list decides whether a changed row belongs on it
+        clauses, params = self.filter_clauses(filters)
+        clauses.append(f"{self.PRIMARY_KEY[0]} = ?")
+        for select in self.selects_for(filters or {}):
+            record = self.fetch_one(self.RECORD, select + " WHERE " + " AND ".join(clauses), params + [key])
+            if record is not None:
+                return record
+        return None
+
+    def select_for(self, filters):
+        # Repositories over archived tables widen their FROM clause to the
+        # archived fiscal years the period filters reach into
+        return self.SELECT
+
+    def selects_for(self, filters):
+        # The SELECTs that together cover the filters; more than one when the
+        # archived years they reach cannot all be attached at once (see
+        # archive.table_sources), each to be read to the end before the next
+        yield self.select_for(filters)
+
+    def period_filter_range(self, filters):
+        # period_from/period_to filters as an ISO date range; None is open-ended
+        start = filter_value('month_start', filters['period_from']) if filters.get('period_from') else None
+        end = filter_value('month_end', filters['period_to']) if filters.get('period_to') else None
+        return start, end
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        if self.owns_connection:
+            self.connection.close()
+
+
+class EmployeeRepo(Repository):
+    TABLE = 'employees'
+    SUMMARY_COLUMNS = ("employee_id, first_name, last_name, email, phone, hire_date, status, "
+                       "(SELECT code FROM org_units WHERE unit_id = employees.org_unit_id)")
+    WRITE_COLUMNS = ('first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state',
+                     'postal_code', 'country', 'hire_date', 'status', 'org_unit_id')
+
+    def count(self):
+        return self.scalar("SELECT COUNT(*) FROM employees")
+
+    def search_clauses(self, search_term=None, org_unit=None):
+        # org_unit is a unit code and matches the unit's whole subtree
+        clauses, params = [], []
+        if search_term:
+            clauses.append("(first_name LIKE ? OR last_name LIKE ? OR email LIKE ?)")
+            params += [f"%{search_term}%"] * 3
+        if org_unit:
+            clauses.append(f"org_unit_id IN ({org_units.SUBTREE_BY_CODE})")
+            params.append(org_unit.strip())
+        return clauses, params
+
+    def list(self, search_term=None, org_unit=None):
+        clauses, params = self.search_clauses(search_term, org_unit)
+        sql = f"SELECT {self.SUMMARY_COLUMNS} FROM employees"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self.iterate(EmployeeSummary, sql, params)
+
+    def summary(self, employee_id, search_term=None, org_unit=None):
+        # One list row, or None when the employee is gone or fails the search
+        clauses, params = self.search_clauses(search_term, org_unit)
+        sql = f"SELECT {self.SUMMARY_COLUMNS} FROM employees WHERE " + " AND ".join(["employee_id = ?"] + clauses)
+        return self.fetch_one(EmployeeSummary, sql, [employee_id] + params)
+
+    def get(self, employee_id):
+        return self.fetch_one(Employee, f"SELECT employee_id, {', '.join(self.WRITE_COLUMNS)} "
+                                        "FROM employees WHERE employee_id = ?", (employee_id,))
+
+    def names(self):
+        # name -> id for the employee pickers
+        return {name: employee_id for employee_id, name in self.execute(
+            "SELECT employee_id, first_name || ' ' || last_name FROM employees")}
+
+    def insert(self, data):
+        cursor = self.execute(f"""
+            INSERT INTO employees ({', '.join(self.WRITE_COLUMNS)})
+            VALUES ({', '.join('?' * len(self.WRITE_COLUMNS))})
+        """, [data[column] for column in self.WRITE_COLUMNS])
+        self.commit()
+        self.notify(change_events.INSERT, cursor.lastrowid)
+        return cursor.lastrowid
+
+    def update(self, employee_id, data):
+        self.execute(f"""
+            UPDATE employees SET {', '.join(f'{column} = ?' for column in self.WRITE_COLUMNS)}
+            WHERE employee_id = ?
+        """, [data[column] for column in self.WRITE_COLUMNS] + [employee_id])
+        self.commit()
+        self.notify(change_events.UPDATE, employee_id)
+
+    def has_related_records(self, employee_id):
+        # Archived fiscal years count too; their rows still refer to the employee
+        if self.scalar("SELECT EXISTS(SELECT 1 FROM employee_salary WHERE employee_id = ?)", (employee_id,)):
+            return True
+        for table in ('payroll', 'leave_register'):
+            for source in archive.table_sources(self.connection, table):
+                if self.scalar(f"SELECT EXISTS(SELECT 1 FROM {source} WHERE employee_id = ?)", (employee_id,)):
+                    return True
+        return False
+
+    def delete(self, employee_id):
+        self.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
+        self.commit()
+        self.notify(change_events.DELETE, employee_id)
+
+
+class SalaryRepo(Repository):
+    SELECT = """
+        SELECT s.salary_id, s.employee_id, e.first_name || ' ' || e.last_name,
+               s.base_salary, s.hra, s.da, s.bonus, s.effective_date
+        FROM employee_salary s
+        JOIN employees e ON s.employee_id = e.employee_id
+    """
+    TABLE = 'employee_salary'
+    RECORD = SalaryRecord
+    PRIMARY_KEY = ('s.salary_id', 'salary_id')
+    FILTERS = {
+        'employee': ("e.first_name || ' ' || e.last_name LIKE ?", 'text'),
+        'period_from': ("s.effective_date >= ?", 'month_start'),
+        'period_to': ("s.effective_date < ?", 'month_end'),
+        'amount_min': ("s.base_salary >= ?", 'money'),
+        'amount_max': ("s.base_salary <= ?", 'money'),
+    }
+    # Each key matches an index column order (see schema.index_list_sort_columns
+    # and index_remaining_sort_columns). The employee name comes from the joined
+    # employees table, which no index here can order, so it is only a filter.
+    SORT_KEYS = {
+        'salary_id': (),
+        'base_salary': (('s.base_salary', 'base_salary'),),
+        'hra': (('s.hra', 'hra'),),
+        'da': (('s.da', 'da'),),
+        'bonus': (('s.bonus', 'bonus'),),
+        'effective_date': (('s.effective_date', 'effective_date'),),
+    }
+    DEFAULT_SORT = 'effective_date'
+
+    def has_component_columns(self):
+        columns = {row[1] for row in self.execute("PRAGMA table_info(employee_salary)")}
+        return {'hra', 'da', 'bonus'} <= columns
+
+    def list(self):
+        return self.iterate(SalaryRecord, self.SELECT + " ORDER BY s.effective_date DESC")
+
+    def get(self, salary_id):
+        return self.fetch_one(SalaryRecord, self.SELECT + " WHERE s.salary_id = ?", (salary_id,))
+
+    def insert(self, employee_id, base_salary, hra, da, bonus, effective_date):
+        cursor = self.execute("""
+            INSERT INTO employee_salary
+            (employee_id, base_salary, hra, da, bonus, effective_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (employee_id, base_salary, hra, da, bonus, effective_date))
+        self.commit()
+        self.notify(change_events.INSERT, cursor.lastrowid)
+        return cursor.lastrowid
+
+    def update(self, salary_id, base_salary, hra, da, bonus, effective_date):
+        self.execute("""
+            UPDATE employee_salary
+            SET base_salary = ?, hra = ?, da = ?, bonus = ?, effective_date = ?
+            WHERE salary_id = ?
+        """, (base_salary, hra, da, bonus, effective_date, salary_id))
+        self.commit()
+        self.notify(change_events.UPDATE, salary_id)
+
+
+class LeaveRepo(Repository):
+    SELECT = """
+        SELECT l.leave_id, l.employee_id, e.first_name || ' ' || e.last_name,
+               l.date_from, l.date_to, l.reason, l.leaves, l.current_leaves
+        FROM leave_register l
+        JOIN employees e ON l.employee_id = e.employee_id
+    """
+    TABLE = 'leave_register'
+    RECORD = LeaveRecord
+    PRIMARY_KEY = ('l.leave_id', 'leave_id')
+    FILTERS = {
+        'employee': ("e.first_name || ' ' || e.last_name LIKE ?", 'text'),
+        # Leaves overlapping the period range
+        'period_from': ("l.date_to >= ?", 'month_start'),
+        'period_to': ("l.date_from < ?", 'month_end'),
+        'leaves_min': ("l.leaves >= ?", 'number'),
+        'leaves_max': ("l.leaves <= ?", 'number'),
+    }
+    # Each key matches an index column order (see schema.index_list_sort_columns
+    # and index_remaining_sort_columns). The employee name comes from the joined
+    # employees table, which no index here can order, so it is only a filter.
+    SORT_KEYS = {
+        'leave_id': (),
+        'date_from': (('l.date_from', 'date_from'),),
+        'date_to': (('l.date_to', 'date_to'),),
+        'leaves': (('l.leaves', 'leaves'),),
+    }
+    DEFAULT_SORT = 'date_from'
+
+    def select_for(self, filters):
+        source = archive.table_source(self.connection, 'leave_register', *self.period_filter_range(filters))
+        return self.SELECT.replace("FROM leave_register l", f"FROM {source} l")
+
+    def selects_for(self, filters):
+        for source in archive.table_sources(self.connection, 'leave_register', *self.period_filter_range(filters)):
+            yield self.SELECT.replace("FROM leave_register l", f"FROM {source} l")
+
+    def list(self):
+        return self.iterate(LeaveRecord, self.SELECT + " ORDER BY l.date_from DESC")
+
+    def recent(self, limit=5):
+        return self.query(LeaveRecord, self.SELECT + " ORDER BY l.date_from DESC LIMIT ?", (limit,)).fetchall()
+
+    def count_overlapping(self, date_from, date_to):
+        return self.scalar("SELECT COUNT(*) FROM leave_register WHERE date_from <= ? AND date_to >= ?",
+                           (date_to, date_from))
+
+    def overlapping(self, employee_id, date_from, date_to):
+        # The employee's first leave sharing a day with the given dates, if any
+        return self.fetch_one(LeaveRecord, self.SELECT + """
+            WHERE l.employee_id = ? AND l.date_from <= ? AND l.date_to >= ?
+            ORDER BY l.date_from LIMIT 1
+        """, (employee_id, date_to, date_from))
+
+    def balance(self, employee_id):
+        return leave_ledger.get_balance(self.connection, employee_id)
+
+    def insert(self, employee_id, employee_name, date_from, date_to, reason, leaves):
+        # Returns (leave_id, unpaid_days); the days the balance cannot cover are leave without pay
+        try:
+            cursor = self.execute("""
+                INSERT INTO leave_register (
+                    employee_id, employee_name, date_from, date_to,
+                    reason, leaves, current_leaves
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (employee_id, employee_name, date_from, date_to, reason, leaves,
+                  leaves))  # Initially current_leaves = total leaves
+            _, unpaid_days = leave_ledger.consume_leave(self.connection, employee_id, cursor.lastrowid,
+                                                        leaves, date_from)
+            attendance.refresh_leave_periods(self.connection, [(date_from, date_to)])
+            self.commit()
+        except sqlite3.Error:
+            self.rollback()
+            raise
+        self.notify(change_events.INSERT, cursor.lastrowid)
+        return cursor.lastrowid, unpaid_days
+
+    def accrue_month(self, period, days=leave_ledger.MONTHLY_ACCRUAL_DAYS):
+        try:
+            credited = leave_ledger.accrue_month(self.connection, period, days)
+            self.commit()
+        except sqlite3.Error:
+            self.rollback()
+            raise
+        return credited
+
+    def adjust_balance(self, employee_id, days, note=None):
+        try:
+            balance = leave_ledger.adjust_balance(self.connection, employee_id, days, note)
+            self.commit()
+        except sqlite3.Error:
+            self.rollback()
+            raise
+        return balance
+
+    def close_year(self, year):
+        # Returns the number of balances that lapsed above the carry-forward cap
+        try:
+            lapsed = leave_ledger.close_year(self.connection, year)
+            self.commit()
+        except sqlite3.Error:
+            self.rollback()
+            raise
+        return lapsed
+
+    def year_snapshot(self, employee_id, year):
+        return leave_ledger.year_snapshot(self.connection, employee_id, year)
+
+
+class PayrollRepo(Repository):
+    SELECT = """
+        SELECT payroll_id, employee_id, employee_name, leaves, deducted_salary, bonus,
+               income_tax, final_pay, payment_date
+        FROM payroll
+    """
+    TABLE = 'payroll'
+    RECORD = PayrollRecord
+    PRIMARY_KEY = ('payroll_id', 'payroll_id')
+    FILTERS = {
+        'employee': ("employee_name LIKE ?", 'text'),
+        'period_from': ("payment_date >= ?", 'month_start'),
+        'period_to': ("payment_date < ?", 'month_end'),
+        'net_min': ("final_pay >= ?", 'money'),
+        'net_max': ("final_pay <= ?", 'money'),
+        'tax_min': ("income_tax >= ?", 'money'),
+        'tax_max': ("income_tax <= ?", 'money'),
+        'leaves_min': ("leaves >= ?", 'number'),
+        'leaves_max': ("leaves <= ?", 'number'),
+        # The unit the employee was paid under, or any unit below it
+        'org_unit': (f"org_unit_id IN ({org_units.SUBTREE_BY_CODE})", 'code'),
+    }
+    # Each key matches an index column order (see schema.index_list_sort_columns
+    # and index_remaining_sort_columns)
+    SORT_KEYS = {
+        'payroll_id': (),
+        'employee_name': (('employee_name', 'employee_name'), ('payment_date', 'payment_date')),
+        'leaves': (('leaves', 'leaves'),),
+        'deducted_salary': (('deducted_salary', 'deducted_salary'),),
+        'bonus': (('bonus', 'bonus'),),
+        'income_tax': (('income_tax', 'income_tax'),),
+        'final_pay': (('final_pay', 'final_pay'),),
+        'payment_date': (('payment_date', 'payment_date'), ('employee_id', 'employee_id')),
+    }
+    DEFAULT_SORT = 'payment_date'
+
+    def select_for(self, filters):
+        source = archive.table_source(self.connection, 'payroll', *self.period_filter_range(filters))
+        return self.SELECT.replace("FROM payroll", f"FROM {source} AS payroll")
+
+    def selects_for(self, filters):
+        for source in archive.table_sources(self.connection, 'payroll', *self.period_filter_range(filters)):
+            yield self.SELECT.replace("FROM payroll", f"FROM {source} AS payroll")
+
+    def period_range(self, period):
+        return payroll_engine.month_bounds(period)[0], payroll_engine.next_month_start(period)
+
+    def count_for_period(self, period):
+        return self.scalar("SELECT COUNT(*) FROM payroll WHERE payment_date >= ? AND payment_date < ?",
+                           self.period_range(period))
+
+    def recent(self, limit=5):
+        return self.query(PayrollRecord, self.SELECT + " ORDER BY payment_date DESC LIMIT ?", (limit,)).fetchall()
+
+    def list(self, period=None):
+        if period:
+            return self.iterate(PayrollRecord, self.SELECT +
+                                " WHERE payment_date >= ? AND payment_date < ? ORDER BY payment_date DESC",
+                                self.period_range(period))
+        return self.iterate(PayrollRecord, self.SELECT + " ORDER BY payment_date DESC")
+
+    def exists_for_period(self, period):
+        return pay_runs.is_committed(self.connection, period)
+
+    def get_run(self, period):
+        return pay_runs.get_run(self.connection, period)
+
+    def fetch_inputs(self, period):
+        # Dicts rather than records: the salary policy fills in the components
+        return payroll_engine.fetch_payroll_inputs(self.cursor(), period)
+
+    def claim_run(self, period, owner):
+        return pay_runs.claim_run(self.connection, period, owner)
+
+    def commit_run(self, run_id, owner, records, payment_date):
+        return payroll_engine.commit_payroll(self.connection, run_id, owner, records, payment_date)
+
+    def release_run(self, run_id, owner, error=None):
+        pay_runs.release_run(self.connection, run_id, owner, error)
+
+    def revert_run(self, period):
+        return pay_runs.revert_run(self.connection, period)
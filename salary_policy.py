@@ -0,0 +1,255 @@
+import argparse
+import ast
+import functools
+import sqlite3
+from datetime import date, datetime
+from fractions import Fraction
+
+import money
+
+# Salary component formulas. A policy version holds a formula for any of HRA,
+# DA and bonus, e.g.
+#
+#   hra:   0.4 * base if city in ('mumbai', 'delhi', 'kolkata', 'chennai') else 0.5 * base
+#   bonus: 2500 if tenure_years >= 5 else 0
+#
+# Formulas are Python expressions over the names in VARIABLES, restricted to
+# arithmetic, comparisons, and/or/not, "x if condition else y" and min/max.
+# Amounts are rupees and all arithmetic is exact (numbers become Fractions);
+# the result is rounded to the nearest paisa. A component without a formula
+# keeps the amount stored on the salary record.
+#
+# Each formula is parsed, checked against the whitelist and a sample employee,
+# and compiled to a plain Python function once per policy version; a pay run
+# then calls those functions for every employee in one pass. Saving formulas
+# always creates a new version, so each pay run records the version it used
+# and arrears recompute a month with the rules it was paid under.
+#
+#   python salary_policy.py show
+#   python salary_policy.py set hra "0.4 * base if city in ('mumbai', 'delhi') else 0.5 * base"
+#   python salary_policy.py set bonus ""          # back to the stored amounts
+
+DEFAULT_DB_PATH = 'employee.db'
+COMPONENTS = ('hra', 'da', 'bonus')
+# Names a formula can use: the salary record's amounts in rupees, the
+# employee's city (lower case) and status, and completed years and months of
+# service at the end of the pay period
+VARIABLES = ('base', 'hra', 'da', 'bonus', 'city', 'status', 'tenure_years', 'tenure_months')
+FUNCTIONS = {'min': min, 'max': max}
+MAX_FORMULA_LENGTH = 500
+SAMPLE_VALUES = {'base': Fraction(50000), 'hra': Fraction(20000), 'da': Fraction(5000), 'bonus': Fraction(0),
+                 'city': 'mumbai', 'status': 'active', 'tenure_years': 3, 'tenure_months': 40}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name,
+    ast.Constant, ast.Tuple, ast.List, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+)
+
+
+class FormulaError(ValueError):
+    pass
+
+
+class ExactNumbers(ast.NodeTransformer):
+    # Numeric literals become named Fraction constants, so 0.4 is exactly 2/5
+    def __init__(self):
+        self.constants = {}
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            return node
+        name = f"_c{len(self.constants)}"
+        self.constants[name] = Fraction(str(node.value))
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+
+def parse_formula(text):
+    # The validated expression tree; raises FormulaError with a readable message
+    text = (text or "").strip()
+    if not text:
+        raise FormulaError("The formula is empty")
+    if len(text) > MAX_FORMULA_LENGTH:
+        raise FormulaError(f"Formulas are limited to {MAX_FORMULA_LENGTH} characters")
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as err:
+        raise FormulaError(f"Syntax error at column {err.offset}: {text}")
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise FormulaError(f"Not allowed in a formula: {ast.get_source_segment(text, node) or type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in VARIABLES and node.id not in FUNCTIONS:
+            raise FormulaError(f"Unknown name '{node.id}'; use {', '.join(VARIABLES)}")
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS
+                                           or node.keywords or not node.args):
+            raise FormulaError(f"Only {' and '.join(FUNCTIONS)} can be called")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str)):
+            raise FormulaError(f"Not allowed in a formula: {node.value!r}")
+    return tree
+
+
+def compile_formula(text):
+    # (function, names): the function takes the VARIABLES the formula uses,
+    # listed in names, as keyword arguments
+    tree = parse_formula(text)
+    names = tuple(name for name in VARIABLES if any(isinstance(node, ast.Name) and node.id == name
+                                                    for node in ast.walk(tree)))
+    numbers = ExactNumbers()
+    body = numbers.visit(tree).body
+    function = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[], vararg=None,
+                           kwonlyargs=[ast.arg(arg=name) for name in names],
+                           kw_defaults=[None] * len(names), kwarg=None, defaults=[]),
+        body=body))
+    ast.fix_missing_locations(function)
+    namespace = {'__builtins__': {}, **FUNCTIONS, **numbers.constants}
+    compiled = eval(compile(function, '<salary formula>', 'eval'), namespace)
+
+    # Catches formulas that parse but cannot produce an amount, e.g. city * 2
+    try:
+        to_paise(compiled(**{name: SAMPLE_VALUES[name] for name in names}))
+    except (TypeError, ValueError, ZeroDivisionError) as err:
+        raise FormulaError(f"The formula does not give an amount: {err}")
+    return compiled, names
+
+
+def to_paise(value):
+    if isinstance(value, bool) or not isinstance(value, (int, Fraction)):
+        raise FormulaError(f"expected a number, got {value!r}")
+    if value < 0:
+        raise FormulaError(f"negative amount {float(value):.2f}")
+    if isinstance(value, int):
+        return value * money.PAISE_PER_RUPEE
+    return money.divide_round(value.numerator * money.PAISE_PER_RUPEE, value.denominator)
+
+
+class SalaryPolicy:
+    __slots__ = ('version', 'formulas', 'compiled')
+
+    def __init__(self, version, formulas):
+        self.version = version
+        # component -> formula text
+        self.formulas = dict(formulas)
+        # component -> (function, names it takes)
+        self.compiled = {component: compile_formula(text) for component, text in formulas}
+
+    def evaluate(self, records, as_of):
+        # Replaces the components that have a formula on every record (dicts
+        # with the pay-run input columns, amounts in paise) in place. Only the
+        # variables some formula uses are worked out.
+        as_of = date.fromisoformat(as_of)
+        used = {name for _, names in self.compiled.values() for name in names}
+        calls = [(component, function, {name: None for name in names})
+                 for component, (function, names) in self.compiled.items()]
+        for record in records:
+            values = variables(record, used, as_of)
+            try:
+                for component, function, arguments in calls:
+                    for name in arguments:
+                        arguments[name] = values[name]
+                    record[component] = to_paise(function(**arguments))
+            except (TypeError, ValueError, ZeroDivisionError) as err:
+                raise FormulaError(f"Salary formula failed for employee {record['employee_id']}: {err}")
+        return records
+
+
+def variables(record, used, as_of):
+    # The formula variables for one pay-run input record; amounts in rupees
+    values = {}
+    for name, column in (('base', 'gross_salary'), ('hra', 'hra'), ('da', 'da'), ('bonus', 'bonus')):
+        if name in used:
+            values[name] = Fraction(int(record[column] or 0), money.PAISE_PER_RUPEE)
+    if 'city' in used:
+        values['city'] = (record['city'] or "").strip().lower()
+    if 'status' in used:
+        values['status'] = record['status']
+    if 'tenure_months' in used or 'tenure_years' in used:
+        values['tenure_months'] = tenure_months(record['hire_date'], as_of)
+        values['tenure_years'] = values['tenure_months'] // 12
+    return values
+
+
+def tenure_months(hire_date, as_of):
+    try:
+        hired = date.fromisoformat(hire_date)
+    except (TypeError, ValueError):
+        return 0
+    months = (as_of.year - hired.year) * 12 + as_of.month - hired.month - (as_of.day < hired.day)
+    return max(months, 0)
+
+
+@functools.lru_cache(maxsize=16)
+def compiled_policy(version, formulas):
+    # Policies never change once saved, so one compile per version and process
+    return SalaryPolicy(version, formulas)
+
+
+def load_policy(connection, version=None):
+    # The given or latest policy version, compiled; None when there is none
+    if version is None:
+        version = connection.execute("SELECT MAX(version) FROM salary_policies").fetchone()[0]
+        if version is None:
+            return None
+    formulas = tuple(connection.execute("""
+        SELECT component, formula FROM salary_formulas WHERE version = ? ORDER BY component
+    """, (version,)))
+    return compiled_policy(version, formulas)
+
+
+def save_policy(connection, formulas, now=None):
+    # Validates every formula and stores them as a new version; empty formulas
+    # are dropped. Returns the version. Does not commit.
+    formulas = {component: (text or "").strip() for component, text in formulas.items()}
+    for component, text in formulas.items():
+        if component not in COMPONENTS:
+            raise FormulaError(f"Unknown component '{component}'; use {', '.join(COMPONENTS)}")
+        if text:
+            try:
+                compile_formula(text)
+            except FormulaError as err:
+                raise FormulaError(f"{component.upper()}: {err}")
+
+    version = connection.execute("INSERT INTO salary_policies (created_at) VALUES (?)",
+                                 ((now or datetime.now()).isoformat(timespec='seconds'),)).lastrowid
+    connection.executemany("INSERT INTO salary_formulas (version, component, formula) VALUES (?, ?, ?)",
+                           [(version, component, text) for component, text in formulas.items() if text])
+    return version
+
+
+def main():
+    import schema
+
+    parser = argparse.ArgumentParser(description="Manage salary component formulas")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="show the current formulas")
+    change = commands.add_parser("set", help="save a new policy version with this formula")
+    change.add_argument("component", choices=COMPONENTS)
+    change.add_argument("formula", help="empty to use the amounts on the salary records")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db, timeout=10)
+    try:
+        schema.upgrade_database(connection)
+        policy = load_policy(connection)
+        if args.command == "set":
+            formulas = dict(policy.formulas) if policy else {}
+            formulas[args.component] = args.formula
+            with connection:
+                save_policy(connection, formulas)
+            policy = load_policy(connection)
+    except FormulaError as err:
+        parser.error(str(err))
+    finally:
+        connection.close()
+
+    print(f"Policy version {policy.version}" if policy else "No formulas; salary records are used as stored")
+    for component in COMPONENTS:
+        if policy:
+            print(f"  {component:<6} {policy.formulas.get(component) or '(stored amount)'}")
+
+
+if __name__ == "__main__":
+    main()
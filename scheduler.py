@@ -0,0 +1,381 @@
+import argparse
+import calendar
+import json
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import db_maintenance
+import pay_runs
+import payroll_engine
+import repositories
+import settings
+
+# Background jobs: the pay run on the configured payroll day, its reports and
+# nightly backups. Jobs are rows in the jobs table and only start inside the
+# off-peak window from settings. Every station may run a worker, but only the
+# one holding the runner lease (job_runner_lease) executes jobs, so batch work never
+# runs twice or alongside itself. While a job runs, a heartbeat thread keeps
+# renewing the lease, however long the job takes.
+#
+#   python scheduler.py              # worker loop, e.g. from a scheduled task
+#   python scheduler.py --once       # queue due jobs and run what is ready
+
+DEFAULT_DB_PATH = 'employee.db'
+DEFAULT_REPORT_DIR = 'reports'
+JOB_TYPES = ('payroll', 'report', 'backup')
+LEASE_NAME = 'worker'
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 60
+POLL_SECONDS = 60
+RETRY_BASE_SECONDS = 120
+
+
+def timestamp(moment):
+    return moment.isoformat(timespec='seconds')
+
+
+def open_worker_connection(db_path=DEFAULT_DB_PATH):
+    connection = repositories.open_connection(db_path)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def new_owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def in_offpeak(moment, start_hour, end_hour):
+    if start_hour == end_hour:
+        return True
+    if start_hour < end_hour:
+        return start_hour <= moment.hour < end_hour
+    # Window wraps midnight, e.g. 22 -> 6
+    return moment.hour >= start_hour or moment.hour < end_hour
+
+
+def next_offpeak_start(moment, start_hour, end_hour):
+    if in_offpeak(moment, start_hour, end_hour):
+        return moment
+    start = moment.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    return start if start > moment else start + timedelta(days=1)
+
+
+def payroll_date_for(period, payroll_day):
+    # Short months run on their last day
+    year, month = (int(part) for part in period.split("-"))
+    return datetime(year, month, min(payroll_day, calendar.monthrange(year, month)[1]))
+
+
+def enqueue(connection, job_type, payload=None, run_after=None, dedupe_key=None, max_attempts=3):
+    # Returns the new job id, or None when a job with this dedupe_key exists
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {job_type}")
+    now = datetime.now()
+    cursor = connection.execute("""
+        INSERT INTO jobs (job_type, payload, dedupe_key, run_after, max_attempts, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(dedupe_key) DO NOTHING
+    """, (job_type, json.dumps(payload or {}), dedupe_key, timestamp(run_after or now), max_attempts,
+          timestamp(now)))
+    connection.commit()
+    return cursor.lastrowid if cursor.rowcount else None
+
+
+def schedule_due_jobs(connection, now=None):
+    # Queues whatever the calendar says is due; safe to call on every poll
+    now = now or datetime.now()
+    config = settings.load_settings(connection)
+    start_hour, end_hour = int(config['offpeak_start_hour']), int(config['offpeak_end_hour'])
+    queued = []
+
+    period = now.strftime("%Y-%m")
+    payroll_due = payroll_date_for(period, int(config['payroll_day']))
+    if now >= payroll_due and pay_runs.run_status(connection, period) in (None, 'draft'):
+        run_after = next_offpeak_start(max(now, payroll_due), start_hour, end_hour)
+        # The draft run shows the month as scheduled; enqueue commits both
+        pay_runs.register_run(connection, period, now)
+        if enqueue(connection, 'payroll', {'period': period}, run_after, f"payroll:{period}"):
+            queued.append(f"payroll:{period}")
+
+    if config['nightly_backup'] == '1':
+        day = now.date().isoformat()
+        run_after = next_offpeak_start(now, start_hour, end_hour)
+        if enqueue(connection, 'backup', {}, run_after, f"backup:{day}"):
+            queued.append(f"backup:{day}")
+    return queued
+
+
+def acquire_lease(connection, owner, seconds=LEASE_SECONDS, now=None):
+    # Takes or renews the runner lease; an expired lease can be taken over
+    now = now or datetime.now()
+    connection.execute("""
+        INSERT INTO job_runner_lease (name, owner, expires_at) VALUES (:name, :owner, :expires)
+        ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE job_runner_lease.owner = excluded.owner OR job_runner_lease.expires_at < :now
+    """, {'name': LEASE_NAME, 'owner': owner, 'expires': timestamp(now + timedelta(seconds=seconds)),
+          'now': timestamp(now)})
+    connection.commit()
+    row = connection.execute("SELECT owner FROM job_runner_lease WHERE name = ?", (LEASE_NAME,)).fetchone()
+    return row is not None and row[0] == owner
+
+
+def release_lease(connection, owner):
+    connection.execute("DELETE FROM job_runner_lease WHERE name = ? AND owner = ?", (LEASE_NAME, owner))
+    connection.commit()
+
+
+class LeaseHeartbeat:
+    # Renews the runner lease from its own thread and connection while a job
+    # runs, so a job longer than LEASE_SECONDS keeps the lease
+    def __init__(self, db_path, owner, interval=HEARTBEAT_SECONDS, log=None):
+        self.db_path = db_path
+        self.owner = owner
+        self.interval = interval
+        self.log = log or (lambda message: None)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        connection = open_worker_connection(self.db_path)
+        try:
+            while not self.stopping.wait(self.interval):
+                try:
+                    if not acquire_lease(connection, self.owner):
+                        self.log("Runner lease lost while a job was running")
+                except sqlite3.Error as err:
+                    # The job may hold the write lock; renew at the next beat
+                    self.log(f"Lease renewal failed: {err}")
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopping.set()
+        self.thread.join()
+
+
+def requeue_abandoned(connection, now=None):
+    # Jobs left 'running' by a runner that no longer holds an unexpired lease
+    # go back on the queue; a job whose runner still renews its lease is left
+    # alone however long it runs
+    params = {'name': LEASE_NAME, 'now': timestamp(now or datetime.now())}
+    abandoned = """
+        status = 'running' AND runner IS NOT (SELECT owner FROM job_runner_lease
+                                              WHERE name = :name AND expires_at >= :now)
+    """
+    cursor = connection.execute(f"""
+        UPDATE jobs SET status = 'queued', runner = NULL
+        WHERE {abandoned} AND attempts < max_attempts
+    """, params)
+    connection.execute(f"""
+        UPDATE jobs SET status = 'failed', last_error = 'Runner stopped during the last attempt',
+                        finished_at = :now
+        WHERE {abandoned}
+    """, params)
+    connection.commit()
+    return cursor.rowcount
+
+
+def claim_next_job(connection, owner, now=None):
+    now = now or datetime.now()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        job = connection.execute("""
+            SELECT job_id, job_type, payload, attempts, max_attempts FROM jobs
+            WHERE status = 'queued' AND run_after <= ?
+            ORDER BY run_after, job_id
+            LIMIT 1
+        """, (timestamp(now),)).fetchone()
+        if job:
+            connection.execute("""
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, runner = ?
+                WHERE job_id = ?
+            """, (timestamp(now), owner, job['job_id']))
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    return job
+
+
+def finish_job(connection, job_id, result):
+    connection.execute("UPDATE jobs SET status = 'done', result = ?, last_error = NULL, finished_at = ? "
+                       "WHERE job_id = ?", (result, timestamp(datetime.now()), job_id))
+    connection.commit()
+
+
+def fail_job(connection, job, error):
+    # Retries with exponential backoff until max_attempts is used up
+    now = datetime.now()
+    attempts = job['attempts'] + 1
+    if attempts < job['max_attempts']:
+        retry_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        connection.execute("UPDATE jobs SET status = 'queued', run_after = ?, last_error = ? WHERE job_id = ?",
+                           (timestamp(retry_at), error, job['job_id']))
+    else:
+        connection.execute("UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE job_id = ?",
+                           (error, timestamp(now), job['job_id']))
+    connection.commit()
+
+
+def run_payroll_job(connection, db_path, payload):
+    period = payload['period']
+    try:
+        count = payroll_engine.run_payroll(connection, period, pay_runs.station_id())
+    except pay_runs.PayRunConflict as err:
+        if err.status != 'committed':
+            # Another station is running it; retried like any failed job
+            raise
+        return f"Payroll for {period} was already generated"
+
+    # The month's reports follow the pay run in the same off-peak window
+    enqueue(connection, 'report', {'period': period}, dedupe_key=f"report:{period}")
+    return f"{count} employees paid for {period}"
+
+
+def run_report_job(connection, db_path, payload):
+    import payslip_generation
+    import reconciliation
+
+    period = payload['period']
+    report_dir = payload.get('report_dir', DEFAULT_REPORT_DIR)
+    os.makedirs(report_dir, exist_ok=True)
+    company = settings.get_setting(connection, 'company_name') or payslip_generation.DEFAULT_COMPANY
+
+    payslips = payslip_generation.generate_payslips(
+        period, os.path.join(report_dir, f"payslips_{period}.zip"), db_path=db_path, company=company)
+    previous = reconciliation.previous_period(period)
+    rows = reconciliation.reconcile(connection, previous, period)
+    reconciliation.export_csv(rows, os.path.join(report_dir, f"reconciliation_{previous}_{period}.csv"))
+    return f"{payslips} payslips and a {len(rows)}-row reconciliation written to {report_dir}"
+
+
+def run_backup_job(connection, db_path, payload):
+    return f"Backup saved to {db_maintenance.backup_database(db_path)}"
+
+
+JOB_HANDLERS = {
+    'payroll': run_payroll_job,
+    'report': run_report_job,
+    'backup': run_backup_job,
+}
+
+
+class JobWorker:
+    def __init__(self, db_path=DEFAULT_DB_PATH, owner=None, log=None):
+        self.db_path = db_path
+        self.owner = owner or new_owner_id()
+        self.log = log or (lambda message: None)
+        self.connection = None
+        self.stopping = threading.Event()
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = open_worker_connection(self.db_path)
+        return self.connection
+
+    def run_once(self, now=None):
+        # One poll: queue due jobs, then run ready jobs while off-peak and
+        # holding the lease. Returns the number of jobs run.
+        connection = self.connect()
+        now = now or datetime.now()
+        schedule_due_jobs(connection, now)
+
+        config = settings.load_settings(connection)
+        if not in_offpeak(now, int(config['offpeak_start_hour']), int(config['offpeak_end_hour'])):
+            return 0
+
+        had_lease = connection.execute("SELECT 1 FROM job_runner_lease WHERE name = ? AND owner = ?",
+                                       (LEASE_NAME, self.owner)).fetchone()
+        if not acquire_lease(connection, self.owner):
+            return 0
+        if not had_lease:
+            requeue_abandoned(connection)
+
+        ran = 0
+        while True:
+            job = claim_next_job(connection, self.owner, now)
+            if job is None:
+                break
+            ran += 1
+            try:
+                with LeaseHeartbeat(self.db_path, self.owner, log=self.log):
+                    result = JOB_HANDLERS[job['job_type']](connection, self.db_path,
+                                                           json.loads(job['payload']))
+                finish_job(connection, job['job_id'], result)
+                self.log(f"Job {job['job_id']} ({job['job_type']}): {result}")
+            except Exception as err:
+                if connection.in_transaction:
+                    connection.rollback()
+                fail_job(connection, job, f"{type(err).__name__}: {err}")
+                self.log(f"Job {job['job_id']} ({job['job_type']}) failed: {err}")
+            if not acquire_lease(connection, self.owner):
+                break
+        return ran
+
+    def run_forever(self, poll_seconds=POLL_SECONDS):
+        # Polls until stop(); the connection lives in this thread only
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self.run_once()
+                except sqlite3.Error as err:
+                    # Busy database; try again at the next poll
+                    self.log(f"Scheduler poll failed: {err}")
+                self.stopping.wait(poll_seconds)
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stopping.set()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                release_lease(self.connection, self.owner)
+            except sqlite3.Error:
+                pass
+            self.connection.close()
+            self.connection = None
+
+
+def recent_jobs(connection, limit=20):
+    return connection.execute("""
+        SELECT job_id, job_type, status, run_after, attempts, IFNULL(result, last_error)
+        FROM jobs ORDER BY job_id DESC LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scheduled payroll, report and backup jobs")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    parser.add_argument("--poll", type=int, default=POLL_SECONDS, help="seconds between polls")
+    args = parser.parse_args()
+
+    worker = JobWorker(args.db, log=print)
+    if args.once:
+        try:
+            print(f"{worker.run_once()} jobs run")
+        finally:
+            worker.close()
+    else:
+        try:
+            worker.run_forever(args.poll)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    # Report jobs render payslips in worker processes
+    multiprocessing.freeze_support()
+    main()
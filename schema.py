@@ -0,0 +1,540 @@
+import sqlite3
+
+# Database schema and its upgrades. PRAGMA user_version records the last
+# migration applied, so every station upgrades an older employee.db in place the
+# first time it connects.
+
+
+def create_base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT,
+            address TEXT,
+            city TEXT,
+            state TEXT,
+            postal_code TEXT,
+            country TEXT,
+            hire_date TEXT NOT NULL,
+            status TEXT DEFAULT 'active' CHECK(status IN ('active', 'on_leave', 'terminated'))
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payroll (
+            payroll_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            employee_name TEXT NOT NULL,
+            leaves INTEGER DEFAULT 0,
+            deducted_salary REAL DEFAULT 0,
+            bonus REAL DEFAULT 0,
+            income_tax REAL DEFAULT 0,
+            final_pay REAL NOT NULL,
+            payment_date TEXT NOT NULL,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leave_register (
+            leave_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            employee_name TEXT NOT NULL,
+            date_from TEXT NOT NULL,
+            date_to TEXT NOT NULL,
+            reason TEXT,
+            leaves INTEGER NOT NULL,
+            current_leaves INTEGER NOT NULL,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS employee_salary (
+            salary_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            base_salary REAL NOT NULL,
+            hra REAL NOT NULL,
+            da REAL NOT NULL,
+            bonus REAL DEFAULT 0,
+            effective_date TEXT NOT NULL,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
+        )
+    """)
+
+
+def migrate_money_to_paise(cursor):
+    # REAL rupees -> INTEGER paise. SQLite cannot change a column type in place,
+    # so both money tables are rebuilt and their rows converted on the way across.
+    cursor.execute("""
+        CREATE TABLE payroll_new (
+            payroll_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            employee_name TEXT NOT NULL,
+            leaves INTEGER DEFAULT 0,
+            deducted_salary INTEGER DEFAULT 0,
+            bonus INTEGER DEFAULT 0,
+            income_tax INTEGER DEFAULT 0,
+            final_pay INTEGER NOT NULL,
+            payment_date TEXT NOT NULL,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO payroll_new (payroll_id, employee_id, employee_name, leaves, deducted_salary,
+                                 bonus, income_tax, final_pay, payment_date)
+        SELECT payroll_id, employee_id, employee_name, leaves,
+               CAST(ROUND(IFNULL(deducted_salary, 0) * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(bonus, 0) * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(income_tax, 0) * 100) AS INTEGER),
+               CAST(ROUND(final_pay * 100) AS INTEGER),
+               payment_date
+        FROM payroll
+    """)
+    cursor.execute("DROP TABLE payroll")
+    cursor.execute("ALTER TABLE payroll_new RENAME TO payroll")
+
+    cursor.execute("""
+        CREATE TABLE employee_salary_new (
+            salary_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            base_salary INTEGER NOT NULL,
+            hra INTEGER NOT NULL,
+            da INTEGER NOT NULL,
+            bonus INTEGER DEFAULT 0,
+            effective_date TEXT NOT NULL,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO employee_salary_new (salary_id, employee_id, base_salary, hra, da, bonus, effective_date)
+        SELECT salary_id, employee_id,
+               CAST(ROUND(base_salary * 100) AS INTEGER),
+               CAST(ROUND(hra * 100) AS INTEGER),
+               CAST(ROUND(da * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(bonus, 0) * 100) AS INTEGER),
+               effective_date
+        FROM employee_salary
+    """)
+    cursor.execute("DROP TABLE employee_salary")
+    cursor.execute("ALTER TABLE employee_salary_new RENAME TO employee_salary")
+
+
+def create_leave_ledger(cursor):
+    cursor.execute("""
+        CREATE TABLE leave_ledger (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            entry_date TEXT NOT NULL,
+            entry_type TEXT NOT NULL CHECK(entry_type IN ('accrual', 'consumption', 'adjustment', 'lapse')),
+            days REAL NOT NULL,
+            unpaid_days REAL NOT NULL DEFAULT 0,
+            balance_after REAL NOT NULL,
+            leave_id INTEGER,
+            period TEXT,
+            note TEXT,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
+            FOREIGN KEY (leave_id) REFERENCES leave_register(leave_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_leave_ledger_employee ON leave_ledger(employee_id, entry_id)")
+    # One accrual per employee per period makes monthly accrual safe to re-run
+    cursor.execute("CREATE UNIQUE INDEX idx_leave_ledger_accrual ON leave_ledger(employee_id, period) "
+                   "WHERE entry_type = 'accrual'")
+
+    cursor.execute("""
+        CREATE TABLE leave_balances (
+            employee_id INTEGER PRIMARY KEY,
+            balance REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE leave_year_balances (
+            employee_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            opening_balance REAL NOT NULL,
+            closing_balance REAL NOT NULL,
+            carried_forward REAL NOT NULL,
+            PRIMARY KEY (employee_id, year)
+        ) WITHOUT ROWID
+    """)
+
+    # Leave without pay per application, read directly by the pay run. Leaves taken
+    # before the ledger existed had no balance behind them, so they stay fully unpaid.
+    cursor.execute("ALTER TABLE leave_register ADD COLUMN unpaid_days REAL NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE leave_register SET unpaid_days = leaves")
+    cursor.execute("CREATE INDEX idx_leave_register_employee ON leave_register(employee_id, date_from)")
+
+
+def index_payroll_periods(cursor):
+    # Pay runs are read by period (payroll list, payslips, reconciliation); with
+    # employee_id in the index a period's rows come out in employee order
+    cursor.execute("CREATE INDEX idx_payroll_period_employee ON payroll(payment_date, employee_id)")
+
+
+def create_payroll_rollups(cursor):
+    cursor.execute("""
+        CREATE TABLE payroll_rollups (
+            period TEXT NOT NULL,
+            status TEXT NOT NULL,
+            headcount INTEGER NOT NULL,
+            gross INTEGER NOT NULL,
+            income_tax INTEGER NOT NULL,
+            deductions INTEGER NOT NULL,
+            net INTEGER NOT NULL,
+            PRIMARY KEY (period, status)
+        ) WITHOUT ROWID
+    """)
+    # Backfill from the existing pay runs; past rows are filed under each
+    # employee's current status, the only status history there is
+    cursor.execute("""
+        INSERT INTO payroll_rollups (period, status, headcount, gross, income_tax, deductions, net)
+        SELECT substr(p.payment_date, 1, 7), IFNULL(e.status, 'unknown'), COUNT(*),
+               SUM(p.final_pay + p.income_tax + p.deducted_salary),
+               SUM(p.income_tax), SUM(p.deducted_salary), SUM(p.final_pay)
+        FROM payroll p
+        LEFT JOIN employees e ON e.employee_id = p.employee_id
+        GROUP BY 1, 2
+    """)
+
+
+def index_list_sort_columns(cursor):
+    # Backs the sortable list screens: each index matches a sort key followed by
+    # the rowid tie-breaker, so ORDER BY ... LIMIT reads one page off the index
+    cursor.execute("CREATE INDEX idx_payroll_final_pay ON payroll(final_pay)")
+    cursor.execute("CREATE INDEX idx_payroll_income_tax ON payroll(income_tax)")
+    cursor.execute("CREATE INDEX idx_payroll_leaves ON payroll(leaves)")
+    cursor.execute("CREATE INDEX idx_payroll_name_date ON payroll(employee_name, payment_date)")
+    cursor.execute("CREATE INDEX idx_salary_base ON employee_salary(base_salary)")
+    cursor.execute("CREATE INDEX idx_salary_effective_date ON employee_salary(effective_date)")
+    cursor.execute("CREATE INDEX idx_leave_register_date_from ON leave_register(date_from)")
+
+
+def create_settings_and_jobs(cursor):
+    cursor.execute("""
+        CREATE TABLE settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+    # Background work queue; dedupe_key keeps a job from being queued twice
+    # (e.g. one payroll job per period)
+    cursor.execute("""
+        CREATE TABLE jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT NOT NULL CHECK(job_type IN ('payroll', 'report', 'backup')),
+            payload TEXT NOT NULL DEFAULT '{}',
+            dedupe_key TEXT UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'done', 'failed')),
+            run_after TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            last_error TEXT,
+            result TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_jobs_status_run_after ON jobs(status, run_after)")
+
+    # Lease held by whichever station is currently running jobs
+    cursor.execute("""
+        CREATE TABLE job_runner_lease (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+def create_archive_partitions(cursor):
+    # Closed fiscal years moved out to archive databases (see archive.py)
+    cursor.execute("""
+        CREATE TABLE archive_partitions (
+            fiscal_year INTEGER PRIMARY KEY,
+            db_path TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            payroll_rows INTEGER NOT NULL,
+            leave_rows INTEGER NOT NULL,
+            archived_at TEXT NOT NULL
+        )
+    """)
+
+
+def index_current_salaries(cursor):
+    # Each employee's current salary is the row with their latest effective_date
+    # (pay runs, forecasts); without this index that lookup scans the table
+    cursor.execute("CREATE INDEX idx_salary_employee_effective ON employee_salary(employee_id, effective_date)")
+
+
+def create_pay_runs(cursor):
+    # One row per pay period (see pay_runs.py); payroll rows link to their run
+    cursor.execute("""
+        CREATE TABLE pay_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            period TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'draft'
+                CHECK(status IN ('draft', 'computing', 'committed', 'reverted')),
+            claimed_by TEXT,
+            claimed_at TEXT,
+            payment_date TEXT,
+            employees INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            committed_at TEXT,
+            reverted_at TEXT,
+            last_error TEXT
+        )
+    """)
+    cursor.execute("ALTER TABLE payroll ADD COLUMN run_id INTEGER REFERENCES pay_runs(run_id)")
+    cursor.execute("CREATE INDEX idx_payroll_run ON payroll(run_id)")
+
+    # Every month already paid becomes a committed run. Months moved to archive
+    # databases are known from their rollups, which stay in the hot database.
+    cursor.execute("""
+        INSERT INTO pay_runs (period, status, payment_date, employees, created_at, committed_at)
+        SELECT substr(payment_date, 1, 7), 'committed', MAX(payment_date), COUNT(*),
+               MIN(payment_date), MIN(payment_date)
+        FROM payroll
+        GROUP BY 1
+    """)
+    cursor.execute("""
+        INSERT INTO pay_runs (period, status, employees, created_at, committed_at)
+        SELECT period, 'committed', SUM(headcount), period || '-01', period || '-01'
+        FROM payroll_rollups
+        WHERE period NOT IN (SELECT period FROM pay_runs)
+        GROUP BY period
+    """)
+    cursor.execute("""
+        UPDATE payroll SET run_id = (SELECT run_id FROM pay_runs r
+                                     WHERE r.period = substr(payroll.payment_date, 1, 7))
+    """)
+
+
+def create_org_units(cursor):
+    # Departments and cost centers as a tree; org_unit_closure holds every
+    # (ancestor, descendant) pair including each unit with itself at depth 0,
+    # so a whole subtree is one range of the primary key (see org_units.py)
+    cursor.execute("""
+        CREATE TABLE org_units (
+            unit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            name TEXT NOT NULL,
+            unit_type TEXT NOT NULL CHECK(unit_type IN ('department', 'cost_center')),
+            parent_id INTEGER REFERENCES org_units(unit_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE org_unit_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX idx_org_unit_closure_descendant ON org_unit_closure(descendant_id, ancestor_id)")
+
+    cursor.execute("ALTER TABLE employees ADD COLUMN org_unit_id INTEGER REFERENCES org_units(unit_id)")
+    cursor.execute("CREATE INDEX idx_employees_org_unit ON employees(org_unit_id)")
+    # Payroll rows keep the unit the employee was in when paid
+    cursor.execute("ALTER TABLE payroll ADD COLUMN org_unit_id INTEGER REFERENCES org_units(unit_id)")
+    cursor.execute("CREATE INDEX idx_payroll_org_unit_date ON payroll(org_unit_id, payment_date)")
+
+    # Rollups gain the org unit as a key column (0 = unassigned); existing
+    # totals, including those of archived years, carry over as unassigned
+    cursor.execute("""
+        CREATE TABLE payroll_rollups_new (
+            period TEXT NOT NULL,
+            status TEXT NOT NULL,
+            org_unit_id INTEGER NOT NULL DEFAULT 0,
+            headcount INTEGER NOT NULL,
+            gross INTEGER NOT NULL,
+            income_tax INTEGER NOT NULL,
+            deductions INTEGER NOT NULL,
+            net INTEGER NOT NULL,
+            PRIMARY KEY (period, status, org_unit_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT INTO payroll_rollups_new (period, status, headcount, gross, income_tax, deductions, net)
+        SELECT period, status, headcount, gross, income_tax, deductions, net FROM payroll_rollups
+    """)
+    cursor.execute("DROP TABLE payroll_rollups")
+    cursor.execute("ALTER TABLE payroll_rollups_new RENAME TO payroll_rollups")
+    cursor.execute("CREATE INDEX idx_payroll_rollups_org_unit ON payroll_rollups(org_unit_id, period)")
+
+
+def create_attendance(cursor):
+    # Daily first/last punch per employee from the biometric logs and the
+    # monthly loss-of-pay/overtime summary the pay run reads (see attendance.py);
+    # punch times are seconds since midnight
+    cursor.execute("""
+        CREATE TABLE attendance_daily (
+            employee_id INTEGER NOT NULL REFERENCES employees(employee_id),
+            work_date TEXT NOT NULL,
+            first_punch INTEGER NOT NULL,
+            last_punch INTEGER NOT NULL,
+            punches INTEGER NOT NULL,
+            PRIMARY KEY (employee_id, work_date)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX idx_attendance_daily_date ON attendance_daily(work_date)")
+    cursor.execute("""
+        CREATE TABLE attendance_monthly (
+            employee_id INTEGER NOT NULL REFERENCES employees(employee_id),
+            period TEXT NOT NULL,
+            days_present INTEGER NOT NULL,
+            lop_days REAL NOT NULL,
+            overtime_minutes INTEGER NOT NULL,
+            PRIMARY KEY (period, employee_id)
+        ) WITHOUT ROWID
+    """)
+    # One row per imported punch file, so the same file is never counted twice
+    cursor.execute("""
+        CREATE TABLE attendance_files (
+            checksum TEXT PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            punches INTEGER NOT NULL,
+            rejected INTEGER NOT NULL,
+            imported_at TEXT NOT NULL
+        )
+    """)
+
+
+def create_bank_accounts(cursor):
+    # Salary account per employee, for the bank transfer files (see disbursement.py)
+    cursor.execute("""
+        CREATE TABLE employee_bank_accounts (
+            employee_id INTEGER PRIMARY KEY REFERENCES employees(employee_id),
+            account_holder TEXT NOT NULL DEFAULT '',
+            account_number TEXT NOT NULL,
+            ifsc TEXT NOT NULL
+        )
+    """)
+
+
+def create_salary_arrears(cursor):
+    # Differences owed for months paid before a backdated salary change, per
+    # employee and month; settled_run_id is the run that paid them (see arrears.py)
+    cursor.execute("""
+        CREATE TABLE salary_arrears (
+            arrear_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL REFERENCES employees(employee_id),
+            period TEXT NOT NULL,
+            gross INTEGER NOT NULL,
+            income_tax INTEGER NOT NULL,
+            deductions INTEGER NOT NULL,
+            net INTEGER NOT NULL,
+            computed_at TEXT NOT NULL,
+            settled_run_id INTEGER REFERENCES pay_runs(run_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_salary_arrears_settled ON salary_arrears(settled_run_id, employee_id)")
+    cursor.execute("CREATE INDEX idx_salary_arrears_period ON salary_arrears(period, employee_id)")
+    # Net arrears included in a payroll row's pay
+    cursor.execute("ALTER TABLE payroll ADD COLUMN arrears INTEGER NOT NULL DEFAULT 0")
+
+
+def create_salary_policies(cursor):
+    # Versioned salary component formulas (see salary_policy.py); a version is
+    # never changed once saved, and each pay run records the one it used
+    cursor.execute("""
+        CREATE TABLE salary_policies (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE salary_formulas (
+            version INTEGER NOT NULL REFERENCES salary_policies(version),
+            component TEXT NOT NULL CHECK(component IN ('hra', 'da', 'bonus')),
+            formula TEXT NOT NULL,
+            PRIMARY KEY (version, component)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("ALTER TABLE pay_runs ADD COLUMN policy_version INTEGER REFERENCES salary_policies(version)")
+
+
+def record_job_runners(cursor):
+    # The runner (lease owner) executing a job, so only jobs whose runner lost
+    # the lease are put back on the queue
+    cursor.execute("ALTER TABLE jobs ADD COLUMN runner TEXT")
+
+
+def index_remaining_sort_columns(cursor):
+    # The rest of the list screens' sort keys (see index_list_sort_columns)
+    cursor.execute("CREATE INDEX idx_payroll_deducted_salary ON payroll(deducted_salary)")
+    cursor.execute("CREATE INDEX idx_payroll_bonus ON payroll(bonus)")
+    cursor.execute("CREATE INDEX idx_salary_hra ON employee_salary(hra)")
+    cursor.execute("CREATE INDEX idx_salary_da ON employee_salary(da)")
+    cursor.execute("CREATE INDEX idx_salary_bonus ON employee_salary(bonus)")
+    cursor.execute("CREATE INDEX idx_leave_register_date_to ON leave_register(date_to)")
+    cursor.execute("CREATE INDEX idx_leave_register_leaves ON leave_register(leaves)")
+
+
+def record_payroll_status(cursor):
+    # Payroll rows keep the employee's status when paid, as they do the org
+    # unit, so rollups rebuilt later file each row where it was paid. Rows
+    # already paid get the current status, the only history there is.
+    cursor.execute("ALTER TABLE payroll ADD COLUMN employee_status TEXT")
+    cursor.execute("""
+        UPDATE payroll SET employee_status = (SELECT status FROM employees e
+                                              WHERE e.employee_id = payroll.employee_id)
+    """)
+
+
+# Applied in order; the position in this list (1-based) is the schema version
+MIGRATIONS = [
+    migrate_money_to_paise,
+    create_leave_ledger,
+    index_payroll_periods,
+    create_payroll_rollups,
+    index_list_sort_columns,
+    create_settings_and_jobs,
+    create_archive_partitions,
+    index_current_salaries,
+    create_pay_runs,
+    create_org_units,
+    create_attendance,
+    create_bank_accounts,
+    create_salary_arrears,
+    create_salary_policies,
+    record_job_runners,
+    index_remaining_sort_columns,
+    record_payroll_status,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade_database(connection):
+    if get_schema_version(connection) >= SCHEMA_VERSION:
+        return False
+
+    # IMMEDIATE takes the write lock up front, so two stations starting at the
+    # same time cannot both run a migration; the loser re-reads the version
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = connection.cursor()
+        create_base_tables(cursor)
+        version = get_schema_version(connection)
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if version < number:
+                migration(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    return True
@@ -0,0 +1,53 @@
+# Application settings stored in the settings table as text key/value pairs.
+# DEFAULTS lists every known key; anything not saved yet reads as its default.
+
+DEFAULTS = {
+    'company_name': '',
+    'payroll_day': '28',
+    # Background jobs only start between these hours (24h clock, wraps midnight)
+    'offpeak_start_hour': '22',
+    'offpeak_end_hour': '6',
+    'nightly_backup': '1',
+    # Event-loop lag and screen timings to ui_metrics.jsonl (see ui_telemetry.py)
+    'ui_telemetry': '1',
+}
+
+
+def load_settings(connection):
+    values = dict(DEFAULTS)
+    values.update(connection.execute("SELECT key, value FROM settings"))
+    return values
+
+
+def get_setting(connection, key):
+    row = connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else DEFAULTS.get(key)
+
+
+def whole_number(values, key, low, high, message):
+    try:
+        number = int(values.get(key, DEFAULTS[key]))
+    except ValueError:
+        raise ValueError(message)
+    if not low <= number <= high:
+        raise ValueError(message)
+    return number
+
+
+def validate_settings(values):
+    # Raises ValueError with a message fit for the settings screen
+    whole_number(values, 'payroll_day', 1, 31, "Payroll day must be a number between 1 and 31")
+    for key in ('offpeak_start_hour', 'offpeak_end_hour'):
+        whole_number(values, key, 0, 23, "Off-peak hours must be numbers between 0 and 23")
+
+
+def save_settings(connection, values):
+    unknown = set(values) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    validate_settings(values)
+    with connection:
+        connection.executemany("""
+            INSERT INTO settings (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, [(key, str(value).strip()) for key, value in values.items()])
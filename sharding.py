@@ -0,0 +1,276 @@
+import argparse
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import archive
+import pay_runs
+import payroll_engine
+import schema
+
+# One database per group company. The registry (companies.db) maps a short
+# company code to its shard file; each shard is a complete employee.db with its
+# own write lock, so month-end runs for different companies no longer queue
+# behind each other. Group reports ATTACH the shards read-only.
+#
+#   python sharding.py add ACME "Acme Industries Ltd"
+#   python sharding.py run 2025-03
+#   python sharding.py report 2025-03
+
+REGISTRY_DB_PATH = 'companies.db'
+SHARD_DIR = 'shards'
+# SQLite refuses more than 10 attached databases (SQLITE_MAX_ATTACHED) by default
+MAX_ATTACHED = 9
+
+COMPANY_CODE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,16}$")
+
+
+class Shard:
+    __slots__ = ('company_code', 'company_name', 'db_path', 'created_at')
+
+    def __init__(self, company_code, company_name, db_path, created_at=None):
+        self.company_code = company_code
+        self.company_name = company_name
+        self.db_path = db_path
+        self.created_at = created_at
+
+    def __repr__(self):
+        return f"Shard({self.company_code!r}, {self.company_name!r}, {self.db_path!r})"
+
+
+def open_registry(registry_path=REGISTRY_DB_PATH):
+    connection = sqlite3.connect(registry_path, timeout=10)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS company_shards (
+            company_code TEXT PRIMARY KEY,
+            company_name TEXT NOT NULL UNIQUE,
+            db_path TEXT NOT NULL UNIQUE,
+            created_at TEXT NOT NULL
+        )
+    """)
+    return connection
+
+
+def shard_path(company_code, shard_dir=SHARD_DIR):
+    return os.path.join(shard_dir, f"{company_code.lower()}.db")
+
+
+def open_shard(db_path):
+    # Shard connections are configured like the main database and upgraded on open
+    connection = sqlite3.connect(db_path, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    schema.upgrade_database(connection)
+    return connection
+
+
+def create_shard_database(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    try:
+        # Must be set before the first table is created to take effect
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("PRAGMA journal_mode=WAL")
+        schema.upgrade_database(connection)
+    finally:
+        connection.close()
+
+
+def register_company(company_code, company_name, db_path=None, registry_path=REGISTRY_DB_PATH):
+    if not COMPANY_CODE_PATTERN.match(company_code):
+        raise ValueError(f"Company code must be 1-16 letters, digits, '-' or '_': {company_code!r}")
+
+    company_code = company_code.upper()
+    db_path = db_path or shard_path(company_code)
+    create_shard_database(db_path)
+
+    registry = open_registry(registry_path)
+    try:
+        with registry:
+            registry.execute("""
+                INSERT INTO company_shards (company_code, company_name, db_path, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (company_code, company_name, db_path, datetime.now().isoformat(timespec='seconds')))
+    finally:
+        registry.close()
+    return Shard(company_code, company_name, db_path)
+
+
+def list_shards(registry_path=REGISTRY_DB_PATH):
+    if not os.path.exists(registry_path):
+        return []
+    registry = open_registry(registry_path)
+    try:
+        return [Shard(*row) for row in registry.execute(
+            "SELECT company_code, company_name, db_path, created_at FROM company_shards ORDER BY company_code")]
+    finally:
+        registry.close()
+
+
+def get_shard(company_code, registry_path=REGISTRY_DB_PATH):
+    if not os.path.exists(registry_path):
+        return None
+    registry = open_registry(registry_path)
+    try:
+        row = registry.execute("""
+            SELECT company_code, company_name, db_path, created_at FROM company_shards
+            WHERE company_code = ?
+        """, (company_code.upper(),)).fetchone()
+    finally:
+        registry.close()
+    return Shard(*row) if row else None
+
+
+def run_shard_payroll(db_path, period):
+    # Runs in a worker process; returns the number of payroll rows written,
+    # None when the period has already been run for this company, or a message
+    # when another station is running it (see pay_runs.py)
+    connection = open_shard(db_path)
+    try:
+        return payroll_engine.run_payroll(connection, period, pay_runs.station_id())
+    except pay_runs.PayRunConflict as err:
+        return None if err.status == 'committed' else str(err)
+    finally:
+        connection.close()
+
+
+def run_group_payroll(period, company_codes=None, workers=None, registry_path=REGISTRY_DB_PATH,
+                      progress=None):
+    # Returns {company_code: rows written | None (already run) | error message}
+    payroll_engine.month_bounds(period)
+    shards = [shard for shard in list_shards(registry_path)
+              if company_codes is None or shard.company_code in company_codes]
+    results = {}
+    if not shards:
+        return results
+
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {shard.company_code: executor.submit(run_shard_payroll, shard.db_path, period)
+                   for shard in shards}
+        for company_code, future in futures.items():
+            try:
+                results[company_code] = future.result()
+            except (sqlite3.Error, OSError) as err:
+                results[company_code] = str(err)
+            if progress:
+                progress(company_code, results[company_code])
+    return results
+
+
+GROUP_SUMMARY_COLUMNS = ('company_code', 'company_name', 'headcount', 'gross', 'income_tax',
+                         'deducted_salary', 'final_pay')
+
+
+# Totals of one shard's payroll rows for the period, read from source
+SHARD_TOTALS = """
+    SELECT COUNT(*), IFNULL(SUM(final_pay + income_tax + deducted_salary), 0),
+           IFNULL(SUM(income_tax), 0), IFNULL(SUM(deducted_salary), 0), IFNULL(SUM(final_pay), 0)
+    FROM {source}
+    WHERE payment_date >= :month_start AND payment_date < :month_end
+"""
+
+
+def archived_shard_totals(shard, params):
+    # A shard whose period lies in an archived fiscal year is read on its own
+    # connection, so its archives can be attached alongside it
+    connection = sqlite3.connect(shard.db_path, timeout=10)
+    try:
+        source = archive.table_source(connection, 'payroll', params['month_start'], params['month_end'])
+        return connection.execute(SHARD_TOTALS.format(source=source), params).fetchone()
+    finally:
+        connection.close()
+
+
+def consolidated_payroll_summary(period, registry_path=REGISTRY_DB_PATH):
+    # One row per company for the period, read across the shards with ATTACH.
+    # Shards are attached in batches to stay under the attached-database limit.
+    month_start, _ = payroll_engine.month_bounds(period)
+    params = {'month_start': month_start, 'month_end': payroll_engine.next_month_start(period)}
+    shards = [shard for shard in list_shards(registry_path) if os.path.exists(shard.db_path)]
+
+    connection = sqlite3.connect(":memory:", uri=True)
+    totals = {}
+    try:
+        for start in range(0, len(shards), MAX_ATTACHED):
+            batch = shards[start:start + MAX_ATTACHED]
+            selects = []
+            for number, shard in enumerate(batch):
+                alias = f"shard{number}"
+                uri = "file:" + os.path.abspath(shard.db_path).replace("\\", "/") + "?mode=ro"
+                connection.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+                if connection.execute(f"""
+                    SELECT 1 FROM {alias}.archive_partitions
+                    WHERE end_date > :month_start AND start_date < :month_end
+                """, params).fetchone():
+                    totals[shard.company_code] = archived_shard_totals(shard, params)
+                    continue
+                params[f"code{number}"] = shard.company_code
+                totals_sql = SHARD_TOTALS.format(source=f"{alias}.payroll")
+                selects.append(f"SELECT :code{number}, t.* FROM ({totals_sql}) t")
+            try:
+                if selects:
+                    for row in connection.execute(" UNION ALL ".join(selects), params):
+                        totals[row[0]] = row[1:]
+            finally:
+                for number in range(len(batch)):
+                    connection.execute(f"DETACH DATABASE shard{number}")
+    finally:
+        connection.close()
+    return [(shard.company_code, shard.company_name) + tuple(totals[shard.company_code]) for shard in shards]
+
+
+def group_totals(summary):
+    return ('GROUP', 'All companies') + tuple(sum(row[index] for row in summary) for index in range(2, 7))
+
+
+def main():
+    import money
+
+    parser = argparse.ArgumentParser(description="Manage per-company payroll databases")
+    parser.add_argument("--registry", default=REGISTRY_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="register a company and create its database")
+    add.add_argument("code")
+    add.add_argument("name")
+    add.add_argument("--db", help="shard database path (default: shards/<code>.db)")
+
+    commands.add_parser("list", help="list registered companies")
+
+    run = commands.add_parser("run", help="run payroll for every company in parallel")
+    run.add_argument("period", help="pay period, YYYY-MM")
+    run.add_argument("--company", action="append", help="limit to these company codes")
+    run.add_argument("--workers", type=int, default=None)
+
+    report = commands.add_parser("report", help="consolidated payroll summary for a period")
+    report.add_argument("period", help="pay period, YYYY-MM")
+
+    args = parser.parse_args()
+
+    if args.command == "add":
+        shard = register_company(args.code, args.name, args.db, args.registry)
+        print(f"Registered {shard.company_code} -> {shard.db_path}")
+    elif args.command == "list":
+        for shard in list_shards(args.registry):
+            print(f"{shard.company_code:<16} {shard.company_name:<40} {shard.db_path}")
+    elif args.command == "run":
+        codes = [code.upper() for code in args.company] if args.company else None
+        for company_code, result in run_group_payroll(args.period, codes, args.workers, args.registry).items():
+            if result is None:
+                print(f"{company_code}: already run for {args.period}")
+            elif isinstance(result, int):
+                print(f"{company_code}: {result} employees paid")
+            else:
+                print(f"{company_code}: FAILED {result}")
+    else:
+        summary = consolidated_payroll_summary(args.period, args.registry)
+        for row in summary + [group_totals(summary)]:
+            print(f"{row[0]:<16} {row[2]:>6} " + " ".join(f"{money.format_amount(value):>16}" for value in row[3:]))
+
+
+if __name__ == "__main__":
+    main()
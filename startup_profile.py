@@ -0,0 +1,47 @@
+import sys
+import time
+from datetime import datetime
+
+# Phase timings for `payroll_system.py --startup-profile`. The windowed build has
+# no console, so the report is also appended to a log file next to the database.
+
+PROFILE_LOG = "startup_profile.log"
+
+
+class StartupProfile:
+    def __init__(self, enabled=False, started=None):
+        self.enabled = enabled
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, phase):
+        # Records the time spent since the previous mark under this phase name
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def lines(self):
+        total = self.last - self.started
+        lines = [f"Startup profile {datetime.now().isoformat(timespec='seconds')}"]
+        for phase, seconds in self.phases:
+            share = seconds / total * 100 if total else 0
+            lines.append(f"  {phase:<24}{seconds * 1000:9.1f} ms {share:5.1f}%")
+        lines.append(f"  {'total':<24}{total * 1000:9.1f} ms")
+        return lines
+
+    def report(self, log_path=PROFILE_LOG):
+        if not self.enabled or not self.phases:
+            return
+        text = "\n".join(self.lines()) + "\n"
+        if sys.stderr:
+            sys.stderr.write(text)
+        try:
+            with open(log_path, "a", encoding="utf-8") as file:
+                file.write(text)
+        except OSError:
+            pass
+        # Report once, at the end of the startup sequence
+        self.enabled = False
@@ -0,0 +1,247 @@
+import argparse
+import csv
+import html
+import io
+import os
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from string import Template
+
+import archive
+import money
+import payslip_generation
+
+# Annual tax statements, one per employee paid in a fiscal year (April-March).
+# One grouped query over the year's payroll rows, archived years included,
+# yields each employee's totals and month-by-month tax deducted; the rows are
+# read in batches, rendered to HTML or PDF across a process pool and written
+# into a zip archive or a directory tree as the batches come back, as with
+# payslips. summary.csv lists every statement's figures with a total line.
+#
+#   python tax_statements.py 2024 statements_fy2024.zip --format pdf
+
+DEFAULT_DB_PATH = 'employee.db'
+BATCH_SIZE = 500
+STATEMENT_FORMATS = ('pdf', 'html')
+SUMMARY_COLUMNS = ('employee_id', 'employee_name', 'months', 'gross', 'bonus', 'arrears', 'deductions',
+                   'income_tax', 'net_pay')
+
+# Rows are fed to the grouping in date order so each employee's months come
+# out in order
+STATEMENT_QUERY = """
+    SELECT p.employee_id, MAX(p.employee_name), e.email,
+           TRIM(IFNULL(e.address, '') || ' ' || IFNULL(e.city, '') || ' ' || IFNULL(e.state, '')),
+           COUNT(*), SUM(p.final_pay + p.income_tax + p.deducted_salary), SUM(p.bonus),
+           SUM(IFNULL(p.arrears, 0)), SUM(p.deducted_salary), SUM(p.income_tax), SUM(p.final_pay),
+           group_concat(substr(p.payment_date, 1, 7) || '=' || p.income_tax, ';')
+    FROM (SELECT employee_id, employee_name, payment_date, final_pay, income_tax, deducted_salary,
+                 bonus, arrears
+          FROM {source}
+          WHERE payment_date >= ? AND payment_date < ?
+          ORDER BY employee_id, payment_date) p
+    LEFT JOIN employees e ON e.employee_id = p.employee_id
+    GROUP BY p.employee_id
+    ORDER BY p.employee_id
+"""
+
+HTML_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Tax Statement $year_label - $employee_name</title>
+<style>
+body { font-family: "Segoe UI", Arial, sans-serif; color: #5a5c69; margin: 40px; }
+h1 { color: #4e73df; margin-bottom: 0; }
+table { border-collapse: collapse; width: 480px; margin-top: 20px; }
+td { padding: 6px 10px; border-bottom: 1px solid #e3e6f0; }
+td.amount { text-align: right; }
+tr.total td { font-weight: bold; border-top: 2px solid #4e73df; }
+</style>
+</head>
+<body>
+<h1>$company</h1>
+<p>Annual Tax Statement for $year_label</p>
+<table>
+<tr><td>Employee ID</td><td>$employee_id</td></tr>
+<tr><td>Employee</td><td>$employee_name</td></tr>
+<tr><td>Email</td><td>$email</td></tr>
+<tr><td>Address</td><td>$address</td></tr>
+<tr><td>Months Paid</td><td>$months</td></tr>
+</table>
+<table>
+<tr><td>Gross Earnings</td><td class="amount">$gross</td></tr>
+<tr><td>Bonus (included)</td><td class="amount">$bonus</td></tr>
+<tr><td>Arrears (net, included)</td><td class="amount">$arrears</td></tr>
+<tr><td>Leave Deductions</td><td class="amount">$deductions</td></tr>
+<tr><td>Taxable Earnings</td><td class="amount">$taxable</td></tr>
+<tr class="total"><td>Income Tax Deducted</td><td class="amount">$income_tax</td></tr>
+<tr><td>Net Pay</td><td class="amount">$net_pay</td></tr>
+</table>
+<table>
+<tr><td><b>Month</b></td><td class="amount"><b>Tax Deducted</b></td></tr>
+$monthly_rows
+</table>
+</body>
+</html>
+""")
+HTML_MONTH_ROW = Template('<tr><td>$month</td><td class="amount">$tax</td></tr>')
+
+PDF_LINES = (
+    (20, "$company"),
+    (12, "Annual Tax Statement for $year_label"),
+    (10, ""),
+    (10, "Employee ID:         $employee_id"),
+    (10, "Employee:            $employee_name"),
+    (10, "Email:               $email"),
+    (10, "Address:             $address"),
+    (10, "Months Paid:         $months"),
+    (10, ""),
+    (10, "Gross Earnings:      $gross"),
+    (10, "Bonus (included):    $bonus"),
+    (10, "Arrears (net):       $arrears"),
+    (10, "Leave Deductions:    $deductions"),
+    (10, "Taxable Earnings:    $taxable"),
+    (12, "Income Tax Deducted: $income_tax"),
+    (10, "Net Pay:             $net_pay"),
+    (10, ""),
+)
+PDF_TEMPLATES = tuple((size, Template(text)) for size, text in PDF_LINES)
+PDF_MONTH_LINE = Template("  $month             $tax")
+
+
+def iter_statements(connection, fiscal_year, batch_size=BATCH_SIZE):
+    # Yields lists of plain tuples, cheap to pickle across to the workers
+    start_date, end_date = archive.fiscal_year_bounds(fiscal_year)
+    source = archive.table_source(connection, 'payroll', start_date, end_date)
+    cursor = connection.execute(STATEMENT_QUERY.format(source=source), (start_date, end_date))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def statement_fields(row, fiscal_year, company, currency):
+    (employee_id, employee_name, email, address, months, gross, bonus, arrears, deductions,
+     income_tax, net_pay, monthly) = row
+
+    def amount(paise):
+        return money.format_inr(paise).replace("₹", currency)
+
+    return {
+        'company': company,
+        'year_label': archive.fiscal_year_label(fiscal_year),
+        'employee_id': employee_id,
+        'employee_name': employee_name,
+        'email': email or "",
+        'address': address or "",
+        'months': months,
+        'gross': amount(gross),
+        'bonus': amount(bonus),
+        'arrears': amount(arrears),
+        'deductions': amount(deductions),
+        'taxable': amount(gross - deductions),
+        'income_tax': amount(income_tax),
+        'net_pay': amount(net_pay),
+        'monthly': [(month, amount(int(tax))) for month, tax in
+                    (entry.split("=") for entry in (monthly or "").split(";") if entry)],
+    }
+
+
+def render_html(fields):
+    escaped = {key: html.escape(str(value)) for key, value in fields.items() if key != 'monthly'}
+    escaped['monthly_rows'] = "\n".join(HTML_MONTH_ROW.substitute(month=month, tax=html.escape(tax))
+                                        for month, tax in fields['monthly'])
+    return HTML_TEMPLATE.substitute(escaped).encode('utf-8')
+
+
+def render_pdf(fields):
+    templates = PDF_TEMPLATES + tuple((10, Template(PDF_MONTH_LINE.substitute(month=month, tax=tax)))
+                                      for month, tax in fields['monthly'])
+    return payslip_generation.render_pdf(fields, templates)
+
+
+def render_batch(rows, fiscal_year, fmt, company):
+    # Runs in a worker process
+    results = []
+    for row in rows:
+        if fmt == 'pdf':
+            document = render_pdf(statement_fields(row, fiscal_year, company, "Rs. "))
+        else:
+            document = render_html(statement_fields(row, fiscal_year, company, "₹"))
+        filename = payslip_generation.payslip_filename(row[0], row[1], f"fy{fiscal_year}", fmt)
+        results.append((filename, document))
+    return results
+
+
+def summary_row(row):
+    (employee_id, employee_name, _, _, months, gross, bonus, arrears, deductions, income_tax, net_pay, _) = row
+    return (employee_id, employee_name, months) + tuple(money.format_amount(value) for value in (
+        gross, bonus, arrears, deductions, income_tax, net_pay))
+
+
+def generate_statements(fiscal_year, target, fmt='pdf', db_path=DEFAULT_DB_PATH,
+                        company=payslip_generation.DEFAULT_COMPANY, workers=None, batch_size=BATCH_SIZE,
+                        progress=None):
+    if fmt not in STATEMENT_FORMATS:
+        raise ValueError(f"Unknown statement format: {fmt}")
+
+    workers = workers or os.cpu_count() or 1
+    connection = sqlite3.connect(db_path, timeout=10)
+    writer = payslip_generation.PayslipWriter(target)
+    summary = io.StringIO()
+    summary_writer = csv.writer(summary)
+    summary_writer.writerow(SUMMARY_COLUMNS)
+    totals = [0] * 6
+    written = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of batches in flight so memory stays flat
+            max_pending = workers * 2
+            pending = set()
+            batches = iter_statements(connection, fiscal_year, batch_size)
+
+            while True:
+                for rows in batches:
+                    pending.add(executor.submit(render_batch, rows, fiscal_year, fmt, company))
+                    summary_writer.writerows(summary_row(row) for row in rows)
+                    for row in rows:
+                        for index, value in enumerate(row[5:11]):
+                            totals[index] += value
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for filename, document in future.result():
+                        writer.write(filename, document)
+                        written += 1
+                if progress:
+                    progress(written)
+
+        summary_writer.writerow(('', 'Total', '') + tuple(money.format_amount(value) for value in totals))
+        writer.write(f"fy{fiscal_year}/summary.csv", summary.getvalue().encode('utf-8'))
+    finally:
+        writer.close()
+        connection.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate annual tax statements for a fiscal year")
+    parser.add_argument("fiscal_year", type=int, help="year the fiscal year starts in, e.g. 2024 for FY 2024-25")
+    parser.add_argument("target", help="output .zip file or directory")
+    parser.add_argument("--format", choices=STATEMENT_FORMATS, default='pdf')
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--company", default=payslip_generation.DEFAULT_COMPANY)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    count = generate_statements(args.fiscal_year, args.target, args.format, args.db, args.company, args.workers)
+    print(f"{count} tax statements written to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import bisect
+import functools
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+# UI responsiveness metrics for the desktop app. A heartbeat rescheduled with
+# root.after every HEARTBEAT_MS records how late Tk runs it; that lateness is
+# how long the event loop was blocked, i.e. how long the app "froze". Screen
+# switches (show_*), list loads (refresh_*) and dialogs are timed from the
+# call until Tk has drawn the result, split into query time (spent in SQLite,
+# measured by the repositories' QueryClock) and render time (the rest).
+#
+# Samples are buffered and appended as JSON lines every FLUSH_INTERVAL_MS and
+# on exit; the file rotates at MAX_BYTES. Every line carries the release and
+# the workstation, so files collected from several machines can be pooled:
+#
+#   python ui_telemetry.py ui_metrics.jsonl*      # p50/p99 per metric
+
+METRICS_LOG = "ui_metrics.jsonl"
+MAX_BYTES = 1024 * 1024
+KEEP_FILES = 5
+HEARTBEAT_MS = 100
+FLUSH_INTERVAL_MS = 60 * 1000
+# A heartbeat later than this is also logged on its own, with the action
+# that was running
+STALL_MS = 250
+# Loop lag is kept as a histogram (upper bounds in ms, the last catches the
+# rest) so that summaries from many flushes and machines add up exactly
+LAG_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class UiTelemetry:
+    def __init__(self, root, clock, release, log_path=METRICS_LOG):
+        self.root = root
+        # repositories.QueryClock shared by the repositories the screens use
+        self.clock = clock
+        self.release = release
+        self.host = platform.node()
+        self.log_path = log_path
+        self.pending = []
+        self.lag_counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.lag_sum = self.lag_max = 0.0
+        self.current = None
+        self.expected = None
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.schedule_heartbeat()
+        self.root.after(FLUSH_INTERVAL_MS, self.periodic_flush)
+
+    def stop(self):
+        self.running = False
+        self.flush()
+
+    def schedule_heartbeat(self):
+        self.expected = time.perf_counter() + HEARTBEAT_MS / 1000
+        self.root.after(HEARTBEAT_MS, self.heartbeat)
+
+    def heartbeat(self):
+        if not self.running:
+            return
+        lag_ms = max(time.perf_counter() - self.expected, 0) * 1000
+        self.lag_counts[bisect.bisect_left(LAG_BUCKETS_MS, lag_ms)] += 1
+        self.lag_sum += lag_ms
+        self.lag_max = max(self.lag_max, lag_ms)
+        if lag_ms >= STALL_MS:
+            self.record('stall', self.current, lag_ms=round(lag_ms, 1))
+        self.schedule_heartbeat()
+
+    def instrument(self, app, dialogs=()):
+        # Wraps the app's show_*/refresh_* methods and the named dialog methods
+        # on the instance, so buttons created afterwards call the timed versions
+        for name in dir(type(app)):
+            if name in dialogs:
+                kind = 'dialog'
+            elif name.startswith('show_'):
+                kind = 'screen'
+            elif name.startswith('refresh_'):
+                kind = 'load'
+            else:
+                continue
+            setattr(app, name, self.timed(kind, name, getattr(app, name)))
+
+    def timed(self, kind, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            query_started = self.clock.seconds
+            self.current = name
+            try:
+                return method(*args, **kwargs)
+            finally:
+                query = self.clock.seconds - query_started
+                # Idle callbacks run in order, so this one runs once the redraws
+                # queued by the method are done
+                self.root.after_idle(self.finish_span, kind, name, started, query)
+        return wrapper
+
+    def finish_span(self, kind, name, started, query):
+        total_ms = (time.perf_counter() - started) * 1000
+        query_ms = query * 1000
+        self.record(kind, name, total_ms=round(total_ms, 1), query_ms=round(query_ms, 1),
+                    render_ms=round(total_ms - query_ms, 1))
+
+    def record(self, metric, name, **values):
+        self.pending.append(dict(ts=datetime.now().isoformat(timespec='seconds'), host=self.host,
+                                 release=self.release, metric=metric, name=name, **values))
+
+    def periodic_flush(self):
+        if not self.running:
+            return
+        self.flush()
+        self.root.after(FLUSH_INTERVAL_MS, self.periodic_flush)
+
+    def flush(self):
+        if any(self.lag_counts):
+            self.record('loop_lag', None, count=sum(self.lag_counts), sum_ms=round(self.lag_sum, 1),
+                        max_ms=round(self.lag_max, 1), buckets=self.lag_counts)
+            self.lag_counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+            self.lag_sum = self.lag_max = 0.0
+        if not self.pending:
+            return
+        lines = "".join(json.dumps(entry) + "\n" for entry in self.pending)
+        self.pending = []
+        try:
+            rotate_log(self.log_path)
+            with open(self.log_path, "a", encoding="utf-8") as file:
+                file.write(lines)
+        except OSError:
+            # Metrics are best effort; never interrupt the user over them
+            pass
+
+
+def rotate_log(log_path, max_bytes=MAX_BYTES, keep=KEEP_FILES):
+    # ui_metrics.jsonl -> .1 -> .2 ...; the oldest beyond keep is dropped
+    if not os.path.exists(log_path) or os.path.getsize(log_path) < max_bytes:
+        return
+    for number in range(keep - 1, 0, -1):
+        older = f"{log_path}.{number}"
+        if os.path.exists(older):
+            os.replace(older, f"{log_path}.{number + 1}")
+    os.replace(log_path, f"{log_path}.1")
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    index = max(int(len(sorted_values) * fraction + 0.5) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def bucket_percentile(counts, fraction):
+    # Upper bound of the bucket holding the percentile; None past the last bound
+    rank = sum(counts) * fraction
+    seen = 0
+    for bound, count in zip(LAG_BUCKETS_MS + (None,), counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+def summarize(entries):
+    # (release, metric, name) -> (count, p50, p99, max) in ms; loop lag is
+    # pooled from the histograms, so its p50/p99 are bucket upper bounds
+    spans, lag = {}, {}
+    for entry in entries:
+        key = (entry['release'], entry['metric'], entry['name'])
+        if entry['metric'] == 'loop_lag':
+            counts, worst = lag.get(key, ([0] * (len(LAG_BUCKETS_MS) + 1), 0))
+            lag[key] = ([a + b for a, b in zip(counts, entry['buckets'])], max(worst, entry['max_ms']))
+        else:
+            spans.setdefault(key, []).append(entry.get('total_ms', entry.get('lag_ms')))
+
+    summary = {}
+    for key, values in spans.items():
+        values.sort()
+        summary[key] = (len(values), percentile(values, 0.5), percentile(values, 0.99), values[-1])
+    for key, (counts, worst) in lag.items():
+        summary[key] = (sum(counts), bucket_percentile(counts, 0.5), bucket_percentile(counts, 0.99), worst)
+    return summary
+
+
+def read_entries(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize UI responsiveness metrics")
+    parser.add_argument("files", nargs="*", default=[METRICS_LOG])
+    parser.add_argument("--host", help="only this workstation")
+    args = parser.parse_args()
+
+    entries = read_entries(args.files)
+    if args.host:
+        entries = (entry for entry in entries if entry['host'] == args.host)
+    try:
+        summary = summarize(entries)
+    except (OSError, ValueError, KeyError) as err:
+        parser.error(str(err))
+
+    print(f"{'release':<10}{'metric':<10}{'name':<28}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for (release, metric, name), (count, p50, p99, worst) in sorted(
+            summary.items(), key=lambda item: tuple(str(part) for part in item[0])):
+        p50, p99 = ("-" if value is None else value for value in (p50, p99))
+        print(f"{release or '-':<10}{metric:<10}{name or '-':<28}{count:>7}{p50:>10}{p99:>10}{worst:>10}")
+
+
+if __name__ == "__main__":
+    main()